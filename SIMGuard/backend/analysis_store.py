@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Analysis Store
+Per-upload state (parsed dataset, analysis results, metadata) keyed by an
+upload ID instead of process globals. Entries live on local disk so every
+worker process of the API sees the same uploads; a small in-process LRU keeps
+recently used datasets and results in memory within a byte budget.
+
+Layout:
+    <root>/<upload_id>/meta.json
+    <root>/<upload_id>/dataset.feather   (dataset.pkl when Arrow cannot type it)
+    <root>/<upload_id>/results.json
+    <root>/<upload_id>/suspicious-<analysis_id>.npz  (results['suspicious_activities'], a SuspiciousTable)
+    <root>/<upload_id>/upload.<ext>      (the original file)
+    <root>/<upload_id>/active.lock       (shared-locked while an analysis or report build uses the entry)
+    <root>/<upload_id>/results.lock      (serializes results writers)
+
+Entries held by a running analysis, or with a queued or running job recorded
+in their meta, are never swept.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+import dataset_cache
+from result_table import SuspiciousTable
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: only holds taken in this process keep an entry from being swept
+    fcntl = None
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', '.store')
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 50
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+META_FILENAME = 'meta.json'
+RESULTS_FILENAME = 'results.json'
+ACTIVE_LOCK_FILENAME = 'active.lock'
+RESULTS_LOCK_FILENAME = 'results.lock'
+
+
+def _suspicious_filename(analysis_id: str) -> str:
+    return f"suspicious-{analysis_id}.npz"
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class AnalysisStore:
+    """
+    Upload-ID keyed store with idle-TTL and LRU eviction on disk, plus an
+    in-memory LRU (bounded by memory_budget bytes) in front of it.
+
+    Disk is the source of truth: cached values are tagged with the mtime of
+    the file they were read from and re-read when another worker replaces it.
+    """
+
+    def __init__(self, root: str = STORE_DIR, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 job_active: Optional[Callable[[str], bool]] = None):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        # Whether a job ID recorded with add_job is still queued or running
+        self.job_active = job_active
+        self._held: Dict[str, int] = {}
+        self._memory: 'OrderedDict[Tuple[str, str], Tuple[int, int, Any]]' = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- paths -----------------------------------------------------------
+
+    @staticmethod
+    def is_valid_id(upload_id: Optional[str]) -> bool:
+        return bool(upload_id) and bool(UPLOAD_ID_PATTERN.match(upload_id))
+
+    def entry_dir(self, upload_id: str) -> str:
+        if not self.is_valid_id(upload_id):
+            raise ValueError(f"Invalid upload ID: {upload_id!r}")
+        return os.path.join(self.root, upload_id)
+
+    def upload_path(self, upload_id: str, filename: str) -> str:
+        """Where to save the original file for this upload."""
+        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'dat'
+        return os.path.join(self.entry_dir(upload_id), f"upload.{ext}")
+
+    # --- entries ---------------------------------------------------------
+
+    def create(self, filename: str) -> str:
+        """Reserve a new upload ID (and its directory)."""
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self.entry_dir(upload_id))
+        _write_json(os.path.join(self.entry_dir(upload_id), META_FILENAME), {
+            'upload_id': upload_id,
+            'filename': filename,
+            'created_at': datetime.now().isoformat(),
+        })
+        return upload_id
+
+    def exists(self, upload_id: Optional[str]) -> bool:
+        return self.is_valid_id(upload_id) and os.path.isdir(os.path.join(self.root, upload_id))
+
+    def get_meta(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        if not self.exists(upload_id):
+            return None
+        return _read_json(os.path.join(self.entry_dir(upload_id), META_FILENAME))
+
+    def update_meta(self, upload_id: str, **fields: Any) -> None:
+        meta = self.get_meta(upload_id) or {'upload_id': upload_id}
+        meta.update(fields)
+        _write_json(os.path.join(self.entry_dir(upload_id), META_FILENAME), meta)
+
+    def delete(self, upload_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == upload_id]:
+                self._memory_bytes -= self._memory.pop(key)[1]
+        shutil.rmtree(self.entry_dir(upload_id), ignore_errors=True)
+
+    def ids(self) -> List[str]:
+        return [name for name in os.listdir(self.root) if self.exists(name)]
+
+    def add_job(self, upload_id: str, job_id: str) -> None:
+        """Record a job working on this upload; the entry is not swept while the job is queued or running."""
+        jobs = (self.get_meta(upload_id) or {}).get('jobs', [])
+        if self.job_active is not None:
+            jobs = [job for job in jobs if self.job_active(job)]
+        self.update_meta(upload_id, jobs=jobs + [job_id])
+
+    @contextmanager
+    def hold(self, upload_id: str) -> Iterator[None]:
+        """Keep the entry from being swept while the block runs (any number of holders, in any process)."""
+        with self._lock:
+            self._held[upload_id] = self._held.get(upload_id, 0) + 1
+        try:
+            with open(os.path.join(self.entry_dir(upload_id), ACTIVE_LOCK_FILENAME), 'a') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                yield  # closing the file releases the lock
+        finally:
+            with self._lock:
+                self._held[upload_id] -= 1
+                if not self._held[upload_id]:
+                    del self._held[upload_id]
+
+    def _has_active_job(self, upload_id: str) -> bool:
+        if self.job_active is None:
+            return False
+        jobs = (self.get_meta(upload_id) or {}).get('jobs', [])
+        return any(self.job_active(job_id) for job_id in jobs)
+
+    def _evict(self, upload_id: str, reason: str) -> bool:
+        """Delete an entry unless it is held or has an active job; True when it was deleted."""
+        with self._lock:
+            if upload_id in self._held:
+                return False
+        try:
+            f = open(os.path.join(self.entry_dir(upload_id), ACTIVE_LOCK_FILENAME), 'a')
+        except OSError:
+            return False
+        with f:
+            if fcntl is not None:
+                try:
+                    # Held by a holder in another process; kept until the next sweep
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            if self._has_active_job(upload_id):
+                return False
+            logger.info(f"{reason} upload {upload_id}")
+            self.delete(upload_id)
+            return True
+
+    def sweep(self) -> None:
+        """
+        Drop entries idle for longer than the TTL, then the least recently used beyond max_entries.
+        Held entries and entries with an active job are skipped (and still count towards max_entries).
+        """
+        now = time.time()
+        entries = []
+        for upload_id in self.ids():
+            try:
+                last_used = os.path.getmtime(self.entry_dir(upload_id))
+            except OSError:
+                continue
+            if now - last_used <= self.ttl_seconds or not self._evict(upload_id, 'Expiring'):
+                entries.append((last_used, upload_id))
+        entries.sort(reverse=True)
+        for _, upload_id in entries[max(self.max_entries - 1, 0):]:
+            self._evict(upload_id, 'Evicting')
+
+    def _touch(self, upload_id: str) -> None:
+        try:
+            os.utime(self.entry_dir(upload_id))
+        except OSError:
+            pass
+
+    # --- datasets and results --------------------------------------------
+
+    def put_dataset(self, upload_id: str, df: pd.DataFrame) -> None:
+        entry = self.entry_dir(upload_id)
+        feather_path = os.path.join(entry, 'dataset.feather')
+        pickle_path = os.path.join(entry, 'dataset.pkl')
+        try:
+            if dataset_cache.pa is None:
+                raise RuntimeError("pyarrow not installed")
+            dataset_cache.write_frame(df, feather_path)
+            if os.path.exists(pickle_path):
+                os.remove(pickle_path)
+        except Exception as e:
+            logger.info(f"Storing upload {upload_id} as pickle ({e})")
+            df.to_pickle(f"{pickle_path}.tmp", compression=None)
+            os.replace(f"{pickle_path}.tmp", pickle_path)
+            if os.path.exists(feather_path):
+                os.remove(feather_path)
+        self._remember(upload_id, 'dataset', self._stamp(self._dataset_path(upload_id)),
+                       int(df.memory_usage(deep=True).sum()), df)
+
+    def has_dataset(self, upload_id: str) -> bool:
+        return self.exists(upload_id) and self._dataset_path(upload_id) is not None
+
+    def get_dataset(self, upload_id: str) -> Optional[pd.DataFrame]:
+        path = self._dataset_path(upload_id) if self.exists(upload_id) else None
+        if path is None:
+            return None
+        self._touch(upload_id)
+        stamp = self._stamp(path)
+        cached = self._recall(upload_id, 'dataset', stamp)
+        if cached is not None:
+            return cached
+        df = dataset_cache.read_frame(path) if path.endswith('.feather') else pd.read_pickle(path)
+        self._remember(upload_id, 'dataset', stamp, int(df.memory_usage(deep=True).sum()), df)
+        return df
+
+    def put_results(self, upload_id: str, results: Dict[str, Any]) -> None:
+        """
+        Store results. Their SuspiciousTable is written columnar under the results' analysis_id
+        before results.json (which names that ID) replaces the previous one; the table of the
+        replaced results is deleted afterwards, so a reader always finds the pair it read.
+        """
+        entry = self.entry_dir(upload_id)
+        path = os.path.join(entry, RESULTS_FILENAME)
+        analysis_id = results['analysis_id']
+        table: SuspiciousTable = results['suspicious_activities']
+        with self._results_lock(upload_id):
+            replaced = (_read_json(path) or {}).get('analysis_id')
+            table.save(os.path.join(entry, _suspicious_filename(analysis_id)))
+            _write_json(path, {key: value for key, value in results.items() if key != 'suspicious_activities'})
+            if replaced and replaced != analysis_id:
+                try:
+                    os.remove(os.path.join(entry, _suspicious_filename(replaced)))
+                except OSError:
+                    pass
+        self._remember(upload_id, 'results', self._stamp(path), os.path.getsize(path) + table.nbytes, results)
+
+    @contextmanager
+    def _results_lock(self, upload_id: str) -> Iterator[None]:
+        with open(os.path.join(self.entry_dir(upload_id), RESULTS_LOCK_FILENAME), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
+
+    def get_results(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        if not self.exists(upload_id):
+            return None
+        path = os.path.join(self.entry_dir(upload_id), RESULTS_FILENAME)
+        stamp = self._stamp(path)
+        if stamp is None:
+            return None
+        self._touch(upload_id)
+        cached = self._recall(upload_id, 'results', stamp)
+        if cached is not None:
+            return cached
+        results = _read_json(path)
+        if results is None:
+            return None
+        try:
+            results['suspicious_activities'] = SuspiciousTable.load(
+                os.path.join(self.entry_dir(upload_id), _suspicious_filename(results['analysis_id'])))
+        except FileNotFoundError:
+            # Replaced by a newer analysis between the two reads
+            return self.get_results(upload_id) if self._stamp(path) != stamp else None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Unreadable suspicious rows for upload {upload_id} ({e})")
+            return None
+        self._remember(upload_id, 'results', stamp,
+                       os.path.getsize(path) + results['suspicious_activities'].nbytes, results)
+        return results
+
+    def _dataset_path(self, upload_id: str) -> Optional[str]:
+        for name in ('dataset.feather', 'dataset.pkl'):
+            path = os.path.join(self.entry_dir(upload_id), name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _stamp(path: Optional[str]) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            return None
+
+    # --- in-memory LRU -----------------------------------------------------
+
+    def _recall(self, upload_id: str, kind: str, stamp: Optional[int]) -> Any:
+        with self._lock:
+            item = self._memory.get((upload_id, kind))
+            if item is None or item[0] != stamp:
+                return None
+            self._memory.move_to_end((upload_id, kind))
+            return item[2]
+
+    def _remember(self, upload_id: str, kind: str, stamp: Optional[int], nbytes: int, value: Any) -> None:
+        if nbytes > self.memory_budget:
+            return
+        with self._lock:
+            old = self._memory.pop((upload_id, kind), None)
+            if old is not None:
+                self._memory_bytes -= old[1]
+            self._memory[(upload_id, kind)] = (stamp, nbytes, value)
+            self._memory_bytes += nbytes
+            while self._memory_bytes > self.memory_budget and self._memory:
+                _, (_, evicted_bytes, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_bytes
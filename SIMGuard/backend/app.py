@@ -17,24 +17,33 @@ if CURRENT_DIR not in sys.path:
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_file
+from datetime import datetime
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import tempfile
-import json
-from fpdf import FPDF
-import io
+import uuid
+import functools
 import logging
-from typing import Dict, List, Tuple, Any
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # Import custom modules
 # We wrap these in try-except blocks to give better error messages if imports fail
 try:
     from ml_core import ThinkerModel
     from simswap_detector.rule_engine import RuleEngine
-    from simswap_detector import config
-    from simswap_detector.utils import hours_between
+    from simswap_detector import config, windows
+    from simswap_detector.velocity import velocity_features
+    import dataset_cache
+    from analysis_store import AnalysisStore
+    from job_queue import JobContext, JobQueue
+    import parallel_scoring
+    from event_stream import EventConsumer, EventStream, parse_ndjson
+    from tower_registry import TowerIndex, TowerRegistry, TowerReports, tower_positions
+    from fingerprint_index import FingerprintIndex, Snapshot, carry_over, fingerprints, ruleset_signature, schema_key
+    from result_table import SuspiciousTable
+    from results_view import RISK_LEVELS, SORT_ORDERS, CursorError, view_for
+    from report_cache import ReportCache, iter_csv, iter_ndjson
 except ImportError as e:
     print(f"❌ Import Error in app.py: {e}")
     print(f"   sys.path is: {sys.path}")
@@ -52,31 +61,163 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # Enable CORS for frontend integration
 CORS(app, origins=['*'])
 
-# Global variables
-analysis_results = {}
-uploaded_data = None
-ml_engine = ThinkerModel() # Initialize the Thinker ML Engine
 rule_engine = RuleEngine() # Initialize Rule Engine
 
+# Per-upload datasets and results, shared by all worker processes through local disk
+analysis_store = AnalysisStore(
+    ttl_seconds=float(os.environ.get('SIMGUARD_STORE_TTL_HOURS', 24)) * 3600,
+    max_entries=int(os.environ.get('SIMGUARD_STORE_MAX_ENTRIES', 50)),
+    memory_budget=int(os.environ.get('SIMGUARD_STORE_MEMORY_MB', 512)) * 1024 * 1024,
+    job_active=lambda job_id: job_queue.active(job_id),
+)
+# SIMGUARD_FAST_INFERENCE=1 scores /predict with compiled tree arrays (same probabilities, lower latency)
+ml_engine = ThinkerModel(fast_inference=os.environ.get('SIMGUARD_FAST_INFERENCE', '0') == '1') # Initialize the Thinker ML Engine
+
+# SIMGUARD_TOWER_CHECK=1: learn cell tower positions from analyzed uploads and check each row's serving tower
+# against them (tower_location_mismatch); 0 (default) keeps scoring independent of earlier uploads
+TOWER_CHECK = os.environ.get('SIMGUARD_TOWER_CHECK', '0') == '1'
+tower_registry = TowerRegistry() if TOWER_CHECK else None
+
+# SIMGUARD_INCREMENTAL_ANALYSIS=1 (default): /analyze re-scores only user rows not seen unchanged in earlier
+# analyses of the same kind of data (sharded across SIMGUARD_SCORING_WORKERS when many changed); 0 scores every row
+INCREMENTAL_ANALYSIS = os.environ.get('SIMGUARD_INCREMENTAL_ANALYSIS', '1') == '1'
+fingerprint_index = FingerprintIndex(max_rows=int(os.environ.get('SIMGUARD_FINGERPRINT_MAX_ROWS', 2_000_000)))
+RULESET_SIGNATURE = ruleset_signature(list(rule_engine.rules))
+
+# Background jobs (async=true on /analyze, /train, /diagnostics); caps concurrent CPU-heavy work per API process
+job_queue = JobQueue(max_workers=int(os.environ.get('SIMGUARD_JOB_WORKERS', 2)))
+
+# PDF/CSV/Excel reports, cached per analysis in its store entry; the PDF's flagged table keeps the
+# SIMGUARD_REPORT_MAX_ROWS highest-risk rows (the full list is in the CSV and Excel exports)
+report_cache = ReportCache(pdf_max_rows=int(os.environ.get('SIMGUARD_REPORT_MAX_ROWS', 2000)))
+# Render reports in the background as soon as an analysis is stored (SIMGUARD_REPORT_PREBUILD=0 renders on first request)
+REPORT_PREBUILD = os.environ.get('SIMGUARD_REPORT_PREBUILD', '1') == '1'
+
+def save_results(upload_id: str, results: Dict[str, Any]) -> None:
+    """Store new results for an upload and drop the report artifacts of the analysis they replace."""
+    analysis_store.put_results(upload_id, results)
+    report_cache.invalidate(analysis_store.entry_dir(upload_id), keep=results)
+
+MODEL_RELOAD_SECONDS = float(os.environ.get('SIMGUARD_MODEL_RELOAD_SECONDS', 30))
+
+def log_stream_alert(alert: Dict[str, Any]) -> None:
+    logger.warning(f"{alert['alert_emoji']} Stream alert for {alert['user_id']}: {alert['alert_level']} "
+                   f"(score {alert['risk_score']}, {alert['total_rules_triggered']} rule(s))")
+
+# Real-time scoring of legacy-schema events (POST /events or SIMGUARD_EVENT_SOURCE); state is per API process
+event_stream = EventStream(
+    rule_engine,
+    max_users=int(os.environ.get('SIMGUARD_STREAM_MAX_USERS', 1_000_000)),
+    on_alert=log_stream_alert,
+)
+EVENT_SOURCE = os.environ.get('SIMGUARD_EVENT_SOURCE')  # NDJSON file to follow, or unix:<socket path>
+
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_services() -> None:
+    """
+    Model reload watcher and event source consumer, started once in a process that serves requests.
+    Not at import: job workers and the Werkzeug reloader's parent process import this module too,
+    and a second consumer would ingest every event twice (or fail to bind the event socket).
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    if MODEL_RELOAD_SECONDS > 0:
+        ml_engine.start_auto_reload(MODEL_RELOAD_SECONDS) # Pick up newly published models without a restart
+    if EVENT_SOURCE:
+        EventConsumer(event_stream, EVENT_SOURCE).start()
+
+def in_reloader_child() -> bool:
+    """True in the debug server's serving process; the reloader's parent only watches files and serves nothing."""
+    return os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+@app.before_request
+def ensure_background_services():
+    # WSGI servers (gunicorn etc.) import the app without running __main__
+    if not _background_started:
+        start_background_services()
+
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+IN_MEMORY_UPLOAD_LIMIT = 16 * 1024 * 1024  # larger CSV uploads are streamed instead of loaded whole
+# Request cap of /upload only: CSVs above IN_MEMORY_UPLOAD_LIMIT are streamed, so it can be far above what fits in memory
+STREAM_UPLOAD_MAX_BYTES = int(os.environ.get('SIMGUARD_MAX_UPLOAD_MB', 8192)) * 1024 * 1024
+STREAM_CHUNK_ROWS = 200_000
+TRAINING_DATA_PATH = os.path.join(UPLOAD_FOLDER, 'training_data.csv')
+# Processes used to score one large upload (1 = score in the request/job process)
+SCORING_WORKERS = int(os.environ.get('SIMGUARD_SCORING_WORKERS', 1))
+PARALLEL_MIN_ROWS = 200_000  # below this, worker start-up and the shard file cost more than they save
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+def requested_upload_id() -> Optional[str]:
+    """upload_id from the query string, form, JSON body or X-Upload-ID header."""
+    payload = request.get_json(silent=True)
+    body_id = payload.get('upload_id') if isinstance(payload, dict) else None
+    return request.values.get('upload_id') or body_id or request.headers.get('X-Upload-ID')
+
+def resolve_upload_id() -> Tuple[Optional[str], Optional[Tuple[Any, int]]]:
+    """The upload a request refers to, or an error response (every request must name its upload)."""
+    upload_id = requested_upload_id()
+    if upload_id is None:
+        return None, (jsonify({'status': 'error', 'message': 'upload_id is required (returned by /upload)'}), 400)
+    if not analysis_store.exists(upload_id):
+        return None, (jsonify({'status': 'error', 'message': 'Unknown or expired upload_id'}), 404)
+    return upload_id, None
+
+def wants_async() -> bool:
+    """async=true in the query string, form or JSON body runs the request as a background job."""
+    payload = request.get_json(silent=True)
+    value = request.values.get('async')
+    if value is None and isinstance(payload, dict):
+        value = payload.get('async')
+    return str(value).lower() in ['true', '1', 'yes']
+
+def job_accepted(job_id: str):
+    return jsonify({'status': 'accepted', 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def parse_timestamp(timestamp_str: str) -> datetime:
-    try:
-        formats = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S']
-        for fmt in formats:
-            try:
-                return datetime.strptime(str(timestamp_str), fmt)
-            except ValueError:
-                continue
-        return pd.to_datetime(timestamp_str)
-    except Exception as e:
-        return datetime.now()
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y %H:%M:%S']
+TIMESTAMP_SAMPLE_SIZE = 1000
+
+def parse_timestamp_column(values: pd.Series) -> Tuple[pd.Series, int]:
+    """
+    Parse a whole timestamp column at once.
+
+    A spread-out sample decides which known format the column uses, the column is
+    converted in one vectorized call with it, and only the rows it could not parse
+    are retried with the remaining formats and finally pandas' mixed-format parser.
+    Unparseable values become NaT; returns (parsed column, number of NaT rows).
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, int(values.isna().sum())
+
+    present = values.dropna()
+    if len(present) > TIMESTAMP_SAMPLE_SIZE:
+        present = present.iloc[np.linspace(0, len(present) - 1, TIMESTAMP_SAMPLE_SIZE).astype(int)]
+    sample = present.astype(str)
+    formats = sorted(
+        TIMESTAMP_FORMATS,
+        key=lambda fmt: -pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum(),
+    )
+
+    parsed = pd.to_datetime(values, format=formats[0], errors='coerce')
+    for fmt in formats[1:] + ['mixed']:
+        residual = parsed.isna() & values.notna()
+        if not residual.any():
+            break
+        parsed[residual] = pd.to_datetime(values[residual].astype(str), format=fmt, errors='coerce')
+
+    failures = int(parsed.isna().sum())
+    if failures:
+        logger.warning(f"{failures} timestamp value(s) could not be parsed and were left empty")
+    return parsed, failures
 
 def load_uploaded_dataframe(filepath: str) -> pd.DataFrame:
     extension = filepath.rsplit('.', 1)[-1].lower()
@@ -84,6 +225,20 @@ def load_uploaded_dataframe(filepath: str) -> pd.DataFrame:
     if extension in ['xlsx', 'xls']: return pd.read_excel(filepath, engine='openpyxl')
     raise ValueError(f"Unsupported file type: {extension}")
 
+# Cache variant for normalized uploads; bump when normalize_uploaded_dataframe changes
+NORMALIZED_CACHE_VARIANT = 'normalized-v1'
+
+def load_normalized_dataframe(filepath: str) -> pd.DataFrame:
+    """Load and normalize an upload, reusing the columnar cache for previously seen content."""
+    return dataset_cache.load_with_cache(
+        filepath,
+        lambda path: normalize_uploaded_dataframe(load_uploaded_dataframe(path)),
+        NORMALIZED_CACHE_VARIANT,
+    )
+
+def load_training_dataframe(filepath: str) -> pd.DataFrame:
+    return dataset_cache.load_with_cache(filepath, load_uploaded_dataframe, 'raw')
+
 def normalize_uploaded_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     rename_map = {}
     if 'ip_address' in df.columns and 'ip' not in df.columns: rename_map['ip_address'] = 'ip'
@@ -103,12 +258,249 @@ def normalize_uploaded_dataframe(df: pd.DataFrame) -> pd.DataFrame:
         df['is_roaming'] = df['roaming']
     
     if 'activity_type' not in df.columns: df['activity_type'] = 'event'
-    df['timestamp'] = df['timestamp'].apply(parse_timestamp)
+    # Per-user CSVs may not carry a timestamp column at all; event logs are analyzed by time
+    if 'timestamp' in df.columns:
+        df['timestamp'], df.attrs['timestamp_parse_failures'] = parse_timestamp_column(df['timestamp'])
+    elif not PER_USER_SCHEMA_COLS.issubset(set(df.columns)):
+        raise ValueError(
+            "Missing 'timestamp' column: event logs need timestamp, user_id and sim_id columns "
+            "(per-user snapshot CSVs need the per-user feature columns instead)"
+        )
     return df
 
-def build_user_feature_rows(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+def records_from_columns(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Zip equally long column lists into the list-of-dicts shape the API returns."""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+def collect_rule_results(
+    scored: pd.DataFrame,
+    timestamps: pd.Series,
+    sim_ids: pd.Series,
+    format_timestamp: Callable[[Any], str],
+) -> Tuple[List[Dict[str, Any]], SuspiciousTable]:
+    """
+    Turn RuleEngine.evaluate_frame(render_reasons=False) output into the user_features list
+    and a SuspiciousTable of the flagged rows. timestamps and sim_ids are aligned with scored;
+    only flagged rows are formatted. Reasons stay compact (rule, args) pairs; the table renders
+    them into flag_reason text when a response needs it.
+    """
+    user_features = records_from_columns({
+        'user_id': scored['user_id'].tolist(),
+        'risk_score': scored['risk_score'].tolist(),
+        'alert_level': scored['alert_level'].tolist(),
+        'alert_emoji': scored['alert_emoji'].tolist(),
+        'triggered_rules': scored['triggered_rules'].tolist(),
+        'total_rules_triggered': scored['total_rules_triggered'].tolist(),
+    })
+
+    flagged = (scored['total_rules_triggered'] > 0).to_numpy()
+    return user_features, scored_table(scored[flagged], timestamps[flagged], sim_ids[flagged], format_timestamp)
+
+def scored_table(
+    scored: pd.DataFrame,
+    timestamps: pd.Series,
+    sim_ids: pd.Series,
+    format_timestamp: Callable[[Any], str],
+) -> SuspiciousTable:
+    """SuspiciousTable of every row of evaluate_frame(render_reasons=False) output (see collect_rule_results)."""
+    return SuspiciousTable.from_columns(
+        timestamps=[format_timestamp(ts) for ts in timestamps],
+        user_ids=scored['user_id'].tolist(),
+        sim_ids=sim_ids.tolist(),
+        risk_levels=scored['alert_level'].tolist(),
+        risk_scores=scored['risk_score'].to_numpy(),
+        reasons=scored['triggered_rules'].tolist(),
+        rule_names=list(rule_engine.rules),
+    )
+
+EVENT_LOG_COLUMNS = ['user_id', 'timestamp', 'sim_id', 'device_id', 'location', 'login_status', 'is_roaming']
+
+def event_log_session_state(df: pd.DataFrame, state: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Reconstruct per-user session state from a legacy event log in a single pass.
+
+    Events are sorted once by (user_id, timestamp). SIM, device and location changes
+    come from comparing each event with the previous event of the same user, and the
+    per-user values are the last qualifying event of each user block.
+
+    When `state` from earlier events is given (chunked ingestion), each user's stored
+    last event is replayed ahead of their new events so changes across the boundary are
+    detected, and the returned state continues it. Events are then taken in arrival
+    order per chunk, which matches the batch result for time-ordered files.
+    Returns the state indexed by user_id.
+    """
+    # Events without a usable timestamp cannot be placed in a session
+    events = df.loc[df['user_id'].notna() & df['timestamp'].notna(), [c for c in EVENT_LOG_COLUMNS if c in df.columns]]
+    events = events.assign(_order=1, _seed_sim_change=pd.NaT)
+
+    prior = None
+    if state is not None and len(state):
+        prior = state[state.index.isin(events['user_id'].unique())]
+        seeds = pd.DataFrame({
+            'user_id': prior.index,
+            'timestamp': prior['end_time'].to_numpy(),
+            'sim_id': prior['last_sim_id'].to_numpy(),
+            'device_id': prior['last_device_id'].to_numpy(),
+            'location': prior['last_location'].to_numpy(),
+            'login_status': 'success',
+            'is_roaming': False,
+            '_order': 0,
+            '_seed_sim_change': prior['last_sim_change'].to_numpy(),
+        })
+        events = pd.concat([seeds, events], ignore_index=True)
+
+    events = events.sort_values(['user_id', '_order', 'timestamp'], kind='mergesort').reset_index(drop=True)
+    ts = events['timestamp']
+
+    def codes_of(column: str) -> np.ndarray:
+        return pd.factorize(events[column])[0]
+
+    def changed(codes: np.ndarray) -> np.ndarray:
+        # Value differs from the previous event of the same user (missing values always differ)
+        prev = np.roll(codes, 1)
+        return same_user & ((codes != prev) | (codes < 0) | (prev < 0))
+
+    user_codes = codes_of('user_id')
+    same_user = np.roll(user_codes, 1) == user_codes
+    same_user[:1] = False
+    is_last = np.append(~same_user[1:], True) if len(events) else same_user
+    # Events are contiguous per user, so the block id is a cheap integer group key
+    block = pd.Series(np.cumsum(~same_user), index=events.index)
+    by_user = lambda values: values.groupby(block, sort=False)
+
+    # SIM change: time of the most recent SIM change seen so far within the user
+    sim_changed = changed(codes_of('sim_id'))
+    last_sim_change = by_user(ts.where(sim_changed).fillna(events['_seed_sim_change'])).ffill()
+
+    # Device change post SIM
+    device_changed = changed(codes_of('device_id')) & last_sim_change.notna()
+    device_gap_h = (ts - last_sim_change).abs().dt.total_seconds() / 3600.0
+    device_after_sim = device_changed & (device_gap_h <= config.DEVICE_CHANGE_AFTER_SIM_HOURS)
+
+    # Location: the most recent change of city
+    location = events['location']
+    location_changed = changed(codes_of('location'))
+
+    if 'is_roaming' in events.columns:
+        roaming = events['is_roaming'].astype(str).str.lower().isin(['true', '1', 'yes'])
+    else:
+        roaming = pd.Series(False, index=events.index)
+
+    updated = pd.DataFrame({
+        'end_time': by_user(ts).max().to_numpy(),
+        'last_sim_id': events['sim_id'][is_last].to_numpy(),
+        'last_device_id': events['device_id'][is_last].to_numpy(),
+        'last_location': location[is_last].to_numpy(),
+        'last_sim_change': last_sim_change[is_last].to_numpy(),
+        'device_changed_after_sim': by_user(device_after_sim).any().to_numpy(),
+        'hours_between_sim_device_change': by_user(device_gap_h.where(device_after_sim)).last().to_numpy(),
+        'location_changed_from': by_user(location.shift().where(location_changed)).last().to_numpy(),
+        'location_changed_to': by_user(location.where(location_changed)).last().to_numpy(),
+        'is_roaming': by_user(roaming).any().to_numpy(),
+    }, index=pd.Index(events['user_id'][is_last].to_numpy(), name='user_id'))
+
+    if prior is None:
+        return updated
+
+    # Continue the earlier state: flags accumulate, "most recent" values keep the older one
+    # only when the new events did not produce one
+    prior = prior.reindex(updated.index)
+    updated['device_changed_after_sim'] |= prior['device_changed_after_sim'].fillna(False).astype(bool)
+    updated['hours_between_sim_device_change'] = updated['hours_between_sim_device_change'].fillna(
+        prior['hours_between_sim_device_change']
+    )
+    no_move = updated['location_changed_to'].isna()
+    for col in ['location_changed_from', 'location_changed_to']:
+        updated[col] = updated[col].where(~no_move, prior[col])
+    updated['is_roaming'] |= prior['is_roaming'].fillna(False).astype(bool)
+    return pd.concat([state.drop(updated.index, errors='ignore'), updated])
+
+def session_state_features(state: pd.DataFrame, failed: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rule-engine inputs from per-user session state, one row per user sorted by user_id,
+    plus end_time and last_sim_id for reporting. `failed` holds per-minute failed login
+    counts (see failed_login_counts).
+    """
+    state = state.sort_index()
+    last_location = state['last_location']
+    features = pd.DataFrame({
+        'user_id': state.index.to_numpy(),
+        'hours_since_sim_change': ((state['end_time'] - state['last_sim_change']) / pd.Timedelta(hours=1)).abs().fillna(999).to_numpy(),
+        'device_changed_after_sim': state['device_changed_after_sim'].to_numpy(),
+        'hours_between_sim_device_change': state['hours_between_sim_device_change'].fillna(999).to_numpy(),
+        'previous_city': state['location_changed_from'].to_numpy(),
+        'current_city': state['location_changed_to'].to_numpy(),
+        'failed_logins_24h': windows.window_totals(failed, state['end_time']).reindex(state.index, fill_value=0).to_numpy(),
+        'is_roaming': state['is_roaming'].to_numpy(),
+        'end_time': state['end_time'].to_numpy(),
+        'last_sim_id': state['last_sim_id'].to_numpy(),
+    })
+    for col in ['previous_city', 'current_city']:
+        # Users without a location change fall back to their last known location
+        features[col] = features[col].mask(
+            features[col].isna() | (features[col] == ''), last_location.to_numpy()
+        ).fillna('')
+    return features
+
+def failed_login_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """Failed login events bucketed per user for the 24h window counter (windows.bucket_counts)."""
+    failed = df.loc[df['login_status'].eq('failed') & df['user_id'].notna() & df['timestamp'].notna()]
+    return windows.bucket_counts(failed['user_id'], failed['timestamp'])
+
+# Rule inputs of the per-user rows built from a legacy event log
+EVENT_LOG_RULE_INPUTS = [
+    'user_id',
+    'hours_since_sim_change',
+    'device_changed_after_sim',
+    'hours_between_sim_device_change',
+    'previous_city',
+    'current_city',
+    'failed_logins_24h',
+    'is_roaming',
+]
+
+def format_event_time(ts: Any) -> str:
+    return ts.strftime('%Y-%m-%d %H:%M:%S')
+
+def score_event_log_features(features: pd.DataFrame) -> Tuple[List[Dict[str, Any]], SuspiciousTable]:
+    scored = rule_engine.evaluate_frame(features[EVENT_LOG_RULE_INPUTS], render_reasons=False)
+    return collect_rule_results(scored, features['end_time'], features['last_sim_id'], format_event_time)
+
+def build_event_log_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-user rule-engine inputs for a whole legacy event log (see event_log_session_state)."""
+    return session_state_features(event_log_session_state(df), failed_login_counts(df))
+
+# Minimal set of columns that identify the new Sri Lankan per-user CSV schema
+# (time-since-SIM-change, behavioural counters, distance, tower changes, labels, etc.)
+PER_USER_SCHEMA_COLS = {
+    'user_id',
+    'phone_number',
+    'time_since_last_sim_change',
+    'num_calls_last_24h',
+    'num_sms_last_24h',
+    'data_usage_last_24h',
+    'change_in_data_usage',
+    'login_attempts',
+    'num_failed_logins_last_24h',
+    'transaction_count',
+    'account_activity_flag',
+    'sim_change_flag',
+    'device_change_flag',
+    'is_roaming',
+    'distance_change_km',
+    'change_in_cell_tower_id',
+    'risk_score',
+    'label',
+    'is_sim_swap',
+    'alert_type',
+}
+
+def user_rule_inputs(df: pd.DataFrame, towers: Optional[TowerIndex] = None) -> Tuple[pd.DataFrame, pd.Series, pd.Series, Callable[[Any], str]]:
     """
     Transform raw input into per-user feature rows for the rule engine.
+    Returns (rule inputs, timestamp and SIM shown for each row, timestamp formatter).
+    towers: trusted tower snapshot per-user rows are checked against (see tower_snapshot), or None.
 
     Supports two schemas:
     1) Legacy event logs (timestamp, sim_id, device_id, location, login_status, is_roaming)
@@ -118,167 +510,308 @@ def build_user_feature_rows(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], Lis
        account_age_days, avg_monthly_call_duration, avg_monthly_data_usage_gb,
        num_unique_contacts_30d, recent_password_change_flag, fraud_report_flag, sim_swap_label
     """
-    user_features: List[Dict[str, Any]] = []
-    suspicious_rows: List[Dict[str, Any]] = []
-
-    # Minimal set of columns that identify the new Sri Lankan per-user CSV schema
-    # (time-since-SIM-change, behavioural counters, distance, tower changes, labels, etc.)
-    new_schema_cols = {
-        'user_id',
-        'phone_number',
-        'time_since_last_sim_change',
-        'num_calls_last_24h',
-        'num_sms_last_24h',
-        'data_usage_last_24h',
-        'change_in_data_usage',
-        'login_attempts',
-        'num_failed_logins_last_24h',
-        'transaction_count',
-        'account_activity_flag',
-        'sim_change_flag',
-        'device_change_flag',
-        'is_roaming',
-        'distance_change_km',
-        'change_in_cell_tower_id',
-        'risk_score',
-        'label',
-        'is_sim_swap',
-        'alert_type',
-    }
-
-    if new_schema_cols.issubset(set(df.columns)):
+    if PER_USER_SCHEMA_COLS.issubset(set(df.columns)):
         # New per-user CSV: each row already represents a user summary / snapshot.
-        for _, row in df.iterrows():
-            feature_row = {
-                'user_id': row.get('user_id'),
-                'time_since_last_sim_change': row.get('time_since_last_sim_change', 0),
-                'num_calls_last_24h': row.get('num_calls_last_24h', 0),
-                'num_sms_last_24h': row.get('num_sms_last_24h', 0),
-                'data_usage_last_24h': row.get('data_usage_last_24h', 0.0),
-                'change_in_data_usage': row.get('change_in_data_usage', 0.0),
-                'login_attempts': row.get('login_attempts', 0),
-                'num_failed_logins_last_24h': row.get('num_failed_logins_last_24h', 0),
-                'transaction_count': row.get('transaction_count', 0),
-                'account_activity_flag': row.get('account_activity_flag', 0),
-                'sim_change_flag': row.get('sim_change_flag', 0),
-                'device_change_flag': row.get('device_change_flag', 0),
-                'is_roaming': row.get('is_roaming', 0),
-                'distance_change_km': row.get('distance_change_km', 0.0),
-                'change_in_cell_tower_id': row.get('change_in_cell_tower_id', 0),
-            }
+        # Project the rule inputs once and score every row in one columnar pass.
+        feature_cols = [
+            'user_id',
+            'time_since_last_sim_change',
+            'num_calls_last_24h',
+            'num_sms_last_24h',
+            'data_usage_last_24h',
+            'change_in_data_usage',
+            'login_attempts',
+            'num_failed_logins_last_24h',
+            'transaction_count',
+            'account_activity_flag',
+            'sim_change_flag',
+            'device_change_flag',
+            'is_roaming',
+            'distance_change_km',
+            'change_in_cell_tower_id',
+        ]
+        features = df[feature_cols]
+        # Distance / elapsed time / km/h between the previous and current position of every row
+        velocity = velocity_features(df)
+        if velocity is not None:
+            features = pd.concat([features, velocity], axis=1)
+        # Serving tower vs reported location, against tower positions learned from earlier uploads
+        tower_features = towers.features(df) if towers is not None else None
+        if tower_features is not None:
+            features = pd.concat([features, tower_features], axis=1)
+        timestamps = df['timestamp'] if 'timestamp' in df.columns else pd.Series('N/A', index=df.index)
+        return features, timestamps, df['phone_number'], str
+
+    # Legacy log-based schema: reconstruct per-user sessions, one row per user
+    features = build_event_log_features(df)
+    return features[EVENT_LOG_RULE_INPUTS], features['end_time'], features['last_sim_id'], format_event_time
 
-            rule_result = rule_engine.evaluate_user(feature_row)
-
-            user_features.append({
-                'user_id': feature_row['user_id'],
-                'risk_score': rule_result['risk_score'],
-                'alert_level': rule_result['alert_level'],
-                'alert_emoji': rule_result['alert_emoji'],
-                'triggered_rules': rule_result['triggered_rules'],
-                'total_rules_triggered': rule_result['total_rules_triggered'],
-            })
-
-            if rule_result['triggered_rules']:
-                reasons = '; '.join(r['reason'] for r in rule_result['triggered_rules'])
-                suspicious_rows.append({
-                    'timestamp': str(row.get('timestamp', 'N/A')),
-                    'user_id': feature_row['user_id'],
-                    'sim_id': row.get('phone_number', ''),
-                    'risk_level': rule_result['alert_level'],
-                    'flag_reason': reasons,
-                })
+def build_user_feature_rows(df: pd.DataFrame, towers: Optional[TowerIndex] = None) -> Tuple[List[Dict[str, Any]], SuspiciousTable]:
+    """Score every user row of df in one columnar pass (see user_rule_inputs for the schemas)."""
+    features, timestamps, sim_ids, format_timestamp = user_rule_inputs(df, towers)
+    scored = rule_engine.evaluate_frame(features, render_reasons=False)
+    return collect_rule_results(scored, timestamps, sim_ids, format_timestamp)
+
+def score_upload_incremental(df: pd.DataFrame, towers: Optional[TowerIndex] = None) -> Tuple[SuspiciousTable, SuspiciousTable]:
+    """
+    Score df against the fingerprint index of earlier analyses: only user rows without a
+    matching fingerprint are evaluated, the others carry over their stored evaluation.
+    Returns (evaluation of every user row, flagged rows), both in build_user_feature_rows order;
+    the output equals scoring every row.
+    """
+    features, timestamps, sim_ids, format_timestamp = user_rule_inputs(df, towers)
+    # Shown in the results, so part of what must match
+    shown = pd.DataFrame({SHOWN_TIMESTAMP: timestamps.to_numpy(), SHOWN_SIM_ID: sim_ids.to_numpy()}, index=features.index)
+    keyed = pd.concat([features, shown], axis=1)
+    schema = schema_key(keyed)
+    primary, check = fingerprints(keyed)
+
+    snapshot = fingerprint_index.load(schema, RULESET_SIGNATURE)
+    matched = snapshot.match(primary, check) if snapshot is not None else np.full(len(features), -1)
+    changed = matched < 0
+    rescored = score_changed_rows(keyed[changed], format_timestamp)
+    if snapshot is None:
+        rows = rescored
     else:
-        # Legacy log-based schema.
-        for user_id, group in df.groupby('user_id'):
-            group = group.sort_values('timestamp').reset_index(drop=True)
-            end_time = group['timestamp'].max()
-
-            # Calculate heuristics
-            last_sim_id = None
-            last_device_id = None
-            last_location = None
-            last_sim_change_time = None
-
-            previous_city = ''
-            current_city = ''
-            device_change_after_sim = False
-            hours_between_sim_device_change = 999
-            is_roaming = False
-
-            # Count failed logins in last 24h
-            recent_failed = group[
-                (group['login_status'] == 'failed')
-                & (group['timestamp'] >= end_time - timedelta(hours=24))
-            ]
-            failed_logins_24h = len(recent_failed)
-
-            for _, row in group.iterrows():
-                ts = row['timestamp']
-
-                # SIM Change
-                if last_sim_id is not None and row['sim_id'] != last_sim_id:
-                    last_sim_change_time = ts
-
-                # Device Change post SIM
-                if last_sim_change_time and last_device_id is not None and row['device_id'] != last_device_id:
-                    diff = hours_between(ts, last_sim_change_time)
-                    if diff <= config.DEVICE_CHANGE_AFTER_SIM_HOURS:
-                        device_change_after_sim = True
-                        hours_between_sim_device_change = diff
-
-                # Location
-                if last_location is not None and row['location'] != last_location:
-                    previous_city = last_location
-                    current_city = row['location']
-
-                # Roaming Check
-                if 'is_roaming' in row:
-                    val = str(row['is_roaming']).lower()
-                    if val in ['true', '1', 'yes']:
-                        is_roaming = True
-
-                last_sim_id = row['sim_id']
-                last_device_id = row['device_id']
-                last_location = row['location']
-
-            hours_since_sim_change = (
-                hours_between(end_time, last_sim_change_time) if last_sim_change_time else 999
-            )
-
-            feature_row = {
-                'user_id': user_id,
-                'hours_since_sim_change': hours_since_sim_change,
-                'device_changed_after_sim': device_change_after_sim,
-                'hours_between_sim_device_change': hours_between_sim_device_change,
-                'previous_city': previous_city or last_location or '',
-                'current_city': current_city or last_location or '',
-                'failed_logins_24h': failed_logins_24h,
-                'is_roaming': is_roaming,
+        rows = carry_over(snapshot.rows, matched, rescored, list(rule_engine.rules))
+    logger.info(f"Incremental analysis: {int(changed.sum())} of {len(features)} user row(s) scored, "
+                f"{int((~changed).sum())} carried over")
+
+    fingerprint_index.save(schema, RULESET_SIGNATURE, Snapshot(primary, check, rows), snapshot, list(rule_engine.rules))
+    return rows, rows.take(np.flatnonzero(rows.rule_bits))
+
+# Columns added to the rule inputs for fingerprinting (see score_upload_incremental)
+SHOWN_TIMESTAMP = '_timestamp'
+SHOWN_SIM_ID = '_sim_id'
+
+def score_rule_inputs(keyed: pd.DataFrame, format_timestamp: Callable[[Any], str]) -> Tuple[List[Dict[str, Any]], SuspiciousTable]:
+    """Evaluate rule inputs plus their shown timestamp and SIM; the table holds every row (no user features)."""
+    scored = rule_engine.evaluate_frame(keyed.drop(columns=[SHOWN_TIMESTAMP, SHOWN_SIM_ID]), render_reasons=False)
+    return [], scored_table(scored, keyed[SHOWN_TIMESTAMP], keyed[SHOWN_SIM_ID], format_timestamp)
+
+def score_changed_rows(keyed: pd.DataFrame, format_timestamp: Callable[[Any], str]) -> SuspiciousTable:
+    """score_rule_inputs, sharded by user across SCORING_WORKERS processes when enough rows changed."""
+    if SCORING_WORKERS >= 2 and len(keyed) >= PARALLEL_MIN_ROWS and parallel_scoring.pa is not None:
+        scorer = functools.partial(score_rule_inputs, format_timestamp=format_timestamp)
+        try:
+            return parallel_scoring.score_parallel(keyed, scorer, SCORING_WORKERS, parallel_scoring.merge_table_by_row)[1]
+        except Exception:
+            logger.exception("Parallel scoring failed; scoring in one process")
+    return score_rule_inputs(keyed, format_timestamp)[1]
+
+def score_upload_rows(df: pd.DataFrame, towers: Optional[TowerIndex] = None) -> Tuple[List[Dict[str, Any]], SuspiciousTable]:
+    """
+    build_user_feature_rows, sharded by user across SCORING_WORKERS processes for
+    large uploads. Output is identical to the single-process result.
+    """
+    if SCORING_WORKERS < 2 or len(df) < PARALLEL_MIN_ROWS or parallel_scoring.pa is None:
+        return build_user_feature_rows(df, towers)
+    if PER_USER_SCHEMA_COLS.issubset(set(df.columns)):
+        merge = parallel_scoring.merge_by_row  # one result per input row, in row order
+    else:
+        merge = parallel_scoring.merge_by_user  # one result per user, sorted by user_id
+    try:
+        scorer = functools.partial(build_user_feature_rows, towers=towers)
+        return parallel_scoring.score_parallel(df, scorer, SCORING_WORKERS, merge)
+    except Exception:
+        logger.exception("Parallel scoring failed; scoring in one process")
+        return build_user_feature_rows(df, towers)
+
+def tower_snapshot() -> Optional[TowerIndex]:
+    """Trusted towers an analysis checks rows against, taken once before it starts (None when the check is off)."""
+    return tower_registry.index() if tower_registry is not None else None
+
+def learn_towers(positions: Optional[pd.DataFrame], upload_path: str) -> None:
+    """Add an analyzed upload's tower reports to the registry, once per upload content."""
+    if tower_registry is not None and positions is not None:
+        tower_registry.observe(positions, dataset_cache.content_hash(upload_path))
+
+# Columns required for the behavioural feature stats of the per-user CSV schema
+FEATURE_STATS_COLS = {
+    'time_since_last_sim_change',
+    'sim_change_flag',
+    'device_change_flag',
+    'num_calls_last_24h',
+    'num_sms_last_24h',
+    'data_usage_last_24h',
+    'change_in_data_usage',
+    'num_failed_logins_last_24h',
+    'transaction_count',
+    'account_activity_flag',
+    'is_roaming',
+    'distance_change_km',
+    'change_in_cell_tower_id',
+    'is_sim_swap',
+    'alert_type',
+}
+
+# Averaged feature stats -> source column
+FEATURE_STAT_MEANS = {
+    'avg_time_since_last_sim_change_h': 'time_since_last_sim_change',
+    'avg_calls_last_24h': 'num_calls_last_24h',
+    'avg_sms_last_24h': 'num_sms_last_24h',
+    'avg_data_usage_last_24h': 'data_usage_last_24h',
+    'avg_change_in_data_usage': 'change_in_data_usage',
+    'avg_transaction_count': 'transaction_count',
+    'avg_distance_change_km': 'distance_change_km',
+}
+
+# Counted feature stats -> row condition
+FEATURE_STAT_COUNTS: Dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    'recent_sim_change_users': lambda df: df['time_since_last_sim_change'] <= config.SIM_CHANGE_HOURS_THRESHOLD,
+    'users_with_sim_change_flag': lambda df: df['sim_change_flag'] == 1,
+    'users_with_device_change_flag': lambda df: df['device_change_flag'] == 1,
+    'high_failed_login_users': lambda df: df['num_failed_logins_last_24h'] >= config.FAILED_LOGIN_COUNT_THRESHOLD,
+    'high_activity_flag_users': lambda df: df['account_activity_flag'] == 1,
+    'roaming_users': lambda df: df['is_roaming'] == 1,
+    'high_distance_users': lambda df: df['distance_change_km'] >= config.LOCATION_DISTANCE_KM_THRESHOLD,
+    'high_cell_tower_change_users': lambda df: df['change_in_cell_tower_id'] >= config.CELL_TOWER_CHANGE_COUNT_THRESHOLD,
+    'sim_swap_labelled_users': lambda df: df['is_sim_swap'] == 1,
+}
+
+def feature_stat_totals(df: pd.DataFrame) -> Dict[str, Tuple[float, int]]:
+    """Additive (sum, count) parts of the feature stats, so chunks can be combined before averaging."""
+    totals = {key: (float(df[col].sum()), int(df[col].count())) for key, col in FEATURE_STAT_MEANS.items()}
+    totals.update({key: (float(condition(df).sum()), len(df)) for key, condition in FEATURE_STAT_COUNTS.items()})
+    return totals
+
+def add_feature_stat_totals(
+    totals: Dict[str, Tuple[float, int]], more: Dict[str, Tuple[float, int]]
+) -> Dict[str, Tuple[float, int]]:
+    if not totals: return more
+    return {key: (totals[key][0] + more[key][0], totals[key][1] + more[key][1]) for key in totals}
+
+def finalize_feature_stats(totals: Dict[str, Tuple[float, int]]) -> Dict[str, Any]:
+    return {
+        key: (float(total / count) if count else float('nan')) if key in FEATURE_STAT_MEANS else int(total)
+        for key, (total, count) in totals.items()
+    }
+
+def build_analysis_results(
+    total_records: int,
+    users_analyzed: int,
+    high: int,
+    medium: int,
+    suspicious: SuspiciousTable,
+    feature_stats: Dict[str, Any],
+) -> Dict[str, Any]:
+    low = users_analyzed - high - medium
+    return {
+        # Unique per run, unlike timestamp; /results cursors are tied to it
+        'analysis_id': uuid.uuid4().hex,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'summary': {
+            'total_records': total_records,
+            'suspicious_count': high + medium,
+            'clean_count': low,
+            'users_analyzed': users_analyzed,
+            'high_risk_users': high,
+            'medium_risk_users': medium,
+            'clean_users': low,
+        },
+        'risk_distribution': {'High': high, 'Medium': medium, 'Low': low},
+        # Columnar; AnalysisStore keeps it next to results.json (see result_table)
+        'suspicious_activities': suspicious,
+        'total_suspicious_activities': len(suspicious),
+        'feature_stats': feature_stats,
+    }
+
+def count_alert_levels(user_results: List[Dict[str, Any]]) -> Tuple[int, int]:
+    high = sum(1 for u in user_results if u['alert_level'] == 'HIGH')
+    medium = sum(1 for u in user_results if u['alert_level'] == 'MEDIUM')
+    return high, medium
+
+def stream_analyze_csv(
+    filepath: str, chunk_rows: int = STREAM_CHUNK_ROWS, progress: Optional[Callable[[float, str], None]] = None,
+    towers: Optional[TowerIndex] = None, tower_reports: Optional[TowerReports] = None
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Analyze a CSV upload in fixed-size chunks without loading it whole.
+
+    Per-user snapshot rows are scored chunk by chunk, keeping only risk counts, flagged
+    rows and feature-stat totals. Event logs keep per-user session state (see
+    event_log_session_state) plus each user's per-minute failed login counts from the
+    trailing 24h, and are scored once the file has been read. Memory grows with the
+    number of users and flagged rows, not with the file size.
+    progress(fraction, message) is called before each chunk with the share of the file read.
+    Rows are checked against the `towers` snapshot; the file's tower reports are gathered
+    into `tower_reports` for learning once the analysis is stored.
+    Returns (upload summary, analysis results).
+    """
+    report = progress or (lambda fraction, message: None)
+    size = max(os.path.getsize(filepath), 1)
+    records = 0
+    columns: Optional[List[str]] = None
+    per_user_schema = False
+    parse_failures = 0
+    starts: List[Any] = []
+    ends: List[Any] = []
+
+    users = high = medium = 0
+    suspicious_tables: List[SuspiciousTable] = []
+    stat_totals: Dict[str, Tuple[float, int]] = {}
+    state: Optional[pd.DataFrame] = None
+    failed: Optional[pd.DataFrame] = None
+
+    with open(filepath, 'rb') as f:
+        for chunk in pd.read_csv(f, chunksize=chunk_rows):
+            report(0.9 * f.tell() / size, f'Scoring rows {records + 1}-{records + len(chunk)}')
+            chunk = normalize_uploaded_dataframe(chunk)
+            if columns is None:
+                columns = list(chunk.columns)
+                per_user_schema = PER_USER_SCHEMA_COLS.issubset(set(chunk.columns))
+            records += len(chunk)
+            if 'timestamp' in chunk.columns:
+                parse_failures += chunk.attrs.get('timestamp_parse_failures', 0)
+                starts.append(chunk['timestamp'].min())
+                ends.append(chunk['timestamp'].max())
+
+            if tower_reports is not None:
+                tower_reports.add(chunk)
+            if per_user_schema:
+                user_results, table = build_user_feature_rows(chunk, towers)
+                chunk_high, chunk_medium = count_alert_levels(user_results)
+                users, high, medium = users + len(user_results), high + chunk_high, medium + chunk_medium
+                suspicious_tables.append(table)
+                if FEATURE_STATS_COLS.issubset(set(chunk.columns)):
+                    stat_totals = add_feature_stat_totals(stat_totals, feature_stat_totals(chunk))
+            else:
+                state = event_log_session_state(chunk, state)
+                # Only buckets inside a user's trailing 24h window can still count
+                failed = windows.trim_counts(windows.merge_counts(failed, failed_login_counts(chunk)), state['end_time'])
+
+    if not per_user_schema and state is not None:
+        user_results, table = score_event_log_features(session_state_features(state, failed))
+        suspicious_tables = [table]
+        users = len(user_results)
+        high, medium = count_alert_levels(user_results)
+
+    upload_info: Dict[str, Any] = {'records_count': records, 'columns': columns or []}
+    if starts:
+        upload_info['timestamp_parse_failures'] = parse_failures
+        start, end = pd.Series(starts).min(), pd.Series(ends).max()
+        if pd.notna(start):
+            upload_info['date_range'] = {
+                'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+                'end': end.strftime('%Y-%m-%d %H:%M:%S'),
             }
 
-            # Run Rule Engine
-            rule_result = rule_engine.evaluate_user(feature_row)
-
-            user_features.append({
-                'user_id': user_id,
-                'risk_score': rule_result['risk_score'],
-                'alert_level': rule_result['alert_level'],
-                'alert_emoji': rule_result['alert_emoji'],
-                'triggered_rules': rule_result['triggered_rules'],
-                'total_rules_triggered': rule_result['total_rules_triggered'],
-            })
-
-            if rule_result['triggered_rules']:
-                reasons = '; '.join(r['reason'] for r in rule_result['triggered_rules'])
-                suspicious_rows.append({
-                    'timestamp': end_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'user_id': user_id,
-                    'sim_id': last_sim_id,
-                    'risk_level': rule_result['alert_level'],
-                    'flag_reason': reasons,
-                })
-
-    return user_features, suspicious_rows
+    results = build_analysis_results(
+        records, users, high, medium, SuspiciousTable.concat(suspicious_tables, list(rule_engine.rules)),
+        finalize_feature_stats(stat_totals) if stat_totals else {}
+    )
+    results['streamed'] = True
+    return upload_info, results
+
+def stream_analyze_job(ctx: JobContext, upload_id: str, filepath: str) -> Dict[str, Any]:
+    with analysis_store.hold(upload_id):
+        tower_reports = TowerReports()
+        upload_info, results = stream_analyze_csv(filepath, progress=ctx.progress, towers=tower_snapshot(),
+                                                  tower_reports=tower_reports)
+        save_results(upload_id, results)
+        analysis_store.update_meta(upload_id, **upload_info)
+        learn_towers(tower_reports.positions, filepath)
+    return {'upload_id': upload_id, 'summary': results['summary'], **upload_info}
 
 @app.route('/', methods=['GET'])
 def home():
@@ -286,23 +819,51 @@ def home():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    global uploaded_data
+    # Only CSVs may be this large (they are streamed); other files are rejected above IN_MEMORY_UPLOAD_LIMIT
+    request.max_content_length = STREAM_UPLOAD_MAX_BYTES
     try:
         if 'file' not in request.files: return jsonify({'status': 'error', 'message': 'No file'}), 400
         file = request.files['file']
         if file.filename == '': return jsonify({'status': 'error', 'message': 'No selected file'}), 400
         
         filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        upload_id = analysis_store.create(filename)
+        filepath = analysis_store.upload_path(upload_id, filename)
         file.save(filepath)
         
         try:
-            df = load_uploaded_dataframe(filepath)
-            df = normalize_uploaded_dataframe(df)
-            uploaded_data = df
+            is_csv = filepath.rsplit('.', 1)[-1].lower() == 'csv'
+            too_large = os.path.getsize(filepath) > IN_MEMORY_UPLOAD_LIMIT
+            stream = str(request.values.get('stream', '')).lower() in ['true', '1', 'yes']
+
+            if is_csv and (stream or too_large):
+                # Scored while it is read, in a background job; only per-user aggregates stay in memory
+                job_id = submit_upload_job(
+                    upload_id, 'analyze', stream_analyze_job, upload_id, filepath,
+                    on_done=functools.partial(build_reports_when_analyzed, upload_id))
+                analysis_store.update_meta(upload_id, streamed=True, analysis_job=job_id)
+                return jsonify({
+                    'status': 'accepted',
+                    'upload_id': upload_id,
+                    'filename': filename,
+                    'streamed': True,
+                    'job_id': job_id,
+                    'status_url': f'/jobs/{job_id}',
+                }), 202
+            if too_large:
+                analysis_store.delete(upload_id)
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Excel uploads are limited to 16MB; export larger datasets as CSV',
+                }), 400
+
+            df = load_normalized_dataframe(filepath)
+            analysis_store.put_dataset(upload_id, df)
+            analysis_store.update_meta(upload_id, records_count=len(df))
 
             response: Dict[str, Any] = {
                 'status': 'success',
+                'upload_id': upload_id,
                 'filename': filename,
                 'records_count': len(df),
                 'columns': list(df.columns),
@@ -310,6 +871,8 @@ def upload_file():
 
             # Legacy log-based datasets have a timestamp column; new per-user CSVs don't.
             if 'timestamp' in df.columns:
+                response['timestamp_parse_failures'] = df.attrs.get('timestamp_parse_failures', 0)
+            if 'timestamp' in df.columns and df['timestamp'].notna().any():
                 response['date_range'] = {
                     'start': df['timestamp'].min().strftime('%Y-%m-%d %H:%M:%S'),
                     'end': df['timestamp'].max().strftime('%Y-%m-%d %H:%M:%S'),
@@ -317,101 +880,193 @@ def upload_file():
 
             return jsonify(response)
         except Exception as e:
+            analysis_store.delete(upload_id)
             return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/analyze', methods=['POST'])
-def analyze_data():
-    global uploaded_data, analysis_results
-    if uploaded_data is None: return jsonify({'status': 'error', 'message': 'No data uploaded'}), 400
-    
+def analyze_upload(upload_id: str, progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+    """Run the rule-based analysis on a stored upload and save its results."""
+    report = progress or (lambda fraction, message: None)
+    report(0.05, 'Loading dataset')
+    uploaded_data = analysis_store.get_dataset(upload_id)
+    if uploaded_data is None:
+        raise ValueError('No data uploaded')
+
+    towers = tower_snapshot()
+
+    report(0.2, 'Scoring users')
+    if INCREMENTAL_ANALYSIS:
+        rows, suspicious = score_upload_incremental(uploaded_data, towers)
+        users = len(rows)
+        high, medium = (int(rows.level_mask([level]).sum()) for level in ('HIGH', 'MEDIUM'))
+    else:
+        user_results, suspicious = score_upload_rows(uploaded_data, towers)
+        users = len(user_results)
+        high, medium = count_alert_levels(user_results)
+
+    report(0.8, 'Summarizing results')
+
+    # Optional: richer stats for new per-user CSV schema
+    feature_stats: Dict[str, Any] = {}
+    if FEATURE_STATS_COLS.issubset(set(uploaded_data.columns)):
+        feature_stats = finalize_feature_stats(feature_stat_totals(uploaded_data))
+
+    results = build_analysis_results(
+        len(uploaded_data), users, high, medium, suspicious, feature_stats
+    )
+    save_results(upload_id, results)
+
+    if tower_registry is not None:
+        report(0.9, 'Updating tower registry')
+        learn_towers(tower_positions(uploaded_data),
+                     analysis_store.upload_path(upload_id, analysis_store.get_meta(upload_id)['filename']))
+    return results
+
+def analyze_job(ctx: JobContext, upload_id: str) -> Dict[str, Any]:
+    with analysis_store.hold(upload_id):
+        return {'upload_id': upload_id, 'summary': analyze_upload(upload_id, ctx.progress)['summary']}
+
+def build_reports_job(ctx: JobContext, upload_id: str) -> Dict[str, Any]:
+    with analysis_store.hold(upload_id):
+        results = analysis_store.get_results(upload_id)
+        if results is None:
+            return {'upload_id': upload_id, 'formats': []}
+        directory = analysis_store.entry_dir(upload_id)
+        formats = report_cache.build_all(directory, results, ctx.progress)
+        current = analysis_store.get_results(upload_id)
+        if current is not None and current.get('analysis_id') != results.get('analysis_id'):
+            # Re-analyzed while rendering; drop what was just built for the replaced results
+            report_cache.invalidate(directory, keep=current)
+        return {'upload_id': upload_id, 'formats': formats}
+
+def submit_upload_job(upload_id: str, kind: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> str:
+    """Queue a job working on an upload; the store keeps the upload until the job has finished."""
+    with analysis_store.hold(upload_id):
+        job_id = job_queue.submit(kind, func, *args, **kwargs)
+        analysis_store.add_job(upload_id, job_id)
+    return job_id
+
+def schedule_report_build(upload_id: str) -> None:
+    """Render the report artifacts of an upload's new results in the background, ahead of /report."""
+    if not REPORT_PREBUILD:
+        return
     try:
-        user_results, suspicious_rows = build_user_feature_rows(uploaded_data)
+        submit_upload_job(upload_id, 'reports', build_reports_job, upload_id)
+    except Exception as e:
+        # Not fatal: /report renders on first request instead
+        logger.warning(f"Could not schedule report rendering for {upload_id} ({e})")
 
-        high = len([u for u in user_results if u['alert_level'] == 'HIGH'])
-        medium = len([u for u in user_results if u['alert_level'] == 'MEDIUM'])
-        low = len(user_results) - high - medium
+def build_reports_when_analyzed(upload_id: str, job_id: str, record: Dict[str, Any]) -> None:
+    if record.get('status') == 'succeeded':
+        schedule_report_build(upload_id)
 
-        # Optional: richer stats for new per-user CSV schema
-        feature_stats: Dict[str, Any] = {}
-        new_csv_cols = {
-            'time_since_last_sim_change',
-            'sim_change_flag',
-            'device_change_flag',
-            'num_calls_last_24h',
-            'num_sms_last_24h',
-            'data_usage_last_24h',
-            'change_in_data_usage',
-            'num_failed_logins_last_24h',
-            'transaction_count',
-            'account_activity_flag',
-            'is_roaming',
-            'distance_change_km',
-            'change_in_cell_tower_id',
-            'is_sim_swap',
-            'alert_type',
-        }
+@app.route('/analyze', methods=['POST'])
+def analyze_data():
+    upload_id, error = resolve_upload_id()
+    if error: return error
 
-        if new_csv_cols.issubset(set(uploaded_data.columns)):
-            df = uploaded_data
-            feature_stats = {
-                'avg_time_since_last_sim_change_h': float(df['time_since_last_sim_change'].mean()),
-                'recent_sim_change_users': int(
-                    (df['time_since_last_sim_change'] <= config.SIM_CHANGE_HOURS_THRESHOLD).sum()
-                ),
-                'users_with_sim_change_flag': int((df['sim_change_flag'] == 1).sum()),
-                'users_with_device_change_flag': int((df['device_change_flag'] == 1).sum()),
-                'avg_calls_last_24h': float(df['num_calls_last_24h'].mean()),
-                'avg_sms_last_24h': float(df['num_sms_last_24h'].mean()),
-                'avg_data_usage_last_24h': float(df['data_usage_last_24h'].mean()),
-                'avg_change_in_data_usage': float(df['change_in_data_usage'].mean()),
-                'high_failed_login_users': int(
-                    (df['num_failed_logins_last_24h'] >= config.FAILED_LOGIN_COUNT_THRESHOLD).sum()
-                ),
-                'avg_transaction_count': float(df['transaction_count'].mean()),
-                'high_activity_flag_users': int((df['account_activity_flag'] == 1).sum()),
-                'roaming_users': int((df['is_roaming'] == 1).sum()),
-                'avg_distance_change_km': float(df['distance_change_km'].mean()),
-                'high_distance_users': int(
-                    (df['distance_change_km'] >= config.LOCATION_DISTANCE_KM_THRESHOLD).sum()
-                ),
-                'high_cell_tower_change_users': int(
-                    (df['change_in_cell_tower_id'] >= config.CELL_TOWER_CHANGE_COUNT_THRESHOLD).sum()
-                ),
-                'sim_swap_labelled_users': int((df['is_sim_swap'] == 1).sum()),
-            }
+    if not analysis_store.has_dataset(upload_id):
+        # Streamed uploads are analyzed while they are read, by the job /upload started
+        results = analysis_store.get_results(upload_id)
+        if results and results.get('streamed'):
+            return jsonify({'status': 'success', 'upload_id': upload_id, 'summary': results['summary']})
+        job_id = (analysis_store.get_meta(upload_id) or {}).get('analysis_job')
+        record = job_queue.get(job_id) if job_id else None
+        if record is not None and record.get('status') in ('queued', 'running'):
+            return job_accepted(job_id)
+        if record is not None and record.get('status') in ('failed', 'cancelled'):
+            return jsonify({'status': 'error', 'message': f"Streamed analysis {record['status']}", 'job': record}), 500
+        return jsonify({'status': 'error', 'message': 'No data uploaded'}), 400
 
-        analysis_results = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'summary': {
-                'total_records': len(uploaded_data),
-                'suspicious_count': high + medium,
-                'clean_count': low,
-                'users_analyzed': len(user_results),
-                'high_risk_users': high,
-                'medium_risk_users': medium,
-                'clean_users': low,
-            },
-            'risk_distribution': {'High': high, 'Medium': medium, 'Low': low},
-            'suspicious_activities': suspicious_rows,
-            'total_suspicious_activities': len(suspicious_rows),
-            'feature_stats': feature_stats,
-        }
-        return jsonify({'status': 'success', 'summary': analysis_results['summary']})
+    if wants_async():
+        return job_accepted(submit_upload_job(
+            upload_id, 'analyze', analyze_job, upload_id,
+            on_done=functools.partial(build_reports_when_analyzed, upload_id)))
+    
+    try:
+        with analysis_store.hold(upload_id):
+            results = analyze_upload(upload_id)
+        schedule_report_build(upload_id)
+        return jsonify({'status': 'success', 'upload_id': upload_id, 'summary': results['summary']})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+RESULTS_PAGE_SIZE = 500
+RESULTS_MAX_PAGE_SIZE = 10_000
+
+def split_arg(name: str) -> List[str]:
+    """Comma-separated (or repeated) query argument as a list of non-empty values."""
+    return [v.strip() for raw in request.args.getlist(name) for v in raw.split(',') if v.strip()]
+
+EXPORT_FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+    'csv': (iter_csv, 'text/csv'),
+}
+
 @app.route('/results', methods=['GET'])
 def get_results():
-    if not analysis_results: return jsonify({'status': 'error', 'message': 'No analysis'}), 400
+    """
+    Analysis summary plus one page of suspicious activities.
+    Query args: risk_level (comma list), user_id, rule (comma list, any of), sort (row | risk_score |
+    risk_score_asc), limit, cursor (page.next_cursor of the previous page), format=ndjson|csv to
+    stream every matching row (after cursor, up to limit when given) as newline-delimited JSON or CSV.
+    """
+    upload_id, error = resolve_upload_id()
+    analysis_results = analysis_store.get_results(upload_id) if upload_id else None
+    if not analysis_results:
+        return error or (jsonify({'status': 'error', 'message': 'No analysis'}), 400)
+
+    risk_levels = [level.upper() for level in split_arg('risk_level')]
+    rules = split_arg('rule')
+    sort = request.args.get('sort', 'row')
+    unknown_levels = sorted(set(risk_levels) - set(RISK_LEVELS))
+    unknown_rules = sorted(set(rules) - set(rule_engine.rules))
+    if unknown_levels or unknown_rules or sort not in SORT_ORDERS:
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid filter',
+            'unknown_risk_levels': unknown_levels,
+            'unknown_rules': unknown_rules,
+            'sort_orders': list(SORT_ORDERS),
+        }), 400
+
+    export = request.args.get('format')
+    if export is not None and export not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"Unknown format; use one of {', '.join(EXPORT_FORMATS)}"}), 400
+    limit = request.args.get('limit', None if export else RESULTS_PAGE_SIZE, type=int)
+    if limit is not None:
+        limit = max(0, limit) if export else min(max(0, limit), RESULTS_MAX_PAGE_SIZE)
+
+    view = view_for(analysis_results)
+    ordered = view.select(risk_levels, request.args.get('user_id'), rules, sort)
+    try:
+        page = view.page(ordered, sort, request.args.get('cursor'), limit)
+    except CursorError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    if export:
+        stream_rows, mimetype = EXPORT_FORMATS[export]
+        return Response(
+            stream_rows(view.table, page['positions']),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=simguard_results_{upload_id}.{export}'},
+        )
+
     return jsonify({
         'status': 'success', 
+        'upload_id': upload_id,
         'analysis_timestamp': analysis_results['timestamp'],
         'summary': analysis_results['summary'],
         'risk_distribution': analysis_results['risk_distribution'],
-        'suspicious_activities': analysis_results['suspicious_activities'],
+        'suspicious_activities': view.table.records(page['positions']),
         'total_suspicious_activities': analysis_results['total_suspicious_activities'],
+        'page': {
+            'limit': limit,
+            'returned': len(page['positions']),
+            'total_matching': len(ordered),
+            'next_cursor': page['next_cursor'],
+        },
         # Expose feature-level statistics (when available) so the frontend and PDF
         # report can provide a richer narrative about the dataset.
         'feature_stats': analysis_results.get('feature_stats', {})
@@ -419,6 +1074,14 @@ def get_results():
 
 # --- ML ENDPOINTS (INTEGRATED) ---
 
+def probability_risk_level(prob: float) -> str:
+    """Risk level from probability bands (0-1): HIGH >80%, MEDIUM 50-80%, LOW <50%."""
+    if prob > 0.8:
+        return 'HIGH'
+    if prob >= 0.5:
+        return 'MEDIUM'
+    return 'LOW'
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Manual prediction using Thinker Model + rule-based risk (differentiates LOW/MEDIUM/HIGH by probability)."""
@@ -426,14 +1089,9 @@ def predict():
         data = request.json
         result = ml_engine.predict(data)
         
-        # Risk level from probability bands (confidence is 0-1): HIGH >80%, MEDIUM 50-80%, LOW <50%
+        # Risk level from probability bands (confidence is 0-1)
         prob = float(result.get('confidence', 0))
-        if prob > 0.8:
-            risk_level = 'HIGH'
-        elif prob >= 0.5:
-            risk_level = 'MEDIUM'
-        else:
-            risk_level = 'LOW'
+        risk_level = probability_risk_level(prob)
 
         return jsonify({
             'status': 'success',
@@ -445,20 +1103,73 @@ def predict():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+PREDICT_BATCH_MAX_RECORDS = 100_000
+PREDICT_BATCH_MAX_BYTES = 64 * 1024 * 1024  # request cap of /predict/batch (room for PREDICT_BATCH_MAX_RECORDS as JSON)
+
+def too_many_batch_records():
+    return jsonify({'status': 'error', 'message': f'At most {PREDICT_BATCH_MAX_RECORDS} records per batch'}), 400
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Score many events in one call with ThinkerModel.predict_batch.
+    Accepts a JSON list of /predict payloads (or {"records": [...]}) or an uploaded CSV/Excel file.
+    """
+    request.max_content_length = PREDICT_BATCH_MAX_BYTES
+    # Read the body outside the try below, so an oversized request answers 413 rather than 500
+    request.get_data(parse_form_data=True)
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            if not allowed_file(file.filename):
+                return jsonify({'status': 'error', 'message': 'Unsupported file type'}), 400
+            # One row past the limit is enough to reject a file; the rest of it is never parsed
+            if file.filename.rsplit('.', 1)[1].lower() == 'csv':
+                records = pd.read_csv(file.stream, nrows=PREDICT_BATCH_MAX_RECORDS + 1)
+            else:
+                records = pd.read_excel(file.stream, engine='openpyxl', nrows=PREDICT_BATCH_MAX_RECORDS + 1)
+        else:
+            payload = request.get_json(silent=True)
+            records = payload.get('records') if isinstance(payload, dict) else payload
+            if not isinstance(records, list):
+                return jsonify({'status': 'error', 'message': 'Expected a list of records or a file'}), 400
+            if len(records) > PREDICT_BATCH_MAX_RECORDS:
+                return too_many_batch_records()
+            records = pd.DataFrame(records)
+
+        if len(records) > PREDICT_BATCH_MAX_RECORDS:
+            return too_many_batch_records()
+
+        result = ml_engine.predict_batch(records)
+        if result['status'] != 'success':
+            return jsonify(result), 500
+
+        user_ids = records['user_id'].tolist() if 'user_id' in records.columns else None
+        predictions = []
+        for i, (pred, prob) in enumerate(zip(result['predictions'], result['confidences'])):
+            entry = {'prediction': pred, 'confidence': prob, 'risk_level': probability_risk_level(prob)}
+            if user_ids is not None:
+                entry['user_id'] = user_ids[i]
+            predictions.append(entry)
+
+        response = {'status': 'success', 'count': len(predictions), 'predictions': predictions}
+        if 'message' in result:
+            response['message'] = result['message']
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/upload_train', methods=['POST'])
 def upload_train():
     """Upload dataset for ML training/diagnostics"""
     if 'file' not in request.files: return jsonify({'status': 'error'}), 400
     file = request.files['file']
-    path = os.path.join(UPLOAD_FOLDER, 'training_data.csv') # Save as generic name
+    path = TRAINING_DATA_PATH # Save as generic name
     file.save(path)
     
-    # Just verify we can load it
+    # Just verify we can load it (this also warms the cache for /train and /diagnostics)
     try:
-        if path.endswith('.csv'):
-            df = pd.read_csv(path)
-        else:
-            df = pd.read_excel(path, engine='openpyxl')
+        df = load_training_dataframe(path)
         
         stats = {
             'total_rows': len(df),
@@ -468,104 +1179,174 @@ def upload_train():
     except Exception as e:
          return jsonify({'status': 'error', 'message': str(e)}), 400
 
+def diagnostics_job(ctx: JobContext, csv_path: str) -> Dict[str, Any]:
+    ctx.progress(0.1, 'Loading dataset')
+    df = load_training_dataframe(csv_path)
+    ctx.progress(0.4, 'Scoring dataset')
+    return ml_engine.run_diagnostics(df)
+
 @app.route('/diagnostics', methods=['POST'])
 def run_diagnostics():
     """Run model evaluation/diagnostics on the uploaded dataset"""
     try:
-        csv_path = os.path.join(UPLOAD_FOLDER, 'training_data.csv')
-        if os.path.exists(csv_path):
-             df = pd.read_csv(csv_path) if csv_path.endswith('.csv') else pd.read_excel(csv_path, engine='openpyxl')
-        else:
+        csv_path = TRAINING_DATA_PATH
+        if not os.path.exists(csv_path):
              return jsonify({'status': 'error', 'message': 'No dataset uploaded'}), 400
-        
+        if wants_async():
+            return job_accepted(job_queue.submit('diagnostics', diagnostics_job, csv_path))
+
+        df = load_training_dataframe(csv_path)
         res = ml_engine.run_diagnostics(df)
         return jsonify(res)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/model', methods=['GET'])
+def model_info():
+    """Report which model version is currently serving predictions"""
+    bundle = ml_engine.bundle
+    if bundle is None:
+        return jsonify({'status': 'error', 'message': 'No model loaded'}), 404
+    return jsonify({
+        'status': 'success',
+        'version': bundle.version,
+        'source': bundle.source,
+        'metadata': ml_engine.registry.metadata(bundle.version)
+    })
+
+def train_job(ctx: JobContext, csv_path: str, test_size: float) -> Dict[str, Any]:
+    ctx.progress(0.05, 'Loading dataset')
+    df = load_training_dataframe(csv_path)
+    return ml_engine.train_model(df, test_size=test_size, progress=ctx.progress)
+
+def reload_trained_model(job_id: str, record: Dict[str, Any]) -> None:
+    """Serve a model published by a training job right away instead of at the next registry poll."""
+    if record.get('status') == 'succeeded':
+        ml_engine.load_model()
+
 @app.route('/train', methods=['POST'])
 def train():
     """Train the 'Thinker' ML model"""
     try:
         # Load the uploaded file
         # We check both csv and excel
-        csv_path = os.path.join(UPLOAD_FOLDER, 'training_data.csv')
+        csv_path = TRAINING_DATA_PATH
         
-        if os.path.exists(csv_path):
-             df = pd.read_csv(csv_path) if csv_path.endswith('.csv') else pd.read_excel(csv_path, engine='openpyxl')
-        else:
+        if not os.path.exists(csv_path):
              return jsonify({'status': 'error', 'message': 'No training file uploaded'}), 400
              
-        config = request.json
-        res = ml_engine.train_model(
-            df,
-            test_size=config.get('test_size', 20) / 100.0
-        )
+        config = request.get_json(silent=True) or {}
+        test_size = config.get('test_size', 20) / 100.0
+        if wants_async():
+            return job_accepted(job_queue.submit('train', train_job, csv_path, test_size, on_done=reload_trained_model))
+
+        df = load_training_dataframe(csv_path)
+        res = ml_engine.train_model(df, test_size=test_size)
         return jsonify(res)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-class SIMGuardReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 16)
-        self.cell(0, 10, 'SIMGuard Investigation Report', 0, 1, 'C')
-        self.ln(10)
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id: str):
+    """Status and progress of a background job"""
+    record = job_queue.get(job_id)
+    if record is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify({'status': 'success', 'job': record})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id: str):
+    """Result of a finished job (same body the synchronous endpoint returns)"""
+    record = job_queue.get(job_id)
+    if record is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    if record.get('status') != 'succeeded':
+        return jsonify({'status': 'error', 'message': f"Job is {record.get('status')}", 'job': record}), 409
+    return jsonify(job_queue.result(job_id))
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    record = job_queue.cancel(job_id)
+    if record is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify({'status': 'success', 'job': record})
+
+@app.route('/events', methods=['POST'])
+def ingest_events():
+    """
+    Score events as they happen. Accepts one JSON event, a list of events,
+    {"events": [...]} or newline-delimited JSON (application/x-ndjson).
+    Returns the updated evaluation of every affected user and any new alerts.
+    """
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            events = list(parse_ndjson(request.get_data(as_text=True)))
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                events = payload.get('events', [payload])
+            else:
+                events = payload
+        if not isinstance(events, list):
+            return jsonify({'status': 'error', 'message': 'Expected a JSON event, a list of events or NDJSON'}), 400
+
+        return jsonify({'status': 'success', **event_stream.ingest_many(events)})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/events/alerts', methods=['GET'])
+def stream_alerts():
+    """Recent stream alerts; poll with ?since=<last seq seen>"""
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    alerts = event_stream.alerts(since=since, limit=limit)
+    return jsonify({
+        'status': 'success',
+        'alerts': alerts,
+        'last_seq': alerts[-1]['seq'] if alerts else since,
+        'stream': event_stream.stats(),
+    })
+
+@app.route('/events/users/<user_id>', methods=['GET'])
+def stream_user(user_id: str):
+    """Current session state and evaluation of one streamed user"""
+    user = event_stream.user(user_id)
+    if user is None:
+        return jsonify({'status': 'error', 'message': 'Unknown user'}), 404
+    return jsonify({'status': 'success', **user})
 
 @app.route('/report', methods=['GET'])
 def generate_report():
-    if not analysis_results: return jsonify({'status': 'error'}), 400
-    
-    pdf = SIMGuardReport()
-    pdf.add_page()
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, f"Analysis Time: {analysis_results['timestamp']}", 0, 1)
-    summary = analysis_results.get('summary', {})
-    pdf.cell(0, 10, f"Total Records: {summary.get('total_records', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"Users Analyzed: {summary.get('users_analyzed', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"Suspicious Users (High + Medium): {summary.get('suspicious_count', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"High Risk Users: {summary.get('high_risk_users', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"Medium Risk Users: {summary.get('medium_risk_users', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"Low Risk Users: {summary.get('clean_users', 'N/A')}", 0, 1)
-
-    # If feature-level statistics are available (new CSV schema), include a short narrative
-    feature_stats: Dict[str, Any] = analysis_results.get('feature_stats', {})
-    if feature_stats:
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 10, 'Behavioural Summary', 0, 1)
-        pdf.set_font('Arial', '', 12)
-
-        def write_stat(label: str, key: str):
-            if key in feature_stats:
-                pdf.cell(0, 8, f"{label}: {feature_stats[key]}", 0, 1)
-
-        write_stat("Average time since last SIM change (hours)", 'avg_time_since_last_sim_change_h')
-        write_stat("Users with recent SIM change", 'recent_sim_change_users')
-        write_stat("Users with SIM change flag", 'users_with_sim_change_flag')
-        write_stat("Users with device change flag", 'users_with_device_change_flag')
-        write_stat("Average calls in last 24h", 'avg_calls_last_24h')
-        write_stat("Average SMS in last 24h", 'avg_sms_last_24h')
-        write_stat("Average data usage in last 24h", 'avg_data_usage_last_24h')
-        write_stat("Average change in data usage", 'avg_change_in_data_usage')
-        write_stat("Users with high failed logins", 'high_failed_login_users')
-        write_stat("Average transaction count", 'avg_transaction_count')
-        write_stat("Users with high account activity flag", 'high_activity_flag_users')
-        write_stat("Users currently roaming", 'roaming_users')
-        write_stat("Average distance change (km)", 'avg_distance_change_km')
-        write_stat("Users with large distance jumps", 'high_distance_users')
-        write_stat("Users with large cell tower changes", 'high_cell_tower_change_users')
-        write_stat("Users labelled as SIM swap in dataset", 'sim_swap_labelled_users')
-    
-    pdf_output = io.BytesIO()
-    pdf_string = pdf.output(dest='S').encode('latin-1')
-    pdf_output.write(pdf_string)
-    pdf_output.seek(0)
-    
-    return send_file(pdf_output, as_attachment=True, download_name='simguard_report.pdf', mimetype='application/pdf')
+    """
+    Report of the upload's latest analysis: format=pdf (default), csv or xlsx. Artifacts are rendered once per
+    analysis and carry an ETag, so pollers sending If-None-Match get 304 until the upload is re-analyzed.
+    """
+    upload_id, error = resolve_upload_id()
+    analysis_results = analysis_store.get_results(upload_id) if upload_id else None
+    if not analysis_results: return error or (jsonify({'status': 'error'}), 400)
+
+    kind = request.args.get('format', 'pdf')
+    if kind not in report_cache.formats:
+        return jsonify({'status': 'error', 'message': f"Unknown format; use one of {', '.join(report_cache.formats)}"}), 400
+
+    etag = report_cache.etag(analysis_results, kind)
+    if request.if_none_match.contains(etag):
+        # Answered before the artifact is looked up, so a poll never triggers a render
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    _, mimetype, download_name = report_cache.formats[kind]
+    with analysis_store.hold(upload_id):
+        path = report_cache.get(analysis_store.entry_dir(upload_id), analysis_results, kind)
+    response = send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype,
+                         etag=etag, conditional=True, max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 if __name__ == '__main__':
+    if in_reloader_child():
+        start_background_services()
     app.run(host='0.0.0.0', port=5001, debug=True, threaded=True)
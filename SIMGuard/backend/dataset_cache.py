@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Dataset Cache
+Keeps typed, compressed columnar (Arrow/Feather) copies of parsed uploads,
+keyed by a hash of the file contents, so re-uploads and repeated train /
+diagnostics runs memory-map the cached columns instead of re-parsing text.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Callable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = None
+    logger.warning("pyarrow not found. Upload cache disabled; files will be parsed on every load.")
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', '.cache')
+CACHE_MAX_FILES = 20
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+ATTRS_METADATA_KEY = b'simguard_attrs'
+
+
+def content_hash(filepath: str) -> str:
+    """BLAKE2b digest of the file contents, read in fixed-size blocks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(digest: str, variant: str) -> str:
+    return os.path.join(CACHE_DIR, f"{digest}-{variant}.feather")
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """Memory-map a Feather file written by write_frame, restoring df.attrs."""
+    table = feather.read_table(path, memory_map=True)
+    df = table.to_pandas()
+    attrs = (table.schema.metadata or {}).get(ATTRS_METADATA_KEY)
+    if attrs:
+        df.attrs.update(json.loads(attrs))
+    return df
+
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    """Atomically write df (and df.attrs) as a compressed Feather file; raises if Arrow cannot type it."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[ATTRS_METADATA_KEY] = json.dumps(df.attrs, default=str).encode()
+        feather.write_feather(table.replace_schema_metadata(metadata), tmp_path, compression='lz4')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_cached(digest: str, variant: str) -> Optional[pd.DataFrame]:
+    """Memory-map a cached frame, or None when it is missing or unreadable."""
+    path = cache_path(digest, variant)
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        df = read_frame(path)
+        os.utime(path)  # keep recently used entries out of eviction
+        return df
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+
+
+def write_cached(df: pd.DataFrame, digest: str, variant: str) -> bool:
+    """Store df as a compressed Feather file; frames Arrow cannot type are skipped."""
+    if pa is None:
+        return False
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        write_frame(df, cache_path(digest, variant))
+    except Exception as e:
+        logger.warning(f"Could not cache dataset {digest}: {e}")
+        return False
+    try:
+        evict_old_entries()
+    except OSError as e:
+        # The entry is written; a failed cleanup must not fail the upload
+        logger.warning(f"Could not evict old cache entries: {e}")
+    return True
+
+
+def evict_old_entries(max_files: int = CACHE_MAX_FILES) -> None:
+    """Drop the least recently used entries beyond max_files."""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith('.feather'):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue  # removed by a concurrent eviction
+    entries.sort(reverse=True)
+    for _, path in entries[max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_with_cache(filepath: str, loader: Callable[[str], pd.DataFrame], variant: str) -> pd.DataFrame:
+    """
+    Load filepath through the cache.
+
+    variant names what loader produces (e.g. 'raw' or 'normalized-v1') so that
+    different parses of the same file never share an entry.
+    """
+    if pa is None:
+        return loader(filepath)
+
+    digest = content_hash(filepath)
+    df = read_cached(digest, variant)
+    if df is not None:
+        logger.info(f"Loaded {os.path.basename(filepath)} from cache ({digest[:12]}, {variant})")
+        return df
+
+    df = loader(filepath)
+    write_cached(df, digest, variant)
+    return df
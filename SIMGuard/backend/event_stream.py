@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Event Stream
+Real-time scoring of legacy-schema events (user_id, timestamp, sim_id,
+device_id, location, login_status, is_roaming). Each user keeps a compact
+session state (last SIM/device/location, last SIM change, 24h sliding-window
+counters of failed logins, SMS sends and tower changes) that one event
+updates in O(1); only that user is then re-scored with RuleEngine.evaluate_user.
+
+The state follows the same rules as the batch event_log_session_state in
+app.py, so for a time-ordered stream a user's latest evaluation equals what
+/analyze reports for the same events.
+
+Events arrive through POST /events or a long-running consumer that reads
+newline-delimited JSON from a file being appended to (tail -F) or a local
+Unix socket.
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from simswap_detector import config
+from simswap_detector.windows import WindowCounter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_USERS = 1_000_000
+DEFAULT_ALERT_BUFFER = 10_000
+DEFAULT_POLL_INTERVAL = 0.2
+SOCKET_PREFIX = 'unix:'
+TRUE_VALUES = ('true', '1', 'yes')
+SMS_ACTIVITY_TYPES = ('sms', 'sms_send')
+ALERT_LEVELS = ('MEDIUM', 'HIGH')
+
+
+class EventError(ValueError):
+    """An event that cannot be placed in a user session."""
+
+
+def _missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def parse_event_time(value: Any) -> Optional[datetime]:
+    """Naive (UTC) datetime from an ISO/known-format string, epoch seconds or datetime."""
+    if _missing(value) or value == '':
+        return None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            try:
+                parsed = datetime.strptime(text, '%d/%m/%Y %H:%M:%S')
+            except ValueError:
+                parsed = pd.to_datetime(text, format='mixed', errors='coerce')
+                if pd.isna(parsed):
+                    return None
+                parsed = parsed.to_pydatetime()
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def normalize_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply the upload normalization (normalize_uploaded_dataframe) to one event."""
+    if not isinstance(event, dict):
+        raise EventError('Event must be a JSON object')
+    user_id = event.get('user_id')
+    if _missing(user_id) or user_id == '':
+        raise EventError('Event has no user_id')
+    if isinstance(user_id, bool) or not isinstance(user_id, (str, int)):
+        raise EventError(f"Event user_id must be a string or integer, not {type(user_id).__name__}")
+    try:
+        timestamp = parse_event_time(event.get('timestamp'))
+    except (OverflowError, OSError, ValueError):
+        # Epoch values or dates outside what datetime can represent
+        timestamp = None
+    if timestamp is None:
+        raise EventError(f"Event for {user_id} has no usable timestamp")
+
+    status = event.get('login_status', event.get('success'))
+    location = event.get('location')
+    roaming = event.get('is_roaming', event.get('roaming'))
+    tower = event.get('cell_tower_id')
+    return {
+        'user_id': user_id,
+        'timestamp': timestamp,
+        'sim_id': event.get('sim_id'),
+        'device_id': event.get('device_id'),
+        'location': None if _missing(location) else str(location).strip().title(),
+        'login_failed': status is not None and str(status).lower() not in TRUE_VALUES + ('success',),
+        'is_roaming': str(roaming).lower() in TRUE_VALUES,
+        'sms_sent': str(event.get('activity_type', '')).lower() in SMS_ACTIVITY_TYPES,
+        'cell_tower_id': None if _missing(tower) or tower == '' else tower,
+    }
+
+
+class UserSession:
+    """Per-user state carried between events (mirrors one row of event_log_session_state)."""
+
+    __slots__ = (
+        'end_time', 'last_sim_id', 'last_device_id', 'last_location', 'last_sim_change',
+        'device_changed_after_sim', 'hours_between_sim_device_change',
+        'location_changed_from', 'location_changed_to', 'is_roaming', 'last_cell_tower_id',
+        'failed_logins', 'sms_sent', 'tower_changes', 'result',
+    )
+
+    def __init__(self, event: Dict[str, Any]):
+        self.end_time: datetime = event['timestamp']
+        self.last_sim_id = event['sim_id']
+        self.last_device_id = event['device_id']
+        self.last_location = event['location']
+        self.last_sim_change: Optional[datetime] = None
+        self.device_changed_after_sim = False
+        self.hours_between_sim_device_change: Optional[float] = None
+        self.location_changed_from: Optional[str] = None
+        self.location_changed_to: Optional[str] = None
+        self.is_roaming = event['is_roaming']
+        self.last_cell_tower_id = event['cell_tower_id']
+        # Trailing 24h counters (windows.DAY_WINDOW), the same buckets the batch path uses
+        self.failed_logins = WindowCounter()
+        self.sms_sent = WindowCounter()
+        self.tower_changes = WindowCounter()
+        self.result: Optional[Dict[str, Any]] = None
+        self._count(event)
+
+    @staticmethod
+    def _changed(previous: Any, current: Any) -> bool:
+        # Missing values always count as a change, as in the batch comparison
+        return _missing(previous) or _missing(current) or previous != current
+
+    def _count(self, event: Dict[str, Any]) -> None:
+        ts = event['timestamp']
+        if event['login_failed']:
+            self.failed_logins.add(ts)
+        if event['sms_sent']:
+            self.sms_sent.add(ts)
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        """Fold one more event (later in the stream) into the session."""
+        ts = event['timestamp']
+        if self._changed(self.last_sim_id, event['sim_id']):
+            self.last_sim_change = ts
+        if self._changed(self.last_device_id, event['device_id']) and self.last_sim_change is not None:
+            gap_h = abs((ts - self.last_sim_change).total_seconds()) / 3600.0
+            if gap_h <= config.DEVICE_CHANGE_AFTER_SIM_HOURS:
+                self.device_changed_after_sim = True
+                self.hours_between_sim_device_change = gap_h
+        if self._changed(self.last_location, event['location']):
+            # "Most recent" values skip missing locations, like groupby().last()
+            if not _missing(self.last_location):
+                self.location_changed_from = self.last_location
+            if not _missing(event['location']):
+                self.location_changed_to = event['location']
+
+        self.last_sim_id = event['sim_id']
+        self.last_device_id = event['device_id']
+        self.last_location = event['location']
+        tower = event['cell_tower_id']
+        if tower is not None:
+            if self.last_cell_tower_id is not None and tower != self.last_cell_tower_id:
+                self.tower_changes.add(ts)
+            self.last_cell_tower_id = tower
+        self.is_roaming = self.is_roaming or event['is_roaming']
+        self.end_time = max(self.end_time, ts)
+        self._count(event)
+
+    def features(self, user_id: Any) -> Dict[str, Any]:
+        """Rule-engine input for this user (same fields as session_state_features)."""
+        if self.last_sim_change is None:
+            hours_since_sim_change = 999
+        else:
+            hours_since_sim_change = abs((self.end_time - self.last_sim_change).total_seconds()) / 3600.0
+        fallback = '' if _missing(self.last_location) else self.last_location
+        return {
+            'user_id': user_id,
+            'hours_since_sim_change': hours_since_sim_change,
+            'device_changed_after_sim': self.device_changed_after_sim,
+            'hours_between_sim_device_change': (
+                999 if self.hours_between_sim_device_change is None else self.hours_between_sim_device_change
+            ),
+            'previous_city': self.location_changed_from or fallback,
+            'current_city': self.location_changed_to or fallback,
+            'failed_logins_24h': self.failed_logins.count(self.end_time),
+            'is_roaming': self.is_roaming,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'end_time': self.end_time.isoformat(),
+            'last_sim_id': self.last_sim_id,
+            'last_device_id': self.last_device_id,
+            'last_location': self.last_location,
+            'last_sim_change': self.last_sim_change.isoformat() if self.last_sim_change else None,
+            'failed_logins_24h': self.failed_logins.count(self.end_time),
+            'sms_sent_24h': self.sms_sent.count(self.end_time),
+            'cell_tower_changes_24h': self.tower_changes.count(self.end_time),
+        }
+
+
+class EventStream:
+    """
+    In-memory session state for every user seen on the stream, plus a bounded
+    buffer of alerts. Users idle the longest are dropped beyond max_users.
+    Safe to feed from several threads.
+    """
+
+    def __init__(self, rule_engine: Any, max_users: int = DEFAULT_MAX_USERS,
+                 alert_buffer: int = DEFAULT_ALERT_BUFFER,
+                 on_alert: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.rule_engine = rule_engine
+        self.max_users = max_users
+        self.on_alert = on_alert
+        self._sessions: 'OrderedDict[Any, UserSession]' = OrderedDict()
+        self._alerts: Deque[Dict[str, Any]] = deque(maxlen=alert_buffer)
+        self._alert_seq = 0
+        self._events = 0
+        self._lock = threading.Lock()
+
+    def ingest(self, event: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Apply one raw event and re-score its user. Returns (evaluation, alert),
+        where alert is set when a MEDIUM/HIGH user's triggered rules changed.
+        Raises EventError for events without a usable user_id/timestamp.
+        """
+        event = normalize_event(event)
+        user_id = event['user_id']
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = self._sessions[user_id] = UserSession(event)
+                if len(self._sessions) > self.max_users:
+                    self._sessions.popitem(last=False)
+            else:
+                session.apply(event)
+                self._sessions.move_to_end(user_id)
+            self._events += 1
+
+            previous = session.result
+            session.result = result = self.rule_engine.evaluate_user(session.features(user_id))
+            alert = None
+            if result['alert_level'] in ALERT_LEVELS and (
+                previous is None or _rule_names(previous) != _rule_names(result)
+            ):
+                self._alert_seq += 1
+                alert = {
+                    'seq': self._alert_seq,
+                    'detected_at': datetime.now().isoformat(),
+                    'timestamp': session.end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'sim_id': session.last_sim_id,
+                    **result,
+                }
+                self._alerts.append(alert)
+
+        if alert is not None and self.on_alert is not None:
+            try:
+                self.on_alert(alert)
+            except Exception as e:
+                logger.error(f"Alert hook failed: {e}")
+        return result, alert
+
+    def ingest_many(self, events: Iterable[Any]) -> Dict[str, Any]:
+        """Ingest a batch; returns the latest evaluation per affected user, new alerts and rejects."""
+        results: Dict[Any, Dict[str, Any]] = {}
+        alerts: List[Dict[str, Any]] = []
+        errors: List[Dict[str, Any]] = []
+        accepted = 0
+        for index, event in enumerate(events):
+            try:
+                result, alert = self.ingest(event)
+            except EventError as e:
+                errors.append({'index': index, 'message': str(e)})
+                continue
+            accepted += 1
+            results[result['user_id']] = result
+            if alert is not None:
+                alerts.append(alert)
+        return {
+            'accepted': accepted,
+            'rejected': errors,
+            'results': list(results.values()),
+            'alerts': alerts,
+        }
+
+    def ingest_line(self, line: str) -> None:
+        """Ingest one NDJSON line, logging (not raising) malformed input."""
+        line = line.strip()
+        if not line:
+            return
+        try:
+            self.ingest(json.loads(line))
+        except (ValueError, EventError) as e:
+            logger.warning(f"Skipping stream event: {e}")
+
+    def user(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return None
+            return {'user_id': user_id, 'state': session.snapshot(), 'evaluation': session.result}
+
+    def alerts(self, since: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Buffered alerts with seq > since, oldest first."""
+        with self._lock:
+            return [alert for alert in self._alerts if alert['seq'] > since][:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'users': len(self._sessions), 'events': self._events, 'alerts': self._alert_seq}
+
+
+def _rule_names(result: Dict[str, Any]) -> List[str]:
+    return [rule['rule'] for rule in result['triggered_rules']]
+
+
+def parse_ndjson(text: str) -> Iterator[Any]:
+    """Decode newline-delimited JSON; undecodable lines are yielded as None (rejected on ingest)."""
+    for line in text.splitlines():
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def tail_lines(path: str, stop_event: threading.Event, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               from_end: bool = False) -> Iterator[str]:
+    """
+    Follow a file like `tail -F`: yield complete lines as they are appended,
+    reopening the file when it is rotated or truncated.
+    """
+    handle, inode, partial = None, None, ''
+    while not stop_event.is_set():
+        if handle is None:
+            try:
+                handle = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                stop_event.wait(poll_interval)
+                continue
+            inode = os.fstat(handle.fileno()).st_ino
+            if from_end:
+                handle.seek(0, os.SEEK_END)
+                from_end = False
+
+        chunk = handle.readline()
+        if chunk:
+            partial += chunk
+            if partial.endswith('\n'):
+                yield partial
+                partial = ''
+            continue
+
+        try:
+            stat = os.stat(path)
+            rotated = stat.st_ino != inode or stat.st_size < handle.tell()
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            handle.close()
+            handle, partial = None, ''
+        else:
+            stop_event.wait(poll_interval)
+    if handle is not None:
+        handle.close()
+
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for raw in self.rfile:
+            self.server.stream.ingest_line(raw.decode('utf-8', errors='replace'))
+
+
+class _SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class EventConsumer(threading.Thread):
+    """
+    Daemon thread feeding an EventStream from `source`: either 'unix:<path>'
+    (listen on a Unix socket, one NDJSON event per line, any number of
+    writers) or the path of an NDJSON file to follow.
+    """
+
+    def __init__(self, stream: EventStream, source: str, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        super().__init__(name='event-stream-consumer', daemon=True)
+        self.stream = stream
+        self.source = source
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._server: Optional[_SocketServer] = None
+
+    def run(self) -> None:
+        try:
+            if self.source.startswith(SOCKET_PREFIX):
+                self._serve(self.source[len(SOCKET_PREFIX):])
+            else:
+                logger.info(f"Following event file {self.source}")
+                for line in tail_lines(self.source, self._stop_event, self.poll_interval):
+                    self.stream.ingest_line(line)
+        except Exception as e:
+            logger.error(f"Event consumer stopped: {e}")
+
+    def _serve(self, path: str) -> None:
+        if os.path.exists(path):
+            # A stale socket from an earlier run; refuse to take over one that is still served
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                raise RuntimeError(f"Event socket {path} is already in use")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(path)
+            finally:
+                probe.close()
+        self._server = _SocketServer(path, _SocketHandler)
+        self._server.stream = self.stream
+        logger.info(f"Listening for events on {path}")
+        try:
+            self._server.serve_forever(poll_interval=self.poll_interval)
+        finally:
+            self._server.server_close()
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Fingerprint Index
+Incremental re-analysis. For every user row scored by /analyze (the rule
+inputs plus the timestamp and SIM shown in the results) the index keeps a
+64-bit fingerprint, and the row's evaluation (risk level and score, triggered
+rules and their reason args) in a SuspiciousTable that holds every row, not
+only the flagged ones. The next analysis of data with the same feature columns
+fingerprints its rows, re-scores only those with no match in the index and
+carries over the stored evaluation of the others, then stores its rows ahead of
+the earlier rows it did not contain. Analysts alternating between different
+extracts with the same columns therefore keep matching their own rows; the
+oldest rows are dropped beyond max_rows.
+
+A fingerprint covers the user ID, so a match means the same user with the same
+inputs. The index is dropped when the rule set or its thresholds change
+(ruleset_signature), since the stored evaluations would no longer hold.
+
+Layout (one pair per feature schema):
+    <root>/<schema>.npz                (fingerprints, check hashes, ruleset signature, generation)
+    <root>/<schema>-<generation>.npz   (evaluations, as a SuspiciousTable)
+    <root>/<schema>.lock               (serializes replacing the pair across processes)
+"""
+
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from result_table import SuspiciousTable
+from simswap_detector import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', '.fingerprints')
+# Bump when what goes into a fingerprint or an evaluation changes
+FINGERPRINT_VERSION = 1
+# Odd 64-bit multipliers that fold the column hashes of a row into its fingerprint / check hash
+COMBINE_PRIMARY = np.uint64(0x9E3779B97F4A7C15)
+COMBINE_CHECK = np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def ruleset_signature(rule_names: Sequence[str]) -> str:
+    """Digest of the rule names and every setting in simswap_detector.config (thresholds, risk weights)."""
+    settings = sorted((key, repr(value)) for key, value in vars(config).items() if key.isupper())
+    payload = repr((FINGERPRINT_VERSION, list(rule_names), settings))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def schema_key(frame: pd.DataFrame) -> str:
+    return hashlib.sha1('\x1f'.join(map(str, frame.columns)).encode()).hexdigest()[:16]
+
+
+def fingerprints(frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-row fingerprint of frame, plus a check hash: the same column hashes combined
+    differently. A match needs both, which makes a false match negligible.
+    """
+    primary = np.zeros(len(frame), dtype=np.uint64)
+    check = np.zeros(len(frame), dtype=np.uint64)
+    for name in frame.columns:
+        column = pd.util.hash_pandas_object(frame[name], index=False).to_numpy()
+        # uint64 arithmetic wraps around
+        primary = primary * COMBINE_PRIMARY + column
+        check = (check ^ column) * COMBINE_CHECK
+    return primary, check
+
+
+class Snapshot:
+    """Fingerprints and evaluations of the rows of one earlier analysis."""
+
+    def __init__(self, primary: np.ndarray, check: np.ndarray, rows: SuspiciousTable):
+        self.primary = primary
+        self.check = check
+        self.rows = rows
+
+    def match(self, primary: np.ndarray, check: np.ndarray) -> np.ndarray:
+        """Row of this snapshot with the same fingerprint, for every given row (-1 when none)."""
+        known = pd.Index(self.primary)
+        if not known.is_unique:
+            # Identical rows evaluate identically; any one of them will do
+            keep = ~known.duplicated()
+            known = known[keep]
+            positions = np.flatnonzero(keep)
+        else:
+            positions = np.arange(len(known))
+        found = known.get_indexer(primary)
+        matched = np.where(found >= 0, positions[np.maximum(found, 0)], -1)
+        hit = matched >= 0
+        matched[hit] = np.where(self.check[matched[hit]] == check[hit], matched[hit], -1)
+        return matched
+
+    def merged_with(self, previous: Optional['Snapshot'], max_rows: int,
+                    rule_names: Sequence[str]) -> 'Snapshot':
+        """These rows, then the rows of `previous` with other fingerprints, up to max_rows in all."""
+        if previous is None or len(self.primary) >= max_rows:
+            return self
+        older = np.flatnonzero(~np.isin(previous.primary, self.primary))[:max_rows - len(self.primary)]
+        if not len(older):
+            return self
+        return Snapshot(
+            np.concatenate([self.primary, previous.primary[older]]),
+            np.concatenate([self.check, previous.check[older]]),
+            SuspiciousTable.concat([self.rows, previous.rows.take(older)], rule_names),
+        )
+
+
+def carry_over(previous: SuspiciousTable, matched: np.ndarray, rescored: SuspiciousTable,
+               rule_names: Sequence[str]) -> SuspiciousTable:
+    """
+    Evaluations of every row in the new order: rows with matched >= 0 take that row of
+    `previous`, the others take the rows of `rescored` in order.
+    """
+    kept = np.flatnonzero(matched >= 0)
+    changed = np.flatnonzero(matched < 0)
+    combined = SuspiciousTable.concat([previous.take(matched[kept]), rescored], rule_names)
+    order = np.empty(len(matched), dtype=np.int64)
+    order[np.concatenate([kept, changed])] = np.arange(len(matched))
+    return combined.take(order)
+
+
+class FingerprintIndex:
+    """Disk-backed fingerprint index shared by all API and job processes."""
+
+    def __init__(self, root: str = FINGERPRINTS_DIR, max_rows: int = 2_000_000):
+        self.root = root
+        self.max_rows = max_rows
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, schema: str, generation: Optional[str] = None) -> str:
+        return os.path.join(self.root, f"{schema}.npz" if generation is None else f"{schema}-{generation}.npz")
+
+    def load(self, schema: str, signature: str) -> Optional[Snapshot]:
+        """Last snapshot stored for `schema`, or None (none yet, or made under other rules)."""
+        try:
+            with np.load(self._path(schema), allow_pickle=False) as npz:
+                if str(npz['signature']) != signature:
+                    return None
+                primary, check, generation = npz['primary'], npz['check'], str(npz['generation'])
+            rows = SuspiciousTable.load(self._path(schema, generation))
+        except (OSError, KeyError, ValueError) as e:
+            # Missing, or replaced by a concurrent analysis between the two reads
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Fingerprint index for {schema} unreadable ({e}); scoring every row")
+            return None
+        if len(rows) != len(primary):
+            return None
+        return Snapshot(primary, check, rows)
+
+    def save(self, schema: str, signature: str, current: Snapshot, previous: Optional[Snapshot],
+             rule_names: Sequence[str]) -> None:
+        """
+        Store the rows of an analysis ahead of those of `previous` (the snapshot it was matched
+        against) for `schema`; the evaluations are written before the fingerprints point at them.
+        """
+        snapshot = current.merged_with(previous, self.max_rows, rule_names)
+        generation = uuid.uuid4().hex
+        try:
+            snapshot.rows.save(self._path(schema, generation))
+            tmp_path = f"{self._path(schema)}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp_path, primary=snapshot.primary, check=snapshot.check,
+                     signature=np.array(signature), generation=np.array(generation))
+            with self._file_lock(schema):
+                replaced = self._generation(schema)
+                os.replace(tmp_path, self._path(schema))
+        except OSError as e:
+            logger.warning(f"Could not save fingerprint index for {schema}: {e}")
+            return
+        # Only the generation the old pointer referenced: another writer's may not be pointed at yet
+        if replaced is not None:
+            try:
+                os.remove(self._path(schema, replaced))
+            except OSError:
+                pass
+
+    def _generation(self, schema: str) -> Optional[str]:
+        """Generation the stored fingerprints of `schema` point at (None when there are none)."""
+        try:
+            with np.load(self._path(schema), allow_pickle=False) as npz:
+                return str(npz['generation'])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @contextmanager
+    def _file_lock(self, schema: str) -> Iterator[None]:
+        """Serialize replacing the fingerprints of `schema` across API and job processes."""
+        with open(os.path.join(self.root, f"{schema}.lock"), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Job Queue
+Runs CPU-heavy work (analysis, training, diagnostics) in a process pool so
+request threads return immediately with a job ID. Job state lives in small
+JSON files, so any API worker process can report status, return results or
+cancel a job, whichever process started it.
+
+Cancellation is cooperative: a queued job is dropped from the pool, a running
+job stops at its next progress() call.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', '.jobs')
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_TTL_SECONDS = 24 * 3600
+TERMINAL_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested."""
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class JobContext:
+    """Handle passed to a running job for progress reporting and cancellation checks."""
+
+    def __init__(self, root: str, job_id: str):
+        self.root = root
+        self.job_id = job_id
+
+    @property
+    def record_path(self) -> str:
+        return os.path.join(self.root, f"{self.job_id}.json")
+
+    def update(self, **fields: Any) -> None:
+        record = _read_json(self.record_path) or {'job_id': self.job_id}
+        record.update(fields)
+        _write_json(self.record_path, record)
+
+    def cancelled(self) -> bool:
+        return os.path.exists(os.path.join(self.root, f"{self.job_id}.cancel"))
+
+    def progress(self, fraction: float, message: Optional[str] = None) -> None:
+        """Record progress (0-1) and stop the job here if it was cancelled."""
+        if self.cancelled():
+            raise JobCancelled()
+        self.update(progress=round(min(max(fraction, 0.0), 1.0), 3), message=message)
+
+
+def _run_job(root: str, job_id: str, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Pool entry point: run func(ctx, *args, **kwargs) and record the outcome."""
+    ctx = JobContext(root, job_id)
+    if ctx.cancelled():
+        ctx.update(status='cancelled', finished_at=datetime.now().isoformat())
+        return 'cancelled'
+    ctx.update(status='running', started_at=datetime.now().isoformat(), pid=os.getpid())
+    try:
+        result = func(ctx, *args, **kwargs)
+        _write_json(os.path.join(root, f"{job_id}.result.json"), {'result': result})
+        ctx.update(status='succeeded', progress=1.0, finished_at=datetime.now().isoformat())
+        return 'succeeded'
+    except JobCancelled:
+        ctx.update(status='cancelled', finished_at=datetime.now().isoformat())
+        return 'cancelled'
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        ctx.update(status='failed', error=str(e), finished_at=datetime.now().isoformat())
+        return 'failed'
+
+
+class JobQueue:
+    """
+    Process-pool job runner. At most max_workers jobs run at once in this
+    API process; further submissions wait in the queue.
+    """
+
+    def __init__(self, root: str = JOBS_DIR, max_workers: int = DEFAULT_MAX_WORKERS,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.root = root
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: the API process runs threads, which fork() would copy in an unsafe state
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _path(self, job_id: str, suffix: str = '.json') -> str:
+        if not job_id or not all(ch in '0123456789abcdef' for ch in job_id):
+            raise ValueError(f"Invalid job ID: {job_id!r}")
+        return os.path.join(self.root, f"{job_id}{suffix}")
+
+    def submit(self, kind: str, func: Callable[..., Any], *args: Any,
+               on_done: Optional[Callable[[str, Dict[str, Any]], None]] = None, **kwargs: Any) -> str:
+        """
+        Queue func(ctx, *args, **kwargs) and return its job ID. func must be a
+        module-level function (it is pickled into the pool). on_done(job_id,
+        record) runs in this process once the job finishes.
+        """
+        self.sweep()
+        job_id = uuid.uuid4().hex
+        _write_json(self._path(job_id), {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'progress': 0.0,
+            'message': None,
+            'created_at': datetime.now().isoformat(),
+        })
+        future = self._pool().submit(_run_job, self.root, job_id, func, args, kwargs)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finished(job_id, f, on_done))
+        return job_id
+
+    def _finished(self, job_id: str, future: Future, on_done: Optional[Callable]) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+        record = self.get(job_id) or {}
+        if future.cancelled():
+            record = self._mark(job_id, status='cancelled')
+        elif future.exception() is not None and record.get('status') not in TERMINAL_STATES:
+            # The worker died before it could record anything (e.g. killed, out of memory)
+            record = self._mark(job_id, status='failed', error=str(future.exception()))
+        if on_done is not None:
+            try:
+                on_done(job_id, record)
+            except Exception as e:
+                logger.error(f"Job {job_id} completion hook failed: {e}")
+
+    def _mark(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        record = self.get(job_id) or {'job_id': job_id}
+        record.update(fields, finished_at=datetime.now().isoformat())
+        _write_json(self._path(job_id), record)
+        return record
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return _read_json(self._path(job_id))
+        except ValueError:
+            return None
+
+    def active(self, job_id: str) -> bool:
+        """
+        Whether the job is queued or running. A record not updated for longer than the TTL
+        belongs to a worker that died without recording an outcome and does not count.
+        """
+        try:
+            path = self._path(job_id)
+            record = _read_json(path)
+            return (record is not None and record.get('status') not in TERMINAL_STATES
+                    and time.time() - os.path.getmtime(path) <= self.ttl_seconds)
+        except (OSError, ValueError):
+            return False
+
+    def result(self, job_id: str) -> Any:
+        payload = _read_json(self._path(job_id, '.result.json'))
+        return payload['result'] if payload else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; returns the updated record, or None for unknown jobs."""
+        record = self.get(job_id)
+        if record is None or record.get('status') in TERMINAL_STATES:
+            return record
+        open(self._path(job_id, '.cancel'), 'w').close()
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return self._mark(job_id, status='cancelled')
+        return self.get(job_id)
+
+    def sweep(self) -> None:
+        """Delete files of jobs that finished longer ago than the TTL."""
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    job_id = name.split('.', 1)[0]
+                    record = self.get(job_id)
+                    if record is None or record.get('status') in TERMINAL_STATES:
+                        os.remove(path)
+            except (OSError, ValueError):
+                pass
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -9,10 +9,12 @@ Logic: Noise Injection, Heavy Regularization to prevent overfitting
 
 import pandas as pd
 import numpy as np
-import joblib
 import os
 import logging
-from typing import Dict, Any, Tuple
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from model_registry import ModelBundle, ModelRegistry, RegistryWatcher, DEFAULT_RELOAD_INTERVAL
+from tree_compiler import FAST_PATH_TOLERANCE, compile_model, probe_error
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,25 +23,92 @@ logger = logging.getLogger(__name__)
 try:
     from xgboost import XGBClassifier
     from sklearn.preprocessing import StandardScaler
+    from sklearn.compose import ColumnTransformer
     from sklearn.model_selection import train_test_split
     from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
 except ImportError:
     logger.warning("ML libraries not found. Core ML features will run in mock mode.")
 
+# Rule-based risk bands: a value >= edges[i] (and below the next edge) scores scores[i + 1];
+# values below the first edge (or NaN, which fails every >= check) score scores[0].
+TIME_BAND_EDGES = np.array([6, 24, 72, 168], dtype=float)
+TIME_BAND_SCORES = np.array([0.95, 0.75, 0.60, 0.20, 0.05])
+DISTANCE_BAND_EDGES = np.array([20, 50, 100, 200, 400], dtype=float)
+DISTANCE_BAND_SCORES = np.array([0.05, 0.15, 0.40, 0.50, 0.70, 0.90])
+DATA_BAND_EDGES = np.array([30, 80, 150, 250], dtype=float)
+DATA_BAND_SCORES = np.array([0.0, 0.10, 0.35, 0.65, 0.90])
+
+
+# Thinker hyperparameters: shallow trees and heavy L2 regularization
+THINKER_PARAMS = {
+    'objective': 'binary:logistic',
+    'learning_rate': 0.05,
+    'max_depth': 2,
+    'n_estimators': 50,
+    'reg_lambda': 50,
+    'random_state': 42,
+}
+# Std-dev of the Gaussian noise added to scaled training features
+TRAINING_NOISE_STD = 0.1
+
+
+# Inputs predict and predict_batch read from a record: name -> (record keys, first with a value wins; default).
+# The first five are the Thinker features, the rest feed the rule-based risk.
+PREDICT_INPUTS = {
+    'time_since_last_sim_change': (('time_since_sim_change',), 0.0),
+    'num_calls_last_24h': (('num_calls_last_24h',), 0.0),
+    'data_usage_last_24h': (('data_usage_last_24h',), 0.0),
+    'change_in_data_usage': (('data_usage_change_percent',), 0.0),
+    'distance_change_km': (('distance_change',), 0.0),
+    'hours': (('time_since_sim_change', 'time_since_last_sim_change'), 999.0),
+    'distance_km': (('distance_change', 'distance_change_km'), 0.0),
+    'data_pct': (('data_usage_change_percent', 'change_in_data_usage'), 0.0),
+    'failed_logins': (('num_failed_logins_last_24h',), 0.0),
+    'sim_flag': (('sim_change_flag',), 0.0),
+    'device_flag': (('device_change_flag',), 0.0),
+    'is_roaming': (('is_roaming',), 0.0),
+}
+
+
+def _is_missing(value: Any) -> bool:
+    """None or NaN, as pd.isna sees a single value of an object column."""
+    return np.ndim(value) == 0 and bool(pd.isna(value))
+
+
+def _to_numbers(values: np.ndarray, defaults: Any) -> np.ndarray:
+    """
+    Numeric value of predict inputs (an object array), the same for single records and batches:
+    numbers and numeric strings convert, anything else (None, NaN, other text) takes the default.
+    """
+    numbers = pd.to_numeric(values, errors='coerce').astype(float)
+    return np.where(np.isnan(numbers), defaults, numbers)
+
+
+def _band_scores(values: np.ndarray, edges: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Look up the band score of every value with np.digitize."""
+    bands = np.digitize(values, edges)
+    return scores[np.where(np.isnan(values), 0, bands)]
+
+
 class ThinkerModel:
     """
     The 'Thinker' Model Logic.
     Focuses on behavioral patterns rather than memorizing IDs/Locations.
     """
 
-    def __init__(self):
-        # Use absolute paths to ensure Flask finds the files regardless of where it's launched
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.model_path = os.path.join(base_dir, 'sim_swap_model.pkl')
-        self.scaler_path = os.path.join(base_dir, 'preprocessor.pkl')
-        
-        self.model = None
-        self.scaler = None
+    def __init__(self, fast_inference: bool = False):
+        # Low-latency mode: score single rows with compiled tree arrays instead of pandas + XGBoost
+        self.fast_inference = fast_inference
+
+        # Versioned model store; falls back to the loose pickles next to this file
+        self.registry = ModelRegistry()
+        self.model_path = self.registry.legacy_model_path
+        self.scaler_path = self.registry.legacy_scaler_path
+
+        # Active (model, scaler, version) bundle. Replaced as a whole, never mutated,
+        # so predict paths take one reference and always see a matching pair.
+        self.bundle: Optional[ModelBundle] = None
+        self._watcher: Optional[RegistryWatcher] = None
         
         # The 5 Core Behavioral Features (MUST match training data exactly)
         self.features = [
@@ -52,20 +121,73 @@ class ThinkerModel:
         
         self.load_model()
 
+    @property
+    def model(self):
+        bundle = self.bundle
+        return bundle.model if bundle else None
+
+    @property
+    def scaler(self):
+        bundle = self.bundle
+        return bundle.scaler if bundle else None
+
+    @property
+    def version(self) -> Optional[str]:
+        bundle = self.bundle
+        return bundle.version if bundle else None
+
     def load_model(self) -> bool:
-        """Load trained model and scaler from disk"""
+        """Load the active model version from the registry and swap it in"""
         try:
-            if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-                self.model = joblib.load(self.model_path)
-                self.scaler = joblib.load(self.scaler_path)
-                logger.info(f"✅ Thinker Model loaded from {self.model_path}")
+            bundle = self.registry.load()
+            if bundle is not None:
+                self.bundle = self._with_fast_path(bundle)
+                logger.info(f"✅ Thinker Model {bundle.version} loaded from {bundle.source}")
                 return True
-            else:
-                logger.warning(f"⚠️ Model files not found at {self.model_path}")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
         return False
 
+    def _active_bundle(self) -> Optional[ModelBundle]:
+        """Current bundle, loading it on first use."""
+        bundle = self.bundle
+        if bundle is None and self.load_model():
+            bundle = self.bundle
+        return bundle
+
+    def publish_model(self, model: Any, scaler: Any, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Publish a trained model/scaler pair as a new registry version and serve it."""
+        version = self.registry.publish(model, scaler, metadata)
+        self.bundle = self._with_fast_path(ModelBundle(model=model, scaler=scaler, version=version,
+                                                       source=os.path.join(self.registry.root, version)))
+        return version
+
+    def _with_fast_path(self, bundle: ModelBundle) -> ModelBundle:
+        """
+        Attach compiled trees to the bundle when fast inference is on.
+        The compiled model is checked against XGBoost on rows around every
+        split threshold and only used if the probabilities agree.
+        """
+        if not self.fast_inference:
+            return bundle
+        try:
+            compiled = compile_model(bundle.model, bundle.scaler, self.features)
+            error = probe_error(compiled, bundle.model, bundle.scaler, self.features)
+            if error > FAST_PATH_TOLERANCE:
+                logger.warning(f"Compiled model {bundle.version} differs by {error:.2e}; fast inference disabled")
+                return bundle
+            logger.info(f"⚡ Compiled {compiled.n_trees} trees for fast inference (max error {error:.1e})")
+            return bundle._replace(compiled=compiled)
+        except Exception as e:
+            logger.warning(f"Fast inference unavailable for model {bundle.version}: {e}")
+            return bundle
+
+    def start_auto_reload(self, interval: float = DEFAULT_RELOAD_INTERVAL) -> None:
+        """Reload in a background thread whenever the published model files change."""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = RegistryWatcher(self.registry, self.load_model, interval)
+            self._watcher.start()
+
     def clean_and_prepare(self, df: pd.DataFrame, is_training: bool = False) -> pd.DataFrame:
         """
         Preprocesses data:
@@ -85,21 +207,69 @@ class ThinkerModel:
         
         return X
 
+    def train_model(self, df: pd.DataFrame, test_size: float = 0.2,
+                    progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        Train a new Thinker model on a labelled dataset and publish it to the registry.
+        Noise is injected into the scaled training features so the shallow,
+        heavily regularized trees learn behaviour rather than exact values.
+        """
+        report = progress or (lambda fraction, message: None)
+        if 'label' not in df.columns:
+            return {'status': 'error', 'message': "Training data needs a 'label' column"}
+
+        X = self.clean_and_prepare(df, is_training=True)
+        y = pd.to_numeric(df['label'], errors='coerce').fillna(0).astype(int)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=42, stratify=y if y.nunique() > 1 else None
+        )
+
+        report(0.2, 'Fitting scaler')
+        scaler = ColumnTransformer([('num', StandardScaler(), self.features)])
+        X_train_scaled = scaler.fit_transform(X_train)
+        noise = np.random.default_rng(42).normal(0.0, TRAINING_NOISE_STD, X_train_scaled.shape)
+
+        report(0.3, 'Training XGBoost')
+        model = XGBClassifier(**THINKER_PARAMS)
+        model.fit(X_train_scaled + noise, y_train)
+
+        report(0.8, 'Evaluating')
+        y_pred = model.predict(scaler.transform(X_test))
+        metrics = {
+            'accuracy': float(accuracy_score(y_test, y_pred)),
+            'precision': float(precision_score(y_test, y_pred, zero_division=0)),
+            'recall': float(recall_score(y_test, y_pred, zero_division=0)),
+            'f1_score': float(f1_score(y_test, y_pred, zero_division=0)),
+        }
+
+        report(0.9, 'Publishing model')
+        version = self.publish_model(model, scaler, {
+            'training_rows': len(X_train), 'test_rows': len(X_test), 'metrics': metrics
+        })
+        return {
+            'status': 'success',
+            'model_type': 'XGBoost (Thinker)',
+            'version': version,
+            'metrics': metrics,
+            'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
+            'features': self.features
+        }
+
     def run_diagnostics(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
         Run the loaded model on a validation dataset.
         Returns prediction stats and metrics (if labels exist).
         """
         try:
-            if self.model is None:
-                if not self.load_model():
-                     return {'status': 'error', 'message': 'No model loaded. Place .pkl files in backend folder.'}
+            bundle = self._active_bundle()
+            if bundle is None:
+                return {'status': 'error', 'message': 'No model loaded. Place .pkl files in backend folder.'}
 
             X = self.clean_and_prepare(df)
             
             # Use the loaded scaler
-            X_scaled = self.scaler.transform(X)
-            y_pred = self.model.predict(X_scaled)
+            X_scaled = bundle.scaler.transform(X)
+            y_pred = bundle.model.predict(X_scaled)
             
             results = {
                 'total_samples': len(df),
@@ -118,7 +288,7 @@ class ThinkerModel:
 
             return {
                 'status': 'success',
-                'model_info': {'type': 'XGBoost (Thinker)', 'status': 'Active'},
+                'model_info': {'type': 'XGBoost (Thinker)', 'status': 'Active', 'version': bundle.version},
                 'results': results
             }
 
@@ -126,7 +296,34 @@ class ThinkerModel:
             logger.error(f"Diagnostics failed: {e}")
             return {'status': 'error', 'message': str(e)}
 
-    def _rule_based_risk_probability(self, data: Dict[str, Any]) -> float:
+    @staticmethod
+    def _record_inputs(data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """PREDICT_INPUTS of one record as length-1 arrays, converted in one call."""
+        values = np.empty(len(PREDICT_INPUTS), dtype=object)
+        for i, (keys, _) in enumerate(PREDICT_INPUTS.values()):
+            values[i] = next((v for v in (data.get(k) for k in keys) if not _is_missing(v)), None)
+        numbers = _to_numbers(values, np.array([default for _, default in PREDICT_INPUTS.values()]))
+        return {name: numbers[i:i + 1] for i, name in enumerate(PREDICT_INPUTS)}
+
+    @staticmethod
+    def _frame_inputs(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """PREDICT_INPUTS of every row of df, converted like _record_inputs."""
+        inputs = {}
+        for name, (keys, default) in PREDICT_INPUTS.items():
+            values = np.full(len(df), None, dtype=object)
+            for key in keys:
+                if key in df.columns:
+                    # A record without the key has NaN in its column and falls through to the next key
+                    missing = pd.isna(values)
+                    values[missing] = df[key].to_numpy(dtype=object)[missing]
+            inputs[name] = _to_numbers(values, default)
+        return inputs
+
+    def _feature_matrix(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """Thinker feature rows (unscaled) from predict inputs."""
+        return np.column_stack([inputs[name] for name in self.features])
+
+    def _rule_based_risk_probabilities(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
         """
         Compute a 0-1 risk probability from manual-check inputs so that:
         - HIGH risk (e.g. 2h SIM, 500km, 300% data, 5 failed logins, sim_change_flag) -> > 0.8
@@ -134,63 +331,28 @@ class ThinkerModel:
         - LOW risk (e.g. 500h, 5km, 10%, 0 failed logins) -> < 0.5
         Uses continuous scoring so risk levels are clearly differentiated.
         """
-        hours = float(data.get('time_since_sim_change', data.get('time_since_last_sim_change', 999)))
-        distance_km = float(data.get('distance_change', data.get('distance_change_km', 0)))
-        data_pct = float(data.get('data_usage_change_percent', data.get('change_in_data_usage', 0)))
-        failed_logins = int(data.get('num_failed_logins_last_24h', 0))
-        sim_flag = bool(data.get('sim_change_flag', False))
-        device_flag = bool(data.get('device_change_flag', False))
-        is_roaming = bool(data.get('is_roaming', False))
+        return self._risk_probability_from_arrays(
+            inputs['hours'], inputs['distance_km'], inputs['data_pct'], np.trunc(inputs['failed_logins']),
+            inputs['sim_flag'] != 0, inputs['device_flag'] != 0, inputs['is_roaming'] != 0
+        )
 
+    @staticmethod
+    def _risk_probability_from_arrays(hours: np.ndarray, distance_km: np.ndarray, data_pct: np.ndarray,
+                                      failed_logins: np.ndarray, sim_flag: np.ndarray,
+                                      device_flag: np.ndarray, is_roaming: np.ndarray) -> np.ndarray:
+        """Band lookups and weighted combination of the rule-based risk."""
         # Time since SIM change: very recent = high risk (2h->0.95, 24h->0.6, 500h->0.05)
-        if hours >= 168:
-            time_score = 0.05
-        elif hours >= 72:
-            time_score = 0.20
-        elif hours >= 24:
-            time_score = 0.60
-        elif hours >= 6:
-            time_score = 0.75
-        else:
-            time_score = 0.95
-
+        time_score = _band_scores(hours, TIME_BAND_EDGES, TIME_BAND_SCORES)
         # Distance (km): large jump = high risk (500->0.9, 50->0.4, 5->0.05)
-        if distance_km >= 400:
-            dist_score = 0.90
-        elif distance_km >= 200:
-            dist_score = 0.70
-        elif distance_km >= 100:
-            dist_score = 0.50
-        elif distance_km >= 50:
-            dist_score = 0.40
-        elif distance_km >= 20:
-            dist_score = 0.15
-        else:
-            dist_score = 0.05
-
+        dist_score = _band_scores(distance_km, DISTANCE_BAND_EDGES, DISTANCE_BAND_SCORES)
         # Data usage change %: big spike = high risk (300->0.9, 150->0.65, 10->0)
-        if data_pct >= 250:
-            data_score = 0.90
-        elif data_pct >= 150:
-            data_score = 0.65
-        elif data_pct >= 80:
-            data_score = 0.35
-        elif data_pct >= 30:
-            data_score = 0.10
-        else:
-            data_score = 0.0
+        data_score = _band_scores(data_pct, DATA_BAND_EDGES, DATA_BAND_SCORES)
 
         # Failed logins: cap contribution so 5+ -> strong signal
-        fail_score = min(1.0, failed_logins / 4.0) * 0.30
+        fail_score = np.minimum(1.0, failed_logins / 4.0) * 0.30
 
         # Status flags (additive)
-        flag_bonus = 0.0
-        if sim_flag:
-            flag_bonus += 0.15
-        if device_flag:
-            flag_bonus += 0.08
-        if is_roaming:
-            flag_bonus += 0.07
+        flag_bonus = 0.15 * sim_flag + 0.08 * device_flag + 0.07 * is_roaming
 
         # Weighted combination (weights tuned to match HIGH/MEDIUM/LOW examples)
         rule_prob = (
@@ -200,7 +362,55 @@ class ThinkerModel:
             fail_score +
             flag_bonus
         )
-        return min(1.0, max(0.0, rule_prob))
+        return np.clip(rule_prob, 0.0, 1.0)
+
+    @staticmethod
+    def _calibrate(rule_prob: np.ndarray, ml_prob: np.ndarray) -> np.ndarray:
+        """Array form of the rule/ML calibration blend used by predict."""
+        high = np.maximum(0.85, 0.7 * rule_prob + 0.3 * ml_prob)
+        medium = np.minimum(0.79, np.maximum(0.5, 0.65 * rule_prob + 0.35 * ml_prob))
+        low = np.minimum(0.49, 0.75 * rule_prob + 0.25 * ml_prob)
+        return np.where(rule_prob >= 0.8, high, np.where(rule_prob >= 0.5, medium, low))
+
+    def predict_batch(self, records: Any) -> Dict[str, Any]:
+        """
+        Score many events at once (list of predict-style dicts or a DataFrame).
+        Mapping, rule-based risk and calibration run over whole columns and the
+        ML model is called once for all rows.
+        """
+        try:
+            df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+            df = df.reset_index(drop=True)
+            inputs = self._frame_inputs(df)
+            rule_prob = self._rule_based_risk_probabilities(inputs)
+
+            bundle = self._active_bundle()
+            if bundle is None:
+                logger.warning("Using rule-based risk (model not found)")
+                return {
+                    'status': 'success',
+                    'predictions': (rule_prob > 0.5).astype(int).tolist(),
+                    'confidences': rule_prob.tolist(),
+                    'message': 'Model files missing - using rule-based risk score'
+                }
+
+            X = pd.DataFrame(self._feature_matrix(inputs), columns=self.features)
+            if bundle.compiled is not None:
+                ml_prob = bundle.compiled.predict_proba(X.to_numpy(dtype=float))
+            else:
+                X_scaled = bundle.scaler.transform(X)
+                ml_prob = bundle.model.predict_proba(X_scaled)[:, 1].astype(float)
+            final_prob = self._calibrate(rule_prob, ml_prob)
+
+            return {
+                'status': 'success',
+                'predictions': (final_prob >= 0.5).astype(int).tolist(),
+                'confidences': final_prob.tolist()
+            }
+
+        except Exception as e:
+            logger.error(f"Batch prediction error: {e}")
+            return {'status': 'error', 'message': str(e)}
 
     def predict(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -209,28 +419,24 @@ class ThinkerModel:
         ML model when available so HIGH/MEDIUM/LOW are clearly differentiated.
         """
         try:
-            # Map frontend keys (left) to model features (right)
-            mapped_data = {
-                'time_since_last_sim_change': float(data.get('time_since_sim_change', 0)),
-                'num_calls_last_24h': float(data.get('num_calls_last_24h', 0)),
-                'data_usage_last_24h': float(data.get('data_usage_last_24h', 0)),
-                'change_in_data_usage': float(data.get('data_usage_change_percent', 0)),
-                'distance_change_km': float(data.get('distance_change', 0))
-            }
-
-            rule_prob = self._rule_based_risk_probability(data)
+            # Frontend keys are read and converted exactly as predict_batch does (PREDICT_INPUTS)
+            inputs = self._record_inputs(data)
+            rule_prob = float(self._rule_based_risk_probabilities(inputs)[0])
 
-            if self.model is None or self.scaler is None:
-                if not self.load_model():
-                    return self._fallback_predict(data, rule_prob)
+            bundle = self._active_bundle()
+            if bundle is None:
+                return self._fallback_predict(data, rule_prob)
 
-            # Convert to DF
-            df_input = pd.DataFrame([mapped_data])
-            X = df_input[self.features]
+            row = self._feature_matrix(inputs)
+            if bundle.compiled is not None:
+                # Low-latency path: compiled trees on the raw feature vector, no DataFrame
+                ml_prob = float(bundle.compiled.predict_proba(row)[0])
+            else:
+                X = pd.DataFrame(row, columns=self.features)
 
-            # Scale and get ML probability
-            X_scaled = self.scaler.transform(X)
-            ml_prob = float(self.model.predict_proba(X_scaled)[0][1])
+                # Scale and get ML probability
+                X_scaled = bundle.scaler.transform(X)
+                ml_prob = float(bundle.model.predict_proba(X_scaled)[0][1])
 
             # Adaptive calibration:
             # - Strong manual high-risk signals should stay HIGH (> 0.8)
@@ -239,14 +445,7 @@ class ThinkerModel:
             #
             # This avoids extreme manual attack patterns being dragged down by ML
             # probabilities that are computed from only the 5 core features.
-            if rule_prob >= 0.8:
-                final_prob = max(0.85, 0.7 * rule_prob + 0.3 * ml_prob)
-            elif rule_prob >= 0.5:
-                blended = 0.65 * rule_prob + 0.35 * ml_prob
-                final_prob = min(0.79, max(0.5, blended))
-            else:
-                blended = 0.75 * rule_prob + 0.25 * ml_prob
-                final_prob = min(0.49, blended)
+            final_prob = float(self._calibrate(np.array([rule_prob]), np.array([ml_prob]))[0])
 
             pred = int(final_prob >= 0.5)
 
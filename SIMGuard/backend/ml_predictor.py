@@ -5,26 +5,52 @@ Handles model loading, feature engineering, and predictions
 
 import os
 import pickle
+import logging
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Any
 
+from tree_compiler import FAST_PATH_TOLERANCE, compile_model, probe_error
+
+logger = logging.getLogger(__name__)
+
+# Model input order (adjust based on your training)
+EXPECTED_FEATURES = [
+    'distance_change',
+    'time_since_sim_change',
+    'num_failed_logins_last_24h',
+    'num_calls_last_24h',
+    'num_sms_last_24h',
+    'data_usage_change_percent',
+    'change_in_cell_tower_id',
+    'is_roaming',
+    'sim_change_flag',
+    'device_change_flag',
+    'loc_velocity',
+    'tower_change_freq',
+    'high_risk_behavior'
+]
+
 class SIMSwapPredictor:
     """ML Model predictor for SIM swap detection"""
     
     def __init__(self, model_path: str = 'xgboost_simswap_model.pkl', 
-                 scaler_path: str = 'scaler.pkl'):
+                 scaler_path: str = 'scaler.pkl', fast_inference: bool = False):
         """
         Initialize predictor with model and scaler paths
         
         Args:
             model_path: Path to the trained XGBoost model
             scaler_path: Path to the fitted scaler
+            fast_inference: Score with compiled tree arrays (scaler folded in)
+                instead of scaler.transform + predict_proba
         """
         self.model_path = model_path
         self.scaler_path = scaler_path
+        self.fast_inference = fast_inference
         self.model = None
         self.scaler = None
+        self.compiled = None
         self.feature_names = None
         
     def load_model(self) -> bool:
@@ -53,6 +79,20 @@ class SIMSwapPredictor:
                 print(f"❌ Scaler file not found: {self.scaler_path}")
                 return False
             
+            self.compiled = None
+            if self.fast_inference:
+                try:
+                    # Only used if it agrees with XGBoost on rows around every split threshold
+                    compiled = compile_model(self.model, self.scaler, EXPECTED_FEATURES)
+                    error = probe_error(compiled, self.model, self.scaler, EXPECTED_FEATURES)
+                    if error > FAST_PATH_TOLERANCE:
+                        logger.warning(f"Compiled model differs by {error:.2e}; fast inference disabled")
+                    else:
+                        self.compiled = compiled
+                        logger.info(f"⚡ Compiled {compiled.n_trees} trees for fast inference (max error {error:.1e})")
+                except Exception as e:
+                    logger.warning(f"Fast inference unavailable, using XGBoost: {e}")
+            
             return True
             
         except Exception as e:
@@ -106,25 +146,8 @@ class SIMSwapPredictor:
         # Apply feature engineering
         df = self.engineer_features(df)
         
-        # Define expected feature order (adjust based on your training)
-        expected_features = [
-            'distance_change',
-            'time_since_sim_change',
-            'num_failed_logins_last_24h',
-            'num_calls_last_24h',
-            'num_sms_last_24h',
-            'data_usage_change_percent',
-            'change_in_cell_tower_id',
-            'is_roaming',
-            'sim_change_flag',
-            'device_change_flag',
-            'loc_velocity',
-            'tower_change_freq',
-            'high_risk_behavior'
-        ]
-        
         # Select and order features
-        df_features = df[expected_features]
+        df_features = df[EXPECTED_FEATURES]
         
         return df_features
     
@@ -142,17 +165,23 @@ class SIMSwapPredictor:
             # Prepare features
             df_features = self.prepare_features(data)
             
-            # Scale features
-            if self.scaler:
-                features_scaled = self.scaler.transform(df_features)
+            if self.compiled is not None:
+                # Compiled trees take raw feature values (scaling is folded into thresholds)
+                positive = float(self.compiled.predict_proba(df_features.to_numpy(dtype=float))[0])
+                prediction_proba = [1.0 - positive, positive]
+                prediction = int(positive > 0.5)
             else:
-                features_scaled = df_features.values
-            
-            # Make prediction
-            prediction = self.model.predict(features_scaled)[0]
-            
-            # Get prediction probability
-            prediction_proba = self.model.predict_proba(features_scaled)[0]
+                # Scale features
+                if self.scaler:
+                    features_scaled = self.scaler.transform(df_features)
+                else:
+                    features_scaled = df_features.values
+                
+                # Make prediction
+                prediction = self.model.predict(features_scaled)[0]
+                
+                # Get prediction probability
+                prediction_proba = self.model.predict_proba(features_scaled)[0]
             confidence = float(prediction_proba[int(prediction)] * 100)
             
             # Get feature importances for risk factors
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Model Registry
+Versioned store for the Thinker model/scaler pair. Each published version is
+a directory holding both pickles; a CURRENT pointer file is swapped atomically
+so readers always see a complete, matching pair. Loaded pairs are handed out
+as immutable ModelBundle objects that predict paths read with a single
+attribute access.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.path.join(BASE_DIR, 'models')
+LEGACY_MODEL_PATH = os.path.join(BASE_DIR, 'sim_swap_model.pkl')
+LEGACY_SCALER_PATH = os.path.join(BASE_DIR, 'preprocessor.pkl')
+MODEL_FILENAME = 'sim_swap_model.pkl'
+SCALER_FILENAME = 'preprocessor.pkl'
+METADATA_FILENAME = 'metadata.json'
+CURRENT_FILENAME = 'CURRENT'
+DEFAULT_RELOAD_INTERVAL = 30.0
+
+
+class ModelBundle(NamedTuple):
+    """A model and the scaler it was trained with, published together."""
+    model: Any
+    scaler: Any
+    version: str
+    source: str
+    compiled: Any = None  # optional tree_compiler.CompiledTrees for the pair
+
+
+class ModelRegistry:
+    """
+    Directory-backed registry:
+        models/<version>/sim_swap_model.pkl
+        models/<version>/preprocessor.pkl
+        models/<version>/metadata.json
+        models/CURRENT                      -> name of the active version
+
+    When no version has been published yet, the loose pickles next to this
+    module (the original deployment layout) are served as a 'legacy' version.
+    """
+
+    def __init__(self, root: str = REGISTRY_DIR,
+                 legacy_model_path: str = LEGACY_MODEL_PATH,
+                 legacy_scaler_path: str = LEGACY_SCALER_PATH):
+        self.root = root
+        self.legacy_model_path = legacy_model_path
+        self.legacy_scaler_path = legacy_scaler_path
+        self._publish_lock = threading.Lock()
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.root, CURRENT_FILENAME)
+
+    def current_version(self) -> Optional[str]:
+        """Name of the published version, or None when the registry is empty."""
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def fingerprint(self) -> Optional[str]:
+        """Cheap token that changes whenever the active model files change."""
+        version = self.current_version()
+        if version:
+            return f"registry:{version}"
+        try:
+            return "legacy:{}:{}".format(
+                os.stat(self.legacy_model_path).st_mtime_ns, os.stat(self.legacy_scaler_path).st_mtime_ns
+            )
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> Optional[ModelBundle]:
+        """Load the active version (or the legacy pickles) into a new bundle."""
+        version = self.current_version()
+        if version:
+            version_dir = os.path.join(self.root, version)
+            model_path = os.path.join(version_dir, MODEL_FILENAME)
+            scaler_path = os.path.join(version_dir, SCALER_FILENAME)
+            source = version_dir
+        else:
+            model_path, scaler_path = self.legacy_model_path, self.legacy_scaler_path
+            source = model_path
+            if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+                logger.warning(f"⚠️ Model files not found at {model_path}")
+                return None
+            version = f"legacy-{int(os.path.getmtime(model_path))}"
+
+        model = joblib.load(model_path)
+        scaler = joblib.load(scaler_path)
+        return ModelBundle(model=model, scaler=scaler, version=version, source=source)
+
+    def publish(self, model: Any, scaler: Any, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Write a new version and make it active.
+
+        The version directory is fully written under a temporary name and
+        renamed into place before CURRENT is replaced, so a reader that follows
+        CURRENT never sees a partial or mismatched pair.
+        """
+        with self._publish_lock:
+            os.makedirs(self.root, exist_ok=True)
+            version = datetime.now().strftime('v%Y%m%d-%H%M%S-%f')
+            tmp_dir = os.path.join(self.root, f".{version}.tmp")
+            os.makedirs(tmp_dir)
+            try:
+                joblib.dump(model, os.path.join(tmp_dir, MODEL_FILENAME))
+                joblib.dump(scaler, os.path.join(tmp_dir, SCALER_FILENAME))
+                with open(os.path.join(tmp_dir, METADATA_FILENAME), 'w') as f:
+                    json.dump({'version': version, 'published_at': datetime.now().isoformat(),
+                               **(metadata or {})}, f, indent=2, default=str)
+                os.rename(tmp_dir, os.path.join(self.root, version))
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+
+            pointer_tmp = f"{self.current_path}.{os.getpid()}.tmp"
+            with open(pointer_tmp, 'w') as f:
+                f.write(version)
+            os.replace(pointer_tmp, self.current_path)
+            logger.info(f"Published model version {version}")
+            return version
+
+    def metadata(self, version: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.root, version, METADATA_FILENAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+
+class RegistryWatcher(threading.Thread):
+    """Daemon thread that polls the registry and reloads when the active files change."""
+
+    def __init__(self, registry: ModelRegistry, on_change: Callable[[], Any],
+                 interval: float = DEFAULT_RELOAD_INTERVAL):
+        super().__init__(name='model-registry-watcher', daemon=True)
+        self.registry = registry
+        self.on_change = on_change
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._seen = registry.fingerprint()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                fingerprint = self.registry.fingerprint()
+                if fingerprint is not None and fingerprint != self._seen:
+                    # Give an in-progress legacy file copy a moment to settle
+                    time.sleep(min(1.0, self.interval))
+                    if self.on_change() is not False:
+                        self._seen = self.registry.fingerprint()
+            except Exception as e:
+                logger.error(f"Model registry watcher error: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
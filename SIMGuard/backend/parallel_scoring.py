@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Parallel Scoring
+Scores a large upload on several CPU cores. Rows are assigned to shards by a
+stable hash of user_id (so every event of a user lands in the same shard),
+written once to an uncompressed Arrow IPC file sorted by shard, and each
+worker process memory-maps that file and reads only its own row range, so the
+input DataFrame is never pickled. Shard outputs are merged back into exactly
+the order the single-process scorer produces.
+"""
+
+import os
+import heapq
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from result_table import SuspiciousTable
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+    logger.warning("pyarrow not found. Parallel scoring disabled; uploads are scored in one process.")
+
+ROW_COLUMN = '_row'
+SHARED_DIR = '/dev/shm' if os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+
+ScoredRows = Tuple[List[Dict[str, Any]], SuspiciousTable]
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    """Shared scoring pool, created on first use (spawn: the API process runs threads)."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def shard_of(user_ids: pd.Series, n_shards: int) -> np.ndarray:
+    """Stable (process-independent) shard number for every row."""
+    hashes = pd.util.hash_pandas_object(user_ids, index=False).to_numpy()
+    return (hashes % np.uint64(n_shards)).astype(np.int64)
+
+
+def write_shards(df: pd.DataFrame, n_shards: int, directory: str = SHARED_DIR) -> Tuple[str, np.ndarray]:
+    """
+    Write df sorted by shard (original row position kept in ROW_COLUMN) to an
+    uncompressed Arrow IPC file. Returns the path and the shard row offsets.
+    """
+    shards = shard_of(df['user_id'], n_shards)
+    order = np.argsort(shards, kind='stable')
+    ordered = df.iloc[order].assign(**{ROW_COLUMN: order})
+    bounds = np.searchsorted(shards[order], np.arange(n_shards + 1))
+
+    fd, path = tempfile.mkstemp(prefix='simguard-shards-', suffix='.arrow', dir=directory)
+    os.close(fd)
+    try:
+        table = pa.Table.from_pandas(ordered, preserve_index=False)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, bounds
+
+
+def read_shard(path: str, start: int, stop: int) -> pd.DataFrame:
+    """Rows [start, stop) of a shard file, read through a memory map."""
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all().slice(start, stop - start)
+        return table.to_pandas()
+
+
+def _score_shard(path: str, start: int, stop: int, scorer: Callable[[pd.DataFrame], ScoredRows]) -> Tuple[ScoredRows, List[int]]:
+    """Worker entry point: score one shard; also return the original row positions."""
+    shard = read_shard(path, start, stop)
+    rows = shard.pop(ROW_COLUMN).tolist()
+    return scorer(shard), rows
+
+
+def _flagged(user_features: List[Dict[str, Any]]) -> List[bool]:
+    return [uf['total_rules_triggered'] > 0 for uf in user_features]
+
+
+def merge_by_row(results: List[Tuple[ScoredRows, List[int]]]) -> ScoredRows:
+    """Merge shards of a row-per-user scorer back into input row order."""
+    user_features: List[Dict[str, Any]] = []
+    suspicious: List[SuspiciousTable] = []
+    rows: List[int] = []
+    flagged_rows: List[int] = []
+    for (shard_features, shard_suspicious), shard_rows in results:
+        user_features.extend(shard_features)
+        suspicious.append(shard_suspicious)
+        rows.extend(shard_rows)
+        flagged_rows.extend(row for row, flag in zip(shard_rows, _flagged(shard_features)) if flag)
+    feature_order = np.argsort(np.asarray(rows, dtype=np.int64), kind='stable')
+    suspicious_order = np.argsort(np.asarray(flagged_rows, dtype=np.int64), kind='stable')
+    return [user_features[i] for i in feature_order], SuspiciousTable.concat(suspicious).take(suspicious_order)
+
+
+def merge_table_by_row(results: List[Tuple[ScoredRows, List[int]]]) -> ScoredRows:
+    """Merge shards of a scorer whose table holds every input row (and no user features) into input row order."""
+    rows = np.concatenate([np.asarray(shard_rows, dtype=np.int64) for _, shard_rows in results])
+    table = SuspiciousTable.concat([shard_table for (_, shard_table), _ in results])
+    return [], table.take(np.argsort(rows, kind='stable'))
+
+
+def merge_by_user(results: List[Tuple[ScoredRows, List[int]]]) -> ScoredRows:
+    """Merge shards of a scorer whose output is sorted by user_id (one entry per user)."""
+    by_user = lambda record: record['user_id']
+    user_features = list(heapq.merge(*(features for (features, _), _ in results), key=by_user))
+    suspicious = SuspiciousTable.concat([suspicious for (_, suspicious), _ in results])
+    # Each shard is sorted and users do not span shards, so a stable sort equals the k-way merge
+    user_ids = np.empty(len(suspicious), dtype=object)
+    user_ids[:] = suspicious.user_ids.tolist()
+    return user_features, suspicious.take(np.argsort(user_ids, kind='stable'))
+
+
+def score_parallel(df: pd.DataFrame, scorer: Callable[[pd.DataFrame], ScoredRows], workers: int,
+                   merge: Callable[[List[Tuple[ScoredRows, List[int]]]], ScoredRows]) -> ScoredRows:
+    """
+    Score df with `scorer` (a module-level function, as it is sent to the
+    worker processes) across `workers` shards and merge the outputs.
+    """
+    path, bounds = write_shards(df, workers)
+    try:
+        pool = _pool(workers)
+        futures = [
+            pool.submit(_score_shard, path, int(bounds[i]), int(bounds[i + 1]), scorer)
+            for i in range(workers) if bounds[i + 1] > bounds[i]
+        ]
+        return merge([future.result() for future in futures])
+    finally:
+        os.remove(path)
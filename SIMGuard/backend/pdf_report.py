@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+SIMGuard PDF Report
+Investigation report (summary, behavioural statistics and a table of flagged
+users) for one analysis. FPDF keeps every page and the finished document in
+memory until output(); StreamingPDF instead writes each page to a file as soon
+as it is complete, so a report with thousands of table rows holds one page
+at a time. Rendered reports are cached by report_cache.
+"""
+
+import zlib
+from typing import Any, BinaryIO, Dict
+
+import numpy as np
+from fpdf import FPDF
+
+from result_table import SuspiciousTable
+
+REPORT_RENDER_BATCH = 500
+# (header, width in mm, record field); the last column wraps
+TABLE_COLUMNS = (
+    ('Timestamp', 33, 'timestamp'),
+    ('User ID', 32, 'user_id'),
+    ('SIM ID', 27, 'sim_id'),
+    ('Level', 15, 'risk_level'),
+    ('Score', 11, 'risk_score'),
+    ('Reasons', 72, 'flag_reason'),
+)
+TABLE_LINE_HEIGHT = 4
+# Core PDF fonts only cover latin-1
+TEXT_REPLACEMENTS = {'≤': '<=', '≥': '>=', '–': '-', '—': '-'}
+
+FEATURE_STAT_LABELS = (
+    ("Average time since last SIM change (hours)", 'avg_time_since_last_sim_change_h'),
+    ("Users with recent SIM change", 'recent_sim_change_users'),
+    ("Users with SIM change flag", 'users_with_sim_change_flag'),
+    ("Users with device change flag", 'users_with_device_change_flag'),
+    ("Average calls in last 24h", 'avg_calls_last_24h'),
+    ("Average SMS in last 24h", 'avg_sms_last_24h'),
+    ("Average data usage in last 24h", 'avg_data_usage_last_24h'),
+    ("Average change in data usage", 'avg_change_in_data_usage'),
+    ("Users with high failed logins", 'high_failed_login_users'),
+    ("Average transaction count", 'avg_transaction_count'),
+    ("Users with high account activity flag", 'high_activity_flag_users'),
+    ("Users currently roaming", 'roaming_users'),
+    ("Average distance change (km)", 'avg_distance_change_km'),
+    ("Users with large distance jumps", 'high_distance_users'),
+    ("Users with large cell tower changes", 'high_cell_tower_change_users'),
+    ("Users labelled as SIM swap in dataset", 'sim_swap_labelled_users'),
+)
+
+
+def pdf_text(value: Any) -> str:
+    text = str(value)
+    for char, replacement in TEXT_REPLACEMENTS.items():
+        text = text.replace(char, replacement)
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+class StreamingPDF(FPDF):
+    """
+    FPDF that writes each finished page (page object plus content stream) to
+    `sink`, then fonts, resources and the cross-reference table on close().
+    Objects keep FPDF's numbering (1 = page tree, 2 = resources, pages from 3),
+    so the file matches what output() would produce. Total page aliases
+    (alias_nb_pages) and links are not supported: both need every page kept.
+    """
+
+    def __init__(self, sink: BinaryIO, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.sink = sink
+        self.flushed = 0  # bytes already written to sink; object offsets count them
+
+    def _flush(self) -> None:
+        data = self.buffer.encode('latin-1')
+        self.sink.write(data)
+        self.flushed += len(data)
+        self.buffer = ''
+
+    def _newobj(self) -> None:
+        self.n += 1
+        self.offsets[self.n] = self.flushed + len(self.buffer)
+        self._out(f'{self.n} 0 obj')
+
+    def _endpage(self) -> None:
+        super()._endpage()
+        if self.page == 1:
+            self._putheader()
+        self._put_page(self.page)
+        self._flush()
+
+    def _put_page(self, n: int) -> None:
+        self._newobj()
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        if n in self.orientation_changes:
+            self._out('/MediaBox [0 0 %.2f %.2f]' % (self.fh_pt, self.fw_pt) if self.def_orientation == 'P'
+                      else '/MediaBox [0 0 %.2f %.2f]' % (self.fw_pt, self.fh_pt))
+        self._out('/Resources 2 0 R')
+        if self.pdf_version > '1.3':
+            self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+        self._out(f'/Contents {self.n + 1} 0 R>>')
+        self._out('endobj')
+        content = self.pages[n].encode('latin-1')
+        self.pages[n] = ''  # written; FPDF only needs the key from here on
+        if self.compress:
+            content = zlib.compress(content)
+        self._newobj()
+        self._out(('<</Filter /FlateDecode ' if self.compress else '<<') + f'/Length {len(content)}>>')
+        self._putstream(content)
+        self._out('endobj')
+
+    def _putpages(self) -> None:
+        # Pages are already written; only the page tree is left
+        w_pt, h_pt = (self.fw_pt, self.fh_pt) if self.def_orientation == 'P' else (self.fh_pt, self.fw_pt)
+        self.offsets[1] = self.flushed + len(self.buffer)
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(f'{3 + 2 * i} 0 R ' for i in range(self.page)) + ']')
+        self._out(f'/Count {self.page}')
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+        self._out('>>')
+        self._out('endobj')
+
+    def _putresources(self) -> None:
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self.flushed + len(self.buffer)
+        self._out('2 0 obj')
+        self._out('<<')
+        self._putresourcedict()
+        self._out('>>')
+        self._out('endobj')
+
+    def _enddoc(self) -> None:
+        # FPDF._enddoc minus the header (written with the first page), with offsets into the file
+        self._putpages()
+        self._putresources()
+        self._newobj()
+        self._out('<<')
+        self._putinfo()
+        self._out('>>')
+        self._out('endobj')
+        self._newobj()
+        self._out('<<')
+        self._putcatalog()
+        self._out('>>')
+        self._out('endobj')
+        xref = self.flushed + len(self.buffer)
+        self._out('xref')
+        self._out(f'0 {self.n + 1}')
+        self._out('0000000000 65535 f ')
+        for i in range(1, self.n + 1):
+            self._out('%010d 00000 n ' % self.offsets[i])
+        self._out('trailer')
+        self._out('<<')
+        self._puttrailer()
+        self._out('>>')
+        self._out('startxref')
+        self._out(xref)
+        self._out('%%EOF')
+        self.state = 3
+        self._flush()
+
+
+class SIMGuardReport(StreamingPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 16)
+        self.cell(0, 10, 'SIMGuard Investigation Report', 0, 1, 'C')
+        self.ln(10)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+    def table_header(self) -> None:
+        self.set_font('Arial', 'B', 8)
+        for title, width, _ in TABLE_COLUMNS:
+            self.cell(width, 6, title, 1, 0, 'L')
+        self.ln()
+        self.set_font('Arial', '', 8)
+
+    def table_row(self, record: Dict[str, Any]) -> None:
+        *fixed, (_, reason_width, reason_field) = TABLE_COLUMNS
+        reasons = pdf_text(record.get(reason_field, '')).replace('; ', ';\n')
+        lines = len(self.multi_cell(reason_width, TABLE_LINE_HEIGHT, reasons, split_only=True)) or 1
+        height = lines * TABLE_LINE_HEIGHT
+        if self.get_y() + height > self.page_break_trigger:
+            self.add_page()
+            self.table_header()
+        for _, width, field in fixed:
+            self.cell(width, height, pdf_text(record.get(field, '')), 1, 0, 'L')
+        self.multi_cell(reason_width, TABLE_LINE_HEIGHT, reasons, 1, 'L')
+
+
+def write_report(sink: BinaryIO, results: Dict[str, Any], max_rows: int) -> None:
+    """Render the report for `results` into `sink`; the flagged table lists the max_rows highest risk scores."""
+    pdf = SIMGuardReport(sink)
+    pdf.set_auto_page_break(True, 20)
+    pdf.add_page()
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(0, 10, f"Analysis Time: {results['timestamp']}", 0, 1)
+    summary = results.get('summary', {})
+    pdf.cell(0, 10, f"Total Records: {summary.get('total_records', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"Users Analyzed: {summary.get('users_analyzed', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"Suspicious Users (High + Medium): {summary.get('suspicious_count', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"High Risk Users: {summary.get('high_risk_users', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"Medium Risk Users: {summary.get('medium_risk_users', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"Low Risk Users: {summary.get('clean_users', 'N/A')}", 0, 1)
+
+    # If feature-level statistics are available (new CSV schema), include a short narrative
+    feature_stats: Dict[str, Any] = results.get('feature_stats', {})
+    if feature_stats:
+        pdf.ln(5)
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, 'Behavioural Summary', 0, 1)
+        pdf.set_font('Arial', '', 12)
+        for label, key in FEATURE_STAT_LABELS:
+            if key in feature_stats:
+                pdf.cell(0, 8, f"{label}: {feature_stats[key]}", 0, 1)
+
+    table: SuspiciousTable = results['suspicious_activities']
+    if len(table) and max_rows > 0:
+        # Highest risk first; ties keep upload order
+        positions = np.argsort(-table.risk_scores.astype(np.int64), kind='stable')[:max_rows]
+        pdf.add_page()
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, 'Flagged Users', 0, 1)
+        pdf.set_font('Arial', '', 10)
+        shown = f"all {len(table)}" if len(positions) == len(table) else f"the {len(positions)} highest-risk of {len(table)}"
+        pdf.cell(0, 6, f"Showing {shown} flagged activities, by risk score.", 0, 1)
+        if len(positions) < len(table):
+            pdf.cell(0, 6, "The full list is available from /results?format=csv.", 0, 1)
+        pdf.ln(2)
+        pdf.table_header()
+        for start in range(0, len(positions), REPORT_RENDER_BATCH):
+            for record in table.records(positions[start:start + REPORT_RENDER_BATCH]):
+                pdf.table_row(record)
+
+    pdf.close()
+
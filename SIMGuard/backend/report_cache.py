@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Report Cache
+Report artifacts (PDF report, CSV and Excel exports of the flagged
+activities) rendered once per analysis and kept as files in the upload's
+store entry. An artifact is keyed by the analysis ID and REPORT_TEMPLATE_VERSION,
+which also make up its ETag, so clients can revalidate with If-None-Match
+instead of downloading again. Artifacts of a replaced analysis are removed
+when the new results are stored (invalidate), and the new ones are usually
+built in the background before anyone asks for them (build_all).
+
+Layout:
+    <entry>/report-<analysis_id>-v<template version>[-<pdf row cap>].<pdf|csv|xlsx>
+"""
+
+import io
+import os
+import csv
+import glob
+import json
+import logging
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from pdf_report import write_report
+from result_table import RECORD_FIELDS, SuspiciousTable
+
+logger = logging.getLogger(__name__)
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+    logger.warning("openpyxl not found. Excel report exports disabled.")
+
+# Bump whenever the layout of any artifact changes, so cached files and client ETags are refreshed
+REPORT_TEMPLATE_VERSION = 1
+EXPORT_RENDER_BATCH = 1000
+EXCEL_MAX_ROWS = 1_048_575  # sheet row limit, less the header
+
+
+# --- export writers ---------------------------------------------------------
+
+def iter_ndjson(table: SuspiciousTable, positions: np.ndarray) -> Iterator[str]:
+    """Rows at `positions` as newline-delimited JSON, rendered in batches."""
+    for start in range(0, len(positions), EXPORT_RENDER_BATCH):
+        rows = table.records(positions[start:start + EXPORT_RENDER_BATCH])
+        yield ''.join(json.dumps(row, default=str) + '\n' for row in rows)
+
+
+def iter_csv(table: SuspiciousTable, positions: np.ndarray) -> Iterator[str]:
+    """Rows at `positions` as CSV (with a header), rendered in batches."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=RECORD_FIELDS)
+    writer.writeheader()
+    for start in range(0, len(positions), EXPORT_RENDER_BATCH):
+        writer.writerows(table.records(positions[start:start + EXPORT_RENDER_BATCH]))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_csv(sink: BinaryIO, results: Dict[str, Any]) -> None:
+    table: SuspiciousTable = results['suspicious_activities']
+    for chunk in iter_csv(table, np.arange(len(table))):
+        sink.write(chunk.encode('utf-8'))
+
+
+def write_excel(sink: BinaryIO, results: Dict[str, Any]) -> None:
+    """Summary sheet plus every flagged activity (up to the sheet row limit); rows are streamed to disk."""
+    if Workbook is None:
+        raise RuntimeError("Excel export requires openpyxl")
+    table: SuspiciousTable = results['suspicious_activities']
+    workbook = Workbook(write_only=True)
+    summary = workbook.create_sheet('Summary')
+    summary.append(['Analysis Time', results.get('timestamp')])
+    for key, value in results.get('summary', {}).items():
+        summary.append([key, value])
+    for key, value in results.get('feature_stats', {}).items():
+        summary.append([key, value])
+    if len(table) > EXCEL_MAX_ROWS:
+        summary.append(['note', f"Flagged activities sheet holds the first {EXCEL_MAX_ROWS} of {len(table)} rows"])
+
+    sheet = workbook.create_sheet('Flagged Activities')
+    sheet.append(list(RECORD_FIELDS))
+    positions = np.arange(min(len(table), EXCEL_MAX_ROWS))
+    for start in range(0, len(positions), EXPORT_RENDER_BATCH):
+        for record in table.records(positions[start:start + EXPORT_RENDER_BATCH]):
+            sheet.append([record[field] for field in RECORD_FIELDS])
+    workbook.save(sink)
+
+
+# --- cache --------------------------------------------------------------------
+
+class ReportCache:
+    """Builds and serves report artifacts for an analysis (see module docstring)."""
+
+    def __init__(self, pdf_max_rows: int):
+        self.pdf_max_rows = pdf_max_rows
+        # format -> (writer, mimetype, download name)
+        self.formats: Dict[str, tuple] = {
+            'pdf': (lambda sink, results: write_report(sink, results, self.pdf_max_rows),
+                    'application/pdf', 'simguard_report.pdf'),
+            'csv': (write_csv, 'text/csv', 'simguard_flagged_activities.csv'),
+        }
+        if Workbook is not None:
+            self.formats['xlsx'] = (
+                write_excel,
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                'simguard_flagged_activities.xlsx',
+            )
+
+    def _variant(self, kind: str) -> str:
+        return f"v{REPORT_TEMPLATE_VERSION}-{self.pdf_max_rows}" if kind == 'pdf' else f"v{REPORT_TEMPLATE_VERSION}"
+
+    def etag(self, results: Dict[str, Any], kind: str) -> str:
+        return f"{results['analysis_id']}-{self._variant(kind)}-{kind}"
+
+    def path(self, directory: str, results: Dict[str, Any], kind: str) -> str:
+        return os.path.join(directory, f"report-{results['analysis_id']}-{self._variant(kind)}.{kind}")
+
+    def get(self, directory: str, results: Dict[str, Any], kind: str) -> str:
+        """Path of the `kind` artifact for `results`, rendering it first when it is not cached."""
+        path = self.path(directory, results, kind)
+        if os.path.exists(path):
+            return path
+        writer = self.formats[kind][0]
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as sink:
+                writer(sink, results)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def build_all(self, directory: str, results: Dict[str, Any],
+                  progress: Optional[Callable[[float, str], None]] = None) -> List[str]:
+        """Render every artifact of `results` that is not cached yet; returns the formats available."""
+        built = []
+        for i, kind in enumerate(self.formats):
+            if progress is not None:
+                progress(i / len(self.formats), f"Rendering {kind} report")
+            try:
+                self.get(directory, results, kind)
+                built.append(kind)
+            except Exception as e:
+                logger.warning(f"Building the {kind} report failed ({e})")
+        return built
+
+    @staticmethod
+    def invalidate(directory: str, keep: Optional[Dict[str, Any]] = None) -> None:
+        """Remove cached artifacts, except those of the analysis `keep`."""
+        prefix = os.path.join(directory, f"report-{keep['analysis_id']}-") if keep is not None else None
+        for path in glob.glob(os.path.join(directory, 'report-*')):
+            if prefix is not None and path.startswith(prefix):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Result Table
+Columnar store for the suspicious rows of an analysis. Instead of one dict per
+flagged row (timestamp string, IDs, level and a list of reasons) it keeps:
+
+    timestamps    datetime64[s], or interned strings when they are not plain
+                  'YYYY-MM-DD HH:MM:SS' values
+    user_ids      interned (categorical) codes
+    sim_ids       interned codes
+    risk_levels   interned codes
+    risk_scores   int32
+    rule_bits     one bit per triggered rule (bit j = rule_names[j])
+    rule_args     per rule, the reason args of the rows that triggered it, one
+                  typed column per arg position
+
+so a flagged row costs a few dozen bytes. records() turns any selection back
+into the dicts the API returns (reasons rendered into flag_reason), and
+save/load keep the same layout on disk as an .npz file.
+"""
+
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from simswap_detector.reasons import Reason, render_reasons
+
+TIMESTAMP_FORMAT_LENGTH = len('YYYY-MM-DD HH:MM:SS')
+RECORD_FIELDS = ('timestamp', 'user_id', 'sim_id', 'risk_level', 'risk_score', 'flag_reason')
+
+
+class Categorical:
+    """Values stored once in `categories`, referenced by the smallest fitting integer codes."""
+
+    __slots__ = ('codes', 'categories')
+
+    def __init__(self, codes: np.ndarray, categories: np.ndarray):
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def encode(cls, values: Sequence[Any]) -> 'Categorical':
+        codes, categories = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        categories = np.asarray(categories)
+        if categories.dtype == object and len(categories):
+            # Typed categories where the values allow: int64 IDs, and ASCII strings as bytes
+            # (one byte per character instead of a Python object each)
+            if all(type(v) is int for v in categories):
+                categories = categories.astype(np.int64)
+            elif all(type(v) is str and v.isascii() and not v.endswith('\x00') for v in categories):
+                categories = categories.astype(bytes)
+        return cls(codes.astype(np.min_scalar_type(max(len(categories) - 1, 0))), categories)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def take(self, idx: np.ndarray) -> 'Categorical':
+        return Categorical(self.codes[idx], self.categories)
+
+    def tolist(self, idx: Optional[np.ndarray] = None) -> List[Any]:
+        values = self.categories[self.codes if idx is None else self.codes[idx]]
+        return (np.char.decode(values, 'ascii') if values.dtype.kind == 'S' else values).tolist()
+
+    def mask_of(self, texts: Sequence[str]) -> np.ndarray:
+        """Rows whose value reads as one of `texts` (query strings do not carry the value's type)."""
+        matches = np.flatnonzero(np.isin(self.categories.astype(str), list(texts)))
+        return np.isin(self.codes, matches)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + _nbytes(self.categories)
+
+
+# A column is a plain typed array or a Categorical
+Column = Union[np.ndarray, Categorical]
+
+
+def _nbytes(values: np.ndarray) -> int:
+    if values.dtype != object:
+        return values.nbytes
+    return values.nbytes + sum(sys.getsizeof(v) for v in values)
+
+
+def _column_nbytes(column: Column) -> int:
+    return column.nbytes if isinstance(column, Categorical) else _nbytes(column)
+
+
+def _concat_columns(columns: Sequence[Column]) -> Column:
+    if columns and all(isinstance(c, Categorical) for c in columns):
+        if all(c.categories is columns[0].categories for c in columns):
+            return Categorical(np.concatenate([c.codes for c in columns]), columns[0].categories)
+        if all(c.categories.dtype.kind == columns[0].categories.dtype.kind != 'O' for c in columns):
+            # Same typed categories: merge them and re-number the codes, without decoding any row
+            merged = pd.unique(np.concatenate([c.categories for c in columns]))
+            known = pd.Index(merged)
+            codes = np.concatenate([known.get_indexer(c.categories)[c.codes] for c in columns])
+            return Categorical(codes.astype(np.min_scalar_type(max(len(merged) - 1, 0))), merged)
+        return Categorical.encode([v for c in columns for v in c.tolist()])
+    if columns and all(isinstance(c, np.ndarray) and c.dtype == columns[0].dtype for c in columns):
+        return np.concatenate(columns)
+    return _pack_args([v for c in columns for v in _column_list(c)])
+
+
+def _column_list(column: Column, idx: Optional[np.ndarray] = None) -> List[Any]:
+    if isinstance(column, Categorical):
+        return column.tolist(idx)
+    return (column if idx is None else column[idx]).tolist()
+
+
+def _take_column(column: Column, idx: np.ndarray) -> Column:
+    return column.take(idx) if isinstance(column, Categorical) else column[idx]
+
+
+def _pack_args(values: List[Any]) -> Column:
+    """Typed column for one reason arg position (exact types are kept so reasons render identically)."""
+    kinds = {type(v) for v in values}
+    if kinds == {float}:
+        return np.array(values, dtype=np.float64)
+    if kinds == {int}:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    if kinds <= {str, type(None)} and values:
+        return Categorical.encode(values)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _pack_timestamps(values: List[str]) -> Column:
+    """datetime64[s] when every value is a canonical 'YYYY-MM-DD HH:MM:SS' string, else interned strings."""
+    strings = pd.Series(values, dtype=object)
+    if len(strings) and strings.map(type).eq(str).all() and strings.str.len().eq(TIMESTAMP_FORMAT_LENGTH).all():
+        parsed = pd.to_datetime(strings, format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        # A successful strict parse of a full-length string is the canonical form, so it formats back identically
+        if parsed.notna().all():
+            return parsed.to_numpy().astype('datetime64[s]')
+    return Categorical.encode(values)
+
+
+def _timestamp_list(column: Column, idx: np.ndarray) -> List[str]:
+    if isinstance(column, Categorical):
+        return column.tolist(idx)
+    return [s.replace('T', ' ') for s in np.datetime_as_string(column[idx], unit='s').tolist()]
+
+
+def _bits_dtype(n_rules: int) -> np.dtype:
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n_rules <= np.iinfo(dtype).bits:
+            return np.dtype(dtype)
+    raise ValueError(f"Too many rules for a rule bitmask: {n_rules}")
+
+
+class RuleArgs:
+    """Reason args of every row that triggered one rule, in row order."""
+
+    __slots__ = ('columns', 'arity', 'n_rows')
+
+    def __init__(self, columns: List[Column], arity: Optional[np.ndarray] = None, n_rows: int = 0):
+        self.columns = columns
+        self.arity = arity  # per-row arg count, only when it varies (e.g. sudden_location_change)
+        self.n_rows = n_rows  # a rule without args has no columns to count rows from
+
+    @classmethod
+    def pack(cls, args: List[Sequence[Any]]) -> 'RuleArgs':
+        arities = [len(a) for a in args]
+        width = max(arities, default=0)
+        columns = [_pack_args([a[p] if p < len(a) else None for a in args]) for p in range(width)]
+        varying = len(set(arities)) > 1
+        return cls(columns, np.array(arities, dtype=np.uint8) if varying else None, len(args))
+
+    @classmethod
+    def concat(cls, parts: Sequence['RuleArgs']) -> 'RuleArgs':
+        parts = [part for part in parts if part.n_rows]
+        if not parts:
+            return cls.pack([])
+        if len(parts) == 1:
+            return parts[0]
+        widths = {len(part.columns) for part in parts}
+        n_rows = sum(part.n_rows for part in parts)
+        if len(widths) == 1 and all(part.arity is None for part in parts):
+            columns = [_concat_columns([part.columns[p] for part in parts]) for p in range(widths.pop())]
+            return cls(columns, None, n_rows)
+        return cls.pack([a for part in parts for a in part.args(slice(None))])
+
+    def args(self, idx: Union[np.ndarray, slice]) -> List[Tuple[Any, ...]]:
+        idx = np.arange(self.n_rows)[idx]
+        rows = list(zip(*(_column_list(c, idx) for c in self.columns))) if self.columns else [()] * len(idx)
+        if self.arity is None:
+            return rows
+        return [row[:k] for row, k in zip(rows, self.arity[idx].tolist())]
+
+    def take(self, idx: np.ndarray) -> 'RuleArgs':
+        idx = np.arange(self.n_rows)[idx]
+        return RuleArgs([_take_column(c, idx) for c in self.columns],
+                        None if self.arity is None else self.arity[idx], len(idx))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(_column_nbytes(c) for c in self.columns) + (0 if self.arity is None else self.arity.nbytes)
+
+
+class SuspiciousTable:
+    """Columnar suspicious rows of one analysis (see module docstring)."""
+
+    def __init__(self, timestamps: Column, user_ids: Categorical, sim_ids: Categorical,
+                 risk_levels: Categorical, risk_scores: np.ndarray, rule_names: List[str],
+                 rule_bits: np.ndarray, rule_args: List[RuleArgs]):
+        self.timestamps = timestamps
+        self.user_ids = user_ids
+        self.sim_ids = sim_ids
+        self.risk_levels = risk_levels
+        self.risk_scores = risk_scores
+        self.rule_names = rule_names
+        self.rule_bits = rule_bits
+        self.rule_args = rule_args
+        self._rule_rows: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_columns(cls, timestamps: List[str], user_ids: List[Any], sim_ids: List[Any],
+                     risk_levels: List[str], risk_scores: Sequence[int],
+                     reasons: List[List[Reason]], rule_names: Sequence[str] = ()) -> 'SuspiciousTable':
+        """
+        Pack aligned per-row lists. reasons holds each row's (rule name, args) pairs in rule
+        order; rule_names fixes the bit order (the engine's rule order), unknown rules are appended.
+        """
+        names = list(rule_names)
+        index = {name: j for j, name in enumerate(names)}
+        fired: List[List[Sequence[Any]]] = [[] for _ in names]
+        bits = []
+        for row_reasons in reasons:
+            row_bits = 0
+            for rule, args in row_reasons:
+                j = index.get(rule)
+                if j is None:
+                    j = index[rule] = len(names)
+                    names.append(rule)
+                    fired.append([])
+                row_bits |= 1 << j
+                fired[j].append(args)
+            bits.append(row_bits)
+        return cls(
+            timestamps=_pack_timestamps(timestamps),
+            user_ids=Categorical.encode(user_ids),
+            sim_ids=Categorical.encode(sim_ids),
+            risk_levels=Categorical.encode(risk_levels),
+            risk_scores=np.asarray(risk_scores, dtype=np.int32).reshape(-1),
+            rule_names=names,
+            rule_bits=np.array(bits, dtype=_bits_dtype(len(names))),
+            rule_args=[RuleArgs.pack(args) for args in fired],
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence['SuspiciousTable'], rule_names: Sequence[str] = ()) -> 'SuspiciousTable':
+        """One table with the rows of `tables` in order (an empty table when there are none)."""
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls.from_columns([], [], [], [], [], [], rule_names)
+        if len(tables) == 1:
+            return tables[0]
+        names = list(rule_names)
+        for table in tables:
+            names.extend(name for name in table.rule_names if name not in names)
+        dtype = _bits_dtype(len(names))
+        bits = []
+        for table in tables:
+            # Re-number each table's rule bits into the shared rule order
+            table_bits = np.zeros(len(table), dtype=dtype)
+            for j, name in enumerate(table.rule_names):
+                table_bits[table._rows_of_rule(j)] |= dtype.type(1 << names.index(name))
+            bits.append(table_bits)
+        timestamps = [t.timestamps for t in tables]
+        return cls(
+            timestamps=_concat_columns(timestamps) if all(isinstance(c, np.ndarray) for c in timestamps)
+            else Categorical.encode([v for t in tables for v in _timestamp_list(t.timestamps, slice(None))]),
+            user_ids=_concat_columns([t.user_ids for t in tables]),
+            sim_ids=_concat_columns([t.sim_ids for t in tables]),
+            risk_levels=_concat_columns([t.risk_levels for t in tables]),
+            risk_scores=np.concatenate([t.risk_scores for t in tables]),
+            rule_names=names,
+            rule_bits=np.concatenate(bits),
+            rule_args=[
+                RuleArgs.concat([t.rule_args[t.rule_names.index(name)] for t in tables if name in t.rule_names])
+                for name in names
+            ],
+        )
+
+    def __len__(self) -> int:
+        return len(self.risk_scores)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Tables travel between processes (parallel scoring); the lock and the derived row cache stay behind
+        state = self.__dict__.copy()
+        del state['_lock'], state['_rule_rows']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._rule_rows = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            _column_nbytes(self.timestamps) + self.user_ids.nbytes + self.sim_ids.nbytes
+            + self.risk_levels.nbytes + self.risk_scores.nbytes + self.rule_bits.nbytes
+            + sum(args.nbytes for args in self.rule_args)
+        )
+
+    # --- queries -----------------------------------------------------------
+
+    def rule_mask(self, rule: str) -> np.ndarray:
+        """Rows that triggered `rule`."""
+        if rule not in self.rule_names:
+            return np.zeros(len(self), dtype=bool)
+        bit = self.rule_bits.dtype.type(1 << self.rule_names.index(rule))
+        return (self.rule_bits & bit) != 0
+
+    def level_mask(self, levels: Sequence[str]) -> np.ndarray:
+        return self.risk_levels.mask_of(levels)
+
+    def user_mask(self, user_id: str) -> np.ndarray:
+        return self.user_ids.mask_of([user_id])
+
+    def _rows_of_rule(self, j: int) -> np.ndarray:
+        with self._lock:
+            rows = self._rule_rows.get(j)
+            if rows is None:
+                bit = self.rule_bits.dtype.type(1 << j)
+                rows = self._rule_rows[j] = np.flatnonzero(self.rule_bits & bit)
+            return rows
+
+    def _rule_ranks(self, j: int, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Which of `positions` triggered rule j, and their index into its RuleArgs."""
+        rows = self._rows_of_rule(j)
+        if not len(rows):
+            return np.zeros(len(positions), dtype=bool), np.zeros(0, dtype=np.int64)
+        ranks = np.searchsorted(rows, positions)
+        hit = rows[np.minimum(ranks, len(rows) - 1)] == positions
+        return hit, ranks[hit]
+
+    def reasons(self, positions: Optional[np.ndarray] = None) -> List[List[Reason]]:
+        """(rule name, args) pairs of the rows at `positions` (all rows when None), in rule order."""
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.int64)
+        out: List[List[Reason]] = [[] for _ in range(len(positions))]
+        for j, rule in enumerate(self.rule_names):
+            hit, ranks = self._rule_ranks(j, positions)
+            for k, args in zip(np.flatnonzero(hit).tolist(), self.rule_args[j].args(ranks)):
+                out[k].append((rule, args))
+        return out
+
+    def take(self, positions: np.ndarray) -> 'SuspiciousTable':
+        """Table of the rows at `positions`, in that order."""
+        positions = np.asarray(positions, dtype=np.int64)
+        rule_args = [self.rule_args[j].take(self._rule_ranks(j, positions)[1]) for j in range(len(self.rule_names))]
+        return SuspiciousTable(
+            timestamps=_take_column(self.timestamps, positions),
+            user_ids=self.user_ids.take(positions),
+            sim_ids=self.sim_ids.take(positions),
+            risk_levels=self.risk_levels.take(positions),
+            risk_scores=self.risk_scores[positions],
+            rule_names=list(self.rule_names),
+            rule_bits=self.rule_bits[positions],
+            rule_args=rule_args,
+        )
+
+    def records(self, positions: Optional[np.ndarray] = None, render: bool = True) -> List[Dict[str, Any]]:
+        """
+        Rows at `positions` (all when None) as API dicts, reasons rendered into flag_reason.
+        render=False leaves flag_reason out.
+        """
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.int64)
+        columns = [
+            _timestamp_list(self.timestamps, positions),
+            self.user_ids.tolist(positions),
+            self.sim_ids.tolist(positions),
+            self.risk_levels.tolist(positions),
+            self.risk_scores[positions].tolist(),
+        ]
+        if render:
+            columns.append([render_reasons(reasons) for reasons in self.reasons(positions)])
+        fields = RECORD_FIELDS[:len(columns)]
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+    # --- persistence -------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """Write the table to `path` (.npz, replaced atomically)."""
+        arrays: Dict[str, np.ndarray] = {
+            'rule_names': np.array(self.rule_names, dtype=str),
+            'risk_scores': self.risk_scores,
+            'rule_bits': self.rule_bits,
+        }
+        _flatten(arrays, 'timestamps', self.timestamps)
+        _flatten(arrays, 'user_ids', self.user_ids)
+        _flatten(arrays, 'sim_ids', self.sim_ids)
+        _flatten(arrays, 'risk_levels', self.risk_levels)
+        for j, args in enumerate(self.rule_args):
+            arrays[f'args.{j}.width'] = np.array(len(args.columns))
+            arrays[f'args.{j}.n_rows'] = np.array(args.n_rows)
+            if args.arity is not None:
+                arrays[f'args.{j}.arity'] = args.arity
+            for p, column in enumerate(args.columns):
+                _flatten(arrays, f'args.{j}.{p}', column)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SuspiciousTable':
+        # Object arrays (mixed-type IDs and args) are pickled; the file is our own store entry
+        with np.load(path, allow_pickle=True) as npz:
+            arrays = {key: npz[key] for key in npz.files}
+        rule_names = arrays['rule_names'].tolist()
+        rule_args = []
+        for j in range(len(rule_names)):
+            columns = [_unflatten(arrays, f'args.{j}.{p}') for p in range(int(arrays[f'args.{j}.width']))]
+            rule_args.append(RuleArgs(columns, arrays.get(f'args.{j}.arity'), int(arrays[f'args.{j}.n_rows'])))
+        return cls(
+            timestamps=_unflatten(arrays, 'timestamps'),
+            user_ids=_unflatten(arrays, 'user_ids'),
+            sim_ids=_unflatten(arrays, 'sim_ids'),
+            risk_levels=_unflatten(arrays, 'risk_levels'),
+            risk_scores=arrays['risk_scores'],
+            rule_names=rule_names,
+            rule_bits=arrays['rule_bits'],
+            rule_args=rule_args,
+        )
+
+
+def _flatten(arrays: Dict[str, np.ndarray], name: str, column: Column) -> None:
+    if isinstance(column, Categorical):
+        arrays[f'{name}.codes'] = column.codes
+        arrays[f'{name}.categories'] = column.categories
+    else:
+        arrays[name] = column
+
+
+def _unflatten(arrays: Dict[str, np.ndarray], name: str) -> Column:
+    if name in arrays:
+        return arrays[name]
+    return Categorical(arrays[f'{name}.codes'], arrays[f'{name}.categories'])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Results View
+Filtering, sorting and cursor pagination over the suspicious rows of one
+analysis (GET /results). Filters are vectorized comparisons on the columns of
+the analysis' SuspiciousTable, and only the rows a page returns are rendered.
+
+Cursors are keyset cursors: an opaque token holding the sort key of the last
+row returned, so the next page starts right after it. A cursor is tied to
+the analysis it came from and rejected once the upload is re-analyzed.
+"""
+
+import json
+import base64
+import binascii
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from result_table import SuspiciousTable
+
+SORT_ORDERS = ('row', 'risk_score', 'risk_score_asc')
+RISK_LEVELS = ('HIGH', 'MEDIUM', 'LOW')
+
+
+class CursorError(ValueError):
+    """Malformed cursor, or one issued for a different analysis or sort order."""
+
+
+class ResultsView:
+    """Filtering and keyset paging over one analysis' SuspiciousTable."""
+
+    def __init__(self, table: SuspiciousTable, version: str):
+        self.table = table
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def select(self, risk_levels: Sequence[str] = (), user_id: Optional[str] = None,
+               rules: Sequence[str] = (), sort: str = 'row') -> np.ndarray:
+        """Row positions matching every given filter, in `sort` order (ties keep row order)."""
+        mask = np.ones(len(self.table), dtype=bool)
+        if risk_levels:
+            mask &= self.table.level_mask([level.upper() for level in risk_levels])
+        if user_id is not None:
+            mask &= self.table.user_mask(user_id)
+        if rules:
+            mask &= np.logical_or.reduce([self.table.rule_mask(rule) for rule in rules])
+        positions = np.flatnonzero(mask)
+        if sort == 'row':
+            return positions
+        return positions[np.argsort(self._primary(positions, sort), kind='stable')]
+
+    def _primary(self, positions: np.ndarray, sort: str) -> np.ndarray:
+        scores = self.table.risk_scores[positions].astype(np.int64)
+        if sort == 'risk_score':
+            return -scores
+        if sort == 'risk_score_asc':
+            return scores
+        return np.zeros(len(positions), dtype=np.int64)
+
+    def sort_keys(self, ordered: np.ndarray, sort: str) -> np.ndarray:
+        """Strictly increasing key of every row in `ordered` (primary sort key, then row position)."""
+        return self._primary(ordered, sort) * (len(self.table) + 1) + ordered
+
+    # --- cursors -----------------------------------------------------------
+
+    def encode_cursor(self, key: int, sort: str) -> str:
+        payload = json.dumps({'v': self.version, 's': sort, 'k': int(key)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str, sort: str) -> int:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            version, cursor_sort, key = payload['v'], payload['s'], int(payload['k'])
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise CursorError('Malformed cursor')
+        if version != self.version:
+            raise CursorError('Cursor belongs to an earlier analysis of this upload; start again without a cursor')
+        if cursor_sort != sort:
+            raise CursorError('Cursor was issued for a different sort order')
+        return key
+
+    def page(self, ordered: np.ndarray, sort: str, cursor: Optional[str], limit: Optional[int]) -> Dict[str, Any]:
+        """
+        The rows of `ordered` after `cursor`, at most `limit` of them (all when None).
+        Returns {'positions', 'next_cursor'}; next_cursor is None on the last page.
+        """
+        keys = self.sort_keys(ordered, sort)
+        start = 0
+        if cursor:
+            start = int(np.searchsorted(keys, self.decode_cursor(cursor, sort), side='right'))
+        stop = len(ordered) if limit is None else min(start + limit, len(ordered))
+        next_cursor = None
+        if stop < len(ordered) and stop > start:
+            next_cursor = self.encode_cursor(keys[stop - 1], sort)
+        return {'positions': ordered[start:stop], 'next_cursor': next_cursor}
+
+
+def view_for(results: Dict[str, Any]) -> ResultsView:
+    """ResultsView of an analysis; its cursors are tied to the analysis ID."""
+    return ResultsView(results['suspicious_activities'], results['analysis_id'])
@@ -84,11 +84,15 @@ def main():
     
     # Import app with error handling
     try:
-        from app import app
+        from app import app, in_reloader_child, start_background_services
         
         # Print startup info
         print_startup_info()
         
+        # Model watcher and event consumer run in the reloader's serving child only
+        if in_reloader_child():
+            start_background_services()
+        
         # Start the Flask application
         app.run(
             host='0.0.0.0',
@@ -0,0 +1,304 @@
+"""
+Rule compilation for per-record scoring.
+
+RuleEngine.check_* methods resolve field aliases with chained dict.get calls
+on every record. compile_rules does that once per schema (the set of fields a
+record carries): each alias chain becomes a direct d['field'] fetch or a
+constant, rules whose inputs are all absent are evaluated once and folded
+into a constant (dropped when they cannot fire), and the remaining rules are
+generated into one fused Python function. Reasons are formatted only for the
+rules that fired. Results are identical to calling every check_* method
+(tests/test_rule_equivalence.py checks this against evaluate_frame too).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .config import (
+    SIM_CHANGE_HOURS_THRESHOLD,
+    DEVICE_CHANGE_AFTER_SIM_HOURS,
+    FAILED_LOGIN_COUNT_THRESHOLD,
+    ROAMING_AFTER_SIM_HOURS,
+    LOCATION_DISTANCE_KM_THRESHOLD,
+    SIM_SWAP_REQUEST_HIGH_30D,
+    DAYS_SINCE_LAST_SIM_RECENT,
+    FAILED_OTP_HIGH_24H,
+    ACCOUNT_AGE_NEW_DAYS,
+    AVG_CALL_DURATION_LOW_MIN,
+    AVG_DATA_USAGE_HIGH_GB,
+    UNIQUE_CONTACTS_LOW_30D,
+    IMPOSSIBLE_TRAVEL_SPEED_KMH,
+    IMPOSSIBLE_TRAVEL_MIN_KM,
+    TOWER_MAX_RANGE_KM,
+    RISK_WEIGHTS,
+)
+from .geo import LOCATION_COORDINATE_COLUMNS, haversine_km
+from .reasons import CHANGE_LABELS, render_reason
+from .utils import calculate_distance, format_alert_level, format_alert_emoji
+
+# Resolves an alias chain (first present field wins, else the default) to a source expression
+Getter = Callable[..., str]
+# rule name -> (fields the check reads, source builder). The builder returns the rule's
+# source lines given the getter and a fire(*reason args) statement builder (args as in
+# reasons.REASON_TEMPLATES); a builder of None means the check_* method is called.
+RULE_SOURCES: Dict[str, Tuple[Tuple[str, ...], Optional[Callable[[Getter, Callable[..., str]], List[str]]]]] = {
+    'recent_sim_change': (
+        ('hours_since_sim_change', 'time_since_last_sim_change'),
+        lambda g, fire: [
+            f"h = {g('hours_since_sim_change', 'time_since_last_sim_change', default=999)}",
+            f"if h <= {SIM_CHANGE_HOURS_THRESHOLD!r}: {fire('h')}",
+        ],
+    ),
+    'device_change_after_sim': (
+        ('sim_change_flag', 'device_change_flag', 'hours_between_sim_device_change',
+         'time_since_last_sim_change', 'device_changed_after_sim'),
+        lambda g, fire: [
+            f"sim_flag = int({g('sim_change_flag', default=0)} or 0)",
+            f"dev_flag = int({g('device_change_flag', default=0)} or 0)",
+            f"h = float({g('hours_between_sim_device_change', 'time_since_last_sim_change', default=999)} or 999)",
+            f"if (sim_flag and dev_flag and h <= {DEVICE_CHANGE_AFTER_SIM_HOURS!r}) "
+            f"or {g('device_changed_after_sim', default=False)}: {fire('h')}",
+        ],
+    ),
+    'failed_login_attempts': (
+        ('failed_logins_24h', 'num_failed_logins_last_24h'),
+        lambda g, fire: [
+            f"c = {g('failed_logins_24h', 'num_failed_logins_last_24h', default=0)}",
+            f"if c >= {FAILED_LOGIN_COUNT_THRESHOLD!r}: {fire('c')}",
+        ],
+    ),
+    'sudden_location_change': (
+        ('distance_change_km', *LOCATION_COORDINATE_COLUMNS, 'previous_city', 'current_city'),
+        lambda g, fire: _location_source(g, fire),
+    ),
+    'roaming_after_sim_change': (
+        ('is_roaming', 'hours_since_sim_change', 'time_since_last_sim_change'),
+        lambda g, fire: [
+            f"roaming = {g('is_roaming', default=False)}",
+            f"h = {g('hours_since_sim_change', 'time_since_last_sim_change', default=999)}",
+            f"if roaming and h <= {ROAMING_AFTER_SIM_HOURS!r}: {fire()}",
+        ],
+    ),
+    'impossible_travel': (
+        ('travel_speed_kmh', 'travel_distance_km', 'travel_hours'),
+        lambda g, fire: [
+            "try:",
+            f"    speed = float({g('travel_speed_kmh', default=np.nan)})",
+            f"    dist = float({g('travel_distance_km', default=np.nan)})",
+            "except (TypeError, ValueError):",
+            "    speed = dist = _nan",
+            f"if speed > {IMPOSSIBLE_TRAVEL_SPEED_KMH!r} and dist >= {IMPOSSIBLE_TRAVEL_MIN_KM!r}: "
+            f"{fire('dist', 'float(' + g('travel_hours', default=np.nan) + ')', 'speed')}",
+        ],
+    ),
+    'tower_location_mismatch': (
+        ('serving_tower_distance_km', 'nearest_tower_km', 'serving_tower_id'),
+        lambda g, fire: [
+            "try:",
+            f"    dist = float({g('serving_tower_distance_km', default=np.nan)})",
+            "except (TypeError, ValueError):",
+            "    dist = _nan",
+            f"if dist > {TOWER_MAX_RANGE_KM!r}: "
+            f"{fire(g('serving_tower_id', default=None), 'dist', 'float(' + g('nearest_tower_km', default=np.nan) + ')')}",
+        ],
+    ),
+    'high_sim_swap_activity': (
+        ('sim_swap_request_count_30d',),
+        lambda g, fire: [
+            f"c = int({g('sim_swap_request_count_30d', default=0)} or 0)",
+            f"if c >= {SIM_SWAP_REQUEST_HIGH_30D!r}: {fire('c')}",
+        ],
+    ),
+    'recent_sim_swap': (
+        ('days_since_last_sim_swap',),
+        lambda g, fire: [
+            f"days = float({g('days_since_last_sim_swap', default=1e9)} or 1e9)",
+            f"if days <= {DAYS_SINCE_LAST_SIM_RECENT!r}: {fire('days')}",
+        ],
+    ),
+    'device_or_location_change': (
+        ('device_change_flag', 'location_change_flag'),
+        lambda g, fire: [
+            f"dev_flag = int({g('device_change_flag', default=0)} or 0)",
+            f"loc_flag = int({g('location_change_flag', default=0)} or 0)",
+            f"if dev_flag or loc_flag: {fire('_CHANGE_LABELS[bool(dev_flag) + 2 * bool(loc_flag)]')}",
+        ],
+    ),
+    'failed_otp_anomaly': (
+        ('failed_otp_attempts_24h',),
+        lambda g, fire: [
+            f"c = int({g('failed_otp_attempts_24h', default=0)} or 0)",
+            f"if c >= {FAILED_OTP_HIGH_24H!r}: {fire('c')}",
+        ],
+    ),
+    'account_age_risk': (
+        ('account_age_days',),
+        lambda g, fire: [
+            f"age = float({g('account_age_days', default=1e9)} or 1e9)",
+            f"if age <= {ACCOUNT_AGE_NEW_DAYS!r}: {fire('age')}",
+        ],
+    ),
+    'usage_pattern_anomaly': (
+        ('avg_monthly_call_duration', 'num_calls_last_24h', 'avg_monthly_data_usage_gb', 'data_usage_last_24h'),
+        lambda g, fire: [
+            f"calls = float({g('avg_monthly_call_duration', 'num_calls_last_24h', default=0)} or 0)",
+            f"data = float({g('avg_monthly_data_usage_gb', 'data_usage_last_24h', default=0.0)} or 0.0)",
+            f"if calls < {AVG_CALL_DURATION_LOW_MIN!r} and data > {AVG_DATA_USAGE_HIGH_GB!r}: {fire('calls', 'data')}",
+        ],
+    ),
+    'contact_anomaly': (
+        ('num_unique_contacts_30d',),
+        lambda g, fire: [
+            f"c = int({g('num_unique_contacts_30d', default=0)} or 0)",
+            f"if c <= {UNIQUE_CONTACTS_LOW_30D!r}: {fire('c')}",
+        ],
+    ),
+    'security_events': (
+        ('recent_password_change_flag',),
+        lambda g, fire: [f"if int({g('recent_password_change_flag', default=0)} or 0): {fire()}"],
+    ),
+    'fraud_reported': (
+        ('fraud_report_flag',),
+        lambda g, fire: [f"if int({g('fraud_report_flag', default=0)} or 0): {fire()}"],
+    ),
+}
+
+def _location_source(g: Getter, fire: Callable[..., str]) -> List[str]:
+    """
+    check_sudden_location_change: a present source whose value is None falls
+    through to the next one, so only absent sources are resolved statically.
+    """
+    lines = [
+        f"prev = {g('previous_city', default='')}",
+        f"curr = {g('current_city', default='')}",
+        "if prev and curr and prev != curr:",
+        "    dist_val = _calculate_distance(prev, curr)",
+        f"    if dist_val > {LOCATION_DISTANCE_KM_THRESHOLD!r}: {fire('prev', 'curr', 'dist_val')}",
+    ]
+    coords = [g(name, default=None) for name in LOCATION_COORDINATE_COLUMNS]
+    if 'None' not in coords:
+        lines = [
+            f"coords = ({', '.join(coords)},)",
+            "if all(c is not None for c in coords):",
+            "    try:",
+            "        dist_val = float(_haversine_km(*coords))",
+            "    except (TypeError, ValueError):",
+            "        dist_val = 0.0",
+            f"    if dist_val > {LOCATION_DISTANCE_KM_THRESHOLD!r}: {fire('dist_val')}",
+            "else:",
+            *(f"    {line}" for line in lines),
+        ]
+    dist = g('distance_change_km', default=None)
+    if dist != 'None':
+        lines = [
+            f"dist = {dist}",
+            "if dist is not None:",
+            "    try:",
+            "        dist_val = float(dist)",
+            "    except (TypeError, ValueError):",
+            "        dist_val = 0.0",
+            f"    if dist_val > {LOCATION_DISTANCE_KM_THRESHOLD!r}: {fire('dist_val')}",
+            "else:",
+            *(f"    {line}" for line in lines),
+        ]
+    return lines
+
+
+class CompiledRules:
+    """Fused evaluator for one schema; calling it returns what RuleEngine.evaluate_user returns."""
+
+    __slots__ = ('fields', 'rule_names', 'weights', 'templated', 'active_rules', 'source', '_evaluate')
+
+    def __init__(self, fields: Tuple[str, ...], rule_names: List[str], templated: List[bool],
+                 active_rules: List[str], source: str, evaluate: Callable[[Dict], List[Tuple[int, tuple]]]):
+        self.fields = fields
+        self.rule_names = rule_names
+        self.weights = [RISK_WEIGHTS.get(name, 0) for name in rule_names]
+        # False where a rule's args are its rendered reason (folded constants, checks called as-is)
+        self.templated = templated
+        self.active_rules = active_rules  # rules evaluated per record (the rest were folded at compile time)
+        self.source = source
+        self._evaluate = evaluate
+
+    def fired(self, user_data: Dict) -> List[Tuple[int, tuple]]:
+        """(rule index, reason args) of every rule that fires, in registration order."""
+        return self._evaluate(user_data)
+
+    def reason(self, rule_index: int, args: tuple) -> str:
+        return render_reason(self.rule_names[rule_index], args) if self.templated[rule_index] else args[0]
+
+    def __call__(self, user_data: Dict) -> Dict:
+        triggered_rules = []
+        risk_score = 0
+        for j, args in self._evaluate(user_data):
+            weight = self.weights[j]
+            risk_score += weight
+            triggered_rules.append({
+                'rule': self.rule_names[j],
+                'reason': self.reason(j, args),
+                'weight': weight
+            })
+
+        alert_level = format_alert_level(risk_score)
+        return {
+            'user_id': user_data.get('user_id', 'UNKNOWN'),
+            'risk_score': risk_score,
+            'alert_level': alert_level,
+            'alert_emoji': format_alert_emoji(alert_level),
+            'triggered_rules': triggered_rules,
+            'total_rules_triggered': len(triggered_rules)
+        }
+
+
+def compile_rules(engine: Any, fields: Iterable[str], base: type) -> CompiledRules:
+    """
+    Compile engine.rules for records carrying exactly `fields`. Only checks that
+    are base's own check_<rule name> methods are generated or folded; other rules
+    (no builder in RULE_SOURCES, custom or overridden checks) are called as-is.
+    """
+    fields = tuple(fields)
+    present = set(fields)
+    rule_names = list(engine.rules)
+    templated: List[bool] = []
+    active_rules: List[str] = []
+    namespace: Dict[str, Any] = {
+        '_nan': np.nan, '_CHANGE_LABELS': CHANGE_LABELS, '_checks': {}, '_constant': {},
+        '_haversine_km': haversine_km, '_calculate_distance': calculate_distance,
+    }
+    lines = ['def _evaluate(d):', '    fired = []']
+
+    def getter(*names: str, default: Any) -> str:
+        for name in names:
+            if name in present:
+                return f"d[{name!r}]"
+        return '_nan' if isinstance(default, float) and np.isnan(default) else repr(default)
+
+    for j, name in enumerate(rule_names):
+        check = engine.rules[name]
+        inputs, build = RULE_SOURCES.get(name, (None, None))
+        if getattr(check, '__func__', None) is not getattr(base, f"check_{name}", None):
+            inputs = build = None
+        templated.append(build is not None and bool(present.intersection(inputs)))
+
+        if inputs is not None and not present.intersection(inputs):
+            # Nothing the rule reads is present: its outcome is the same for every record
+            triggered, reason = check({})
+            if triggered:
+                namespace['_constant'][j] = (j, (reason,))
+                lines.append(f"    fired.append(_constant[{j}])")
+            continue
+
+        active_rules.append(name)
+        if build is None:
+            namespace['_checks'][j] = check
+            lines += [
+                f"    triggered, reason = _checks[{j}](d)",
+                f"    if triggered: fired.append(({j}, (reason,)))",
+            ]
+            continue
+
+        fire = lambda *args, j=j: f"fired.append(({j}, ({''.join(a + ', ' for a in args)})))"
+        lines += [f"    {line}" for line in build(getter, fire)]
+
+    lines.append('    return fired')
+    source = '\n'.join(lines)
+    exec(compile(source, f"<compiled rules {len(fields)} fields>", 'exec'), namespace)
+    return CompiledRules(fields, rule_names, templated, active_rules, source, namespace['_evaluate'])
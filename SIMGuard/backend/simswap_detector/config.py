@@ -20,6 +20,64 @@ CELL_TOWER_CHANGE_COUNT_THRESHOLD = 5
 FAILED_LOGIN_COUNT_THRESHOLD = 3
 ROAMING_AFTER_SIM_HOURS = 24
 
+# Sliding-window counters (failed logins, SMS sends, tower changes): window length and
+# bucket size. Counts cover the bucket holding the reference time and the buckets before it.
+COUNTER_WINDOW_HOURS = 24
+COUNTER_BUCKET_SECONDS = 60
+
+# Approximate city coordinates (lat, lon) for distances between named locations
+CITY_COORDINATES = {
+    'Colombo': (6.9271, 79.8612),
+    'Gampaha': (7.0873, 79.9945),
+    'Negombo': (7.2008, 79.8737),
+    'Kalutara': (6.5854, 79.9607),
+    'Kandy': (7.2906, 80.6337),
+    'Matale': (7.4675, 80.6234),
+    'Nuwara Eliya': (6.9497, 80.7891),
+    'Galle': (6.0535, 80.2210),
+    'Matara': (5.9549, 80.5550),
+    'Hambantota': (6.1429, 81.1212),
+    'Jaffna': (9.6615, 80.0255),
+    'Batticaloa': (7.7310, 81.6747),
+    'Trincomalee': (8.5874, 81.2152),
+    'Kurunegala': (7.4818, 80.3609),
+    'Anuradhapura': (8.3114, 80.4037),
+    'Polonnaruwa': (7.9403, 81.0188),
+    'Badulla': (6.9934, 81.0550),
+    'Ratnapura': (6.7056, 80.3847),
+
+    # Global cities used in the sample event logs
+    'New York': (40.7128, -74.0060),
+    'Los Angeles': (34.0522, -118.2437),
+    'Chicago': (41.8781, -87.6298),
+    'Miami': (25.7617, -80.1918),
+    'Seattle': (47.6062, -122.3321),
+    'Boston': (42.3601, -71.0589),
+    'Dallas': (32.7767, -96.7970),
+    'Phoenix': (33.4484, -112.0740),
+    'Denver': (39.7392, -104.9903),
+    'Atlanta': (33.7490, -84.3880),
+    'Portland': (45.5152, -122.6784),
+    'London': (51.5074, -0.1278),
+}
+
+# Distance assumed between two different cities when either has no coordinates
+UNKNOWN_CITY_DISTANCE_KM = 150
+
+# Impossible travel: implied speed between the previous and current located observation.
+# Jumps shorter than the minimum distance are treated as GPS / cell tower jitter, and
+# time gaps are floored so simultaneous observations do not divide by zero.
+IMPOSSIBLE_TRAVEL_SPEED_KMH = 500
+IMPOSSIBLE_TRAVEL_MIN_KM = 50
+MIN_TRAVEL_HOURS = 1 / 60
+
+# Tower location mismatch: the serving cell tower (at its position learned by the tower
+# registry) is further from the reported location than a macro cell can reach. A tower's
+# position is only trusted once several uploads have reported it consistently.
+TOWER_MAX_RANGE_KM = 35
+TOWER_MIN_OBSERVATIONS = 3
+TOWER_MAX_SPREAD_KM = 2.0
+
 # --- New per-user feature thresholds (batch CSV) ---
 
 # How many SIM swap requests in the last 30 days is considered suspicious
@@ -52,6 +110,8 @@ RISK_WEIGHTS = {
     'abnormal_sms_pattern': 7,
     'failed_login_attempts': 20,
     'roaming_after_sim_change': 15,
+    'impossible_travel': 30,
+    'tower_location_mismatch': 15,
 
     # New per-user batch rules
     'high_sim_swap_activity': 30,
@@ -0,0 +1,76 @@
+"""
+Geographic lookups for the location rules.
+
+City names are interned to integer IDs once at import and the great-circle
+distance of every city pair is precomputed into a dense float32 matrix, so
+per-row distances are array gathers instead of trigonometry. haversine_km
+handles raw latitude/longitude columns.
+"""
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+from .config import CITY_COORDINATES, UNKNOWN_CITY_DISTANCE_KM
+
+EARTH_RADIUS_KM = 6371.0
+# Raw coordinate columns used when no precomputed distance_change_km is given
+LOCATION_COORDINATE_COLUMNS = ('previous_location_lat', 'previous_location_lon',
+                               'current_location_lat', 'current_location_lon')
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km, elementwise over arrays (NaN where a coordinate is missing)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class CityIndex:
+    """
+    Case-insensitive city name -> ID table plus a (n + 1) x (n + 1) distance
+    matrix. The last ID stands for any unknown city; its row and column hold
+    unknown_distance, so lookups never branch per row.
+    """
+
+    def __init__(self, coordinates: Dict[str, Tuple[float, float]], unknown_distance: float):
+        names = list(coordinates)
+        self.ids = {name.lower(): i for i, name in enumerate(names)}
+        self.unknown_id = len(names)
+        lat = np.array([coordinates[name][0] for name in names])
+        lon = np.array([coordinates[name][1] for name in names])
+        self.distances = np.full((len(names) + 1, len(names) + 1), unknown_distance, dtype=np.float32)
+        self.distances[:-1, :-1] = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+    def city_id(self, name: str) -> int:
+        return self.ids.get(str(name).lower(), self.unknown_id)
+
+    def _lookup(self, names) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (name key, city ID) for an array of names, looking each distinct name up once.
+        Keys are equal for names equal ignoring case and -1 for empty names.
+        """
+        codes, uniques = pd.factorize(pd.Series(names, dtype=object).fillna('').astype(str))
+        lowered = [name.lower() for name in uniques]
+        unique_keys = pd.factorize(pd.Series(lowered, dtype=object))[0]
+        unique_keys[[name == '' for name in lowered]] = -1
+        unique_ids = np.array([self.ids.get(name, self.unknown_id) for name in lowered], dtype=np.int64)
+        return unique_keys[codes], unique_ids[codes]
+
+    def city_ids(self, names) -> np.ndarray:
+        return self._lookup(names)[1]
+
+    def distance(self, city1: str, city2: str) -> float:
+        """Distance between two named cities; 0 when either is empty or both are the same city."""
+        if not city1 or not city2 or str(city1).lower() == str(city2).lower():
+            return 0.0
+        return float(self.distances[self.city_id(city1), self.city_id(city2)])
+
+    def pair_distances(self, cities1, cities2) -> np.ndarray:
+        """Vectorized distance() over two aligned arrays of names (float32)."""
+        n = len(cities1)
+        keys, ids = self._lookup(np.concatenate([np.asarray(cities1, dtype=object), np.asarray(cities2, dtype=object)]))
+        keys1, keys2 = keys[:n], keys[n:]
+        dist = self.distances[ids[:n], ids[n:]]
+        return np.where((keys1 < 0) | (keys2 < 0) | (keys1 == keys2), np.float32(0), dist)
+
+
+CITY_INDEX = CityIndex(CITY_COORDINATES, UNKNOWN_CITY_DISTANCE_KM)
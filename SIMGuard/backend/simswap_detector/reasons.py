@@ -0,0 +1,77 @@
+"""
+Reason templates for triggered rules.
+
+Scoring keeps a triggered rule as (rule name, args), the numbers its reason
+mentions, and render_reason turns that into the text the check_* methods
+return. Text is only built for the rows an API response or report shows.
+"""
+from typing import Dict, Iterable, Sequence, Tuple, Union
+from .config import (
+    SIM_CHANGE_HOURS_THRESHOLD,
+    LOCATION_DISTANCE_KM_THRESHOLD,
+    SIM_SWAP_REQUEST_HIGH_30D,
+    DAYS_SINCE_LAST_SIM_RECENT,
+    FAILED_OTP_HIGH_24H,
+    ACCOUNT_AGE_NEW_DAYS,
+    UNIQUE_CONTACTS_LOW_30D,
+    IMPOSSIBLE_TRAVEL_SPEED_KMH,
+    TOWER_MAX_RANGE_KM,
+)
+
+# (rule name, reason args); JSON round trips turn it into [rule name, [args...]]
+Reason = Tuple[str, Sequence]
+
+# rule name -> format template, or {number of args: template} when a rule has several wordings.
+# Rules without an entry carry their rendered reason as the only arg.
+REASON_TEMPLATES: Dict[str, Union[str, Dict[int, str]]] = {
+    'recent_sim_change': f"SIM changed {{0:.1f}} hours ago (Threshold: {SIM_CHANGE_HOURS_THRESHOLD}h)",
+    'device_change_after_sim': "Device changed within {0:.1f}h of SIM change",
+    'failed_login_attempts': "High failed logins: {0} in 24h",
+    'sudden_location_change': {
+        1: f"Sudden location jump: {{0:.1f}} km (threshold: {LOCATION_DISTANCE_KM_THRESHOLD} km)",
+        3: "Sudden location jump: {0} to {1} ({2:.0f}km)",
+    },
+    'roaming_after_sim_change': "Roaming active shortly after SIM change",
+    'impossible_travel': (
+        f"Impossible travel: {{0:.1f}} km in {{1:.2f}}h ({{2:.0f}} km/h, threshold: {IMPOSSIBLE_TRAVEL_SPEED_KMH} km/h)"
+    ),
+    'tower_location_mismatch': (
+        f"Serving tower {{0}} is {{1:.1f}} km from reported location "
+        f"(nearest known tower {{2:.1f}} km, max range: {TOWER_MAX_RANGE_KM} km)"
+    ),
+    'high_sim_swap_activity': (
+        f"High SIM swap activity: {{0}} requests in 30 days (threshold: {SIM_SWAP_REQUEST_HIGH_30D})"
+    ),
+    'recent_sim_swap': f"Recent SIM swap: {{0:.0f}} days ago (≤ {DAYS_SINCE_LAST_SIM_RECENT} days)",
+    'device_or_location_change': "{0}",
+    'failed_otp_anomaly': f"High failed OTP attempts: {{0}} in 24h (threshold: {FAILED_OTP_HIGH_24H})",
+    'account_age_risk': f"New account: {{0:.0f}} days old (≤ {ACCOUNT_AGE_NEW_DAYS} days)",
+    'usage_pattern_anomaly': (
+        "Unusual usage pattern: low call duration ({0:.1f} mins/mo) with high data usage ({1:.1f} GB/mo)"
+    ),
+    'contact_anomaly': f"Low contact diversity: {{0}} unique contacts in 30 days (≤ {UNIQUE_CONTACTS_LOW_30D})",
+    'security_events': "Recent password change event detected",
+    'fraud_reported': "Fraud report flag present for this SIM/account",
+}
+
+# device_or_location_change wording by device flag + 2 * location flag
+CHANGE_LABELS = (
+    '',
+    'Device change detected',
+    'Location change detected',
+    'Device change detected and location change detected',
+)
+
+
+def render_reason(rule: str, args: Sequence) -> str:
+    template = REASON_TEMPLATES.get(rule)
+    if template is None:
+        return str(args[0]) if args else ''
+    if not isinstance(template, str):
+        template = template[len(args)]
+    return template.format(*args)
+
+
+def render_reasons(reasons: Iterable[Reason]) -> str:
+    """'; '-joined text of a row's triggered rules (the flag_reason column)."""
+    return '; '.join(render_reason(rule, args) for rule, args in reasons)
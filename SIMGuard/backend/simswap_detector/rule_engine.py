@@ -1,4 +1,6 @@
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Iterable, Tuple, List
+import numpy as np
+import pandas as pd
 from .config import (
     SIM_CHANGE_HOURS_THRESHOLD,
     DEVICE_CHANGE_AFTER_SIM_HOURS,
@@ -13,9 +15,28 @@ from .config import (
     AVG_DATA_USAGE_HIGH_GB,
     UNIQUE_CONTACTS_LOW_30D,
     CELL_TOWER_CHANGE_COUNT_THRESHOLD,
+    IMPOSSIBLE_TRAVEL_SPEED_KMH,
+    IMPOSSIBLE_TRAVEL_MIN_KM,
+    TOWER_MAX_RANGE_KM,
     RISK_WEIGHTS,
 )
-from .utils import calculate_distance, format_alert_level, format_alert_emoji
+from .compiled_rules import CompiledRules, compile_rules
+from .geo import CITY_INDEX, LOCATION_COORDINATE_COLUMNS, haversine_km
+from .reasons import CHANGE_LABELS, render_reason
+from .utils import (
+    calculate_distance,
+    format_alert_level,
+    format_alert_emoji,
+    format_alert_levels,
+    format_alert_emojis,
+)
+
+# (trigger mask, reason args builder) pair produced by the columnar rule checks.
+# The builder receives the indices of triggered rows and returns their reason args
+# (see reasons.REASON_TEMPLATES).
+FrameCheck = Tuple[np.ndarray, Callable[[np.ndarray], List[tuple]]]
+# Distinct record schemas kept compiled per engine
+MAX_COMPILED_SCHEMAS = 64
 
 class RuleEngine:
     """
@@ -31,6 +52,8 @@ class RuleEngine:
             'failed_login_attempts': self.check_failed_login_attempts,
             'sudden_location_change': self.check_sudden_location_change,
             'roaming_after_sim_change': self.check_roaming_after_sim_change,
+            'impossible_travel': self.check_impossible_travel,
+            'tower_location_mismatch': self.check_tower_location_mismatch,
 
             # New per-user batch CSV rules (used when the relevant fields exist)
             'high_sim_swap_activity': self.check_high_sim_swap_activity,
@@ -43,6 +66,8 @@ class RuleEngine:
             'security_events': self.check_security_events,
             'fraud_reported': self.check_fraud_reported,
         }
+        # Fused evaluators keyed by record schema (field names in order); see compile()
+        self._compiled: Dict[Tuple[str, ...], CompiledRules] = {}
 
     def check_recent_sim_change(self, user_data: Dict) -> Tuple[bool, str]:
         """Rule: SIM card changed recently (hours-based)."""
@@ -106,13 +131,24 @@ class RuleEngine:
                 return True, f"Sudden location jump: {dist_val:.1f} km (threshold: {LOCATION_DISTANCE_KM_THRESHOLD} km)"
             return False, ""
 
+        # Raw previous/current coordinates
+        coords = [user_data.get(name) for name in LOCATION_COORDINATE_COLUMNS]
+        if all(c is not None for c in coords):
+            try:
+                dist_val = float(haversine_km(*coords))
+            except (TypeError, ValueError):
+                dist_val = 0.0
+            if dist_val > LOCATION_DISTANCE_KM_THRESHOLD:
+                return True, f"Sudden location jump: {dist_val:.1f} km (threshold: {LOCATION_DISTANCE_KM_THRESHOLD} km)"
+            return False, ""
+
         # Legacy behaviour based on city names (fallback)
         prev = user_data.get('previous_city', '')
         curr = user_data.get('current_city', '')
         if prev and curr and prev != curr:
             dist_val = calculate_distance(prev, curr)
             if dist_val > LOCATION_DISTANCE_KM_THRESHOLD:
-                return True, f"Sudden location jump: {prev} to {curr} ({dist_val}km)"
+                return True, f"Sudden location jump: {prev} to {curr} ({dist_val:.0f}km)"
         return False, ""
 
     def check_roaming_after_sim_change(self, user_data: Dict) -> Tuple[bool, str]:
@@ -127,6 +163,35 @@ class RuleEngine:
             return True, "Roaming active shortly after SIM change"
         return False, ""
 
+    def check_impossible_travel(self, user_data: Dict) -> Tuple[bool, str]:
+        """Rule: Moved faster than any plausible travel (see velocity.velocity_features)"""
+        try:
+            speed = float(user_data.get('travel_speed_kmh', np.nan))
+            dist = float(user_data.get('travel_distance_km', np.nan))
+        except (TypeError, ValueError):
+            return False, ""
+        if speed > IMPOSSIBLE_TRAVEL_SPEED_KMH and dist >= IMPOSSIBLE_TRAVEL_MIN_KM:
+            hours = float(user_data.get('travel_hours', np.nan))
+            return True, (
+                f"Impossible travel: {dist:.1f} km in {hours:.2f}h ({speed:.0f} km/h, "
+                f"threshold: {IMPOSSIBLE_TRAVEL_SPEED_KMH} km/h)"
+            )
+        return False, ""
+
+    def check_tower_location_mismatch(self, user_data: Dict) -> Tuple[bool, str]:
+        """Rule: Serving cell tower out of range of the reported location (see tower_registry)"""
+        try:
+            dist = float(user_data.get('serving_tower_distance_km', np.nan))
+        except (TypeError, ValueError):
+            return False, ""
+        if dist > TOWER_MAX_RANGE_KM:
+            nearest = float(user_data.get('nearest_tower_km', np.nan))
+            return True, (
+                f"Serving tower {user_data.get('serving_tower_id')} is {dist:.1f} km from reported location "
+                f"(nearest known tower {nearest:.1f} km, max range: {TOWER_MAX_RANGE_KM} km)"
+            )
+        return False, ""
+
     # --- New per-user CSV rules ---
 
     def check_high_sim_swap_activity(self, user_data: Dict) -> Tuple[bool, str]:
@@ -219,11 +284,32 @@ class RuleEngine:
             return True, "Fraud report flag present for this SIM/account"
         return False, ""
 
+    def compile(self, fields: Iterable[str]) -> CompiledRules:
+        """
+        Fused evaluator for records carrying exactly these fields (see
+        compiled_rules). Compiled once per schema; call clear_compiled() after
+        changing self.rules.
+        """
+        key = tuple(fields)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            if len(self._compiled) >= MAX_COMPILED_SCHEMAS:
+                self._compiled.clear()
+            compiled = self._compiled[key] = compile_rules(self, key, RuleEngine)
+        return compiled
+
+    def clear_compiled(self) -> None:
+        self._compiled.clear()
+
     def evaluate_user(self, user_data: Dict) -> Dict:
         """
         Run all rules against user data.
         Returns accumulated Risk Score and Alert Level.
         """
+        return self.compile(user_data)(user_data)
+
+    def evaluate_user_uncompiled(self, user_data: Dict) -> Dict:
+        """evaluate_user without compilation: every check_* method is called on the record."""
         triggered_rules = []
         risk_score = 0
         
@@ -251,3 +337,226 @@ class RuleEngine:
             'triggered_rules': triggered_rules,
             'total_rules_triggered': len(triggered_rules)
         }
+
+    # --- Columnar evaluation (whole DataFrame at once) ---
+
+    @staticmethod
+    def _frame_value(df: pd.DataFrame, names: List[str], default) -> pd.Series:
+        """First column in `names` present in df (mirrors the chained dict.get fallbacks)."""
+        for name in names:
+            if name in df.columns:
+                return df[name].fillna(default)
+        return pd.Series(default, index=df.index)
+
+    def _frame_number(
+        self,
+        df: pd.DataFrame,
+        names: List[str],
+        default: float,
+        zero_as_default: bool = False,
+        truncate: bool = False,
+    ) -> np.ndarray:
+        """
+        Numeric column as a float array.
+        zero_as_default mirrors `float(x or default)`, truncate mirrors `int(x)`.
+        """
+        values = pd.to_numeric(self._frame_value(df, names, default), errors='coerce')
+        values = values.fillna(default).to_numpy(dtype=float)
+        if zero_as_default:
+            values = np.where(values == 0, default, values)
+        if truncate:
+            values = np.trunc(values)
+        return values
+
+    def _frame_flag(self, df: pd.DataFrame, name: str) -> np.ndarray:
+        """Truthiness of a flag column as a bool array."""
+        return self._frame_value(df, [name], False).astype(bool).to_numpy()
+
+    def _frame_checks(self, df: pd.DataFrame) -> Dict[str, FrameCheck]:
+        """Columnar counterparts of the check_* methods, keyed by rule name."""
+        num = self._frame_number
+        checks: Dict[str, FrameCheck] = {}
+
+        sim_hours = num(df, ['hours_since_sim_change', 'time_since_last_sim_change'], 999)
+        checks['recent_sim_change'] = (
+            sim_hours <= SIM_CHANGE_HOURS_THRESHOLD,
+            lambda idx: [(h,) for h in sim_hours[idx].tolist()],
+        )
+
+        sim_flag = num(df, ['sim_change_flag'], 0, truncate=True) != 0
+        dev_flag = num(df, ['device_change_flag'], 0, truncate=True) != 0
+        dev_hours = num(
+            df, ['hours_between_sim_device_change', 'time_since_last_sim_change'], 999, zero_as_default=True
+        )
+        checks['device_change_after_sim'] = (
+            (sim_flag & dev_flag & (dev_hours <= DEVICE_CHANGE_AFTER_SIM_HOURS))
+            | self._frame_flag(df, 'device_changed_after_sim'),
+            lambda idx: [(h,) for h in dev_hours[idx].tolist()],
+        )
+
+        # Keep the raw values so reasons print counts exactly like the per-row rule
+        failed_raw = self._frame_value(df, ['failed_logins_24h', 'num_failed_logins_last_24h'], 0).to_numpy()
+        failed = num(df, ['failed_logins_24h', 'num_failed_logins_last_24h'], 0)
+        checks['failed_login_attempts'] = (
+            failed >= FAILED_LOGIN_COUNT_THRESHOLD,
+            lambda idx: [(c,) for c in failed_raw[idx].tolist()],
+        )
+
+        checks['sudden_location_change'] = self._frame_location_check(df)
+
+        speed = num(df, ['travel_speed_kmh'], np.nan)
+        travel_km = num(df, ['travel_distance_km'], np.nan)
+        travel_hours = num(df, ['travel_hours'], np.nan)
+        checks['impossible_travel'] = (
+            (speed > IMPOSSIBLE_TRAVEL_SPEED_KMH) & (travel_km >= IMPOSSIBLE_TRAVEL_MIN_KM),
+            lambda idx: list(zip(travel_km[idx].tolist(), travel_hours[idx].tolist(), speed[idx].tolist())),
+        )
+
+        tower_km = num(df, ['serving_tower_distance_km'], np.nan)
+        nearest_km = num(df, ['nearest_tower_km'], np.nan)
+        tower_ids = df['serving_tower_id'].to_numpy() if 'serving_tower_id' in df.columns else np.full(len(df), None)
+        checks['tower_location_mismatch'] = (
+            tower_km > TOWER_MAX_RANGE_KM,
+            lambda idx: list(zip(tower_ids[idx].tolist(), tower_km[idx].tolist(), nearest_km[idx].tolist())),
+        )
+
+        checks['roaming_after_sim_change'] = (
+            self._frame_flag(df, 'is_roaming') & (sim_hours <= ROAMING_AFTER_SIM_HOURS),
+            lambda idx: [()] * len(idx),
+        )
+
+        swaps = num(df, ['sim_swap_request_count_30d'], 0, truncate=True)
+        checks['high_sim_swap_activity'] = (
+            swaps >= SIM_SWAP_REQUEST_HIGH_30D,
+            lambda idx: [(c,) for c in swaps[idx].astype(np.int64).tolist()],
+        )
+
+        swap_days = num(df, ['days_since_last_sim_swap'], 1e9, zero_as_default=True)
+        checks['recent_sim_swap'] = (
+            swap_days <= DAYS_SINCE_LAST_SIM_RECENT,
+            lambda idx: [(d,) for d in swap_days[idx].tolist()],
+        )
+
+        loc_flag = num(df, ['location_change_flag'], 0, truncate=True) != 0
+        change_labels = np.array(CHANGE_LABELS, dtype=object)
+        change_kind = dev_flag.astype(np.int8) + 2 * loc_flag.astype(np.int8)
+        checks['device_or_location_change'] = (
+            dev_flag | loc_flag,
+            lambda idx: [(label,) for label in change_labels[change_kind[idx]].tolist()],
+        )
+
+        otp = num(df, ['failed_otp_attempts_24h'], 0, truncate=True)
+        checks['failed_otp_anomaly'] = (
+            otp >= FAILED_OTP_HIGH_24H,
+            lambda idx: [(c,) for c in otp[idx].astype(np.int64).tolist()],
+        )
+
+        age = num(df, ['account_age_days'], 1e9, zero_as_default=True)
+        checks['account_age_risk'] = (
+            age <= ACCOUNT_AGE_NEW_DAYS,
+            lambda idx: [(a,) for a in age[idx].tolist()],
+        )
+
+        avg_calls = num(df, ['avg_monthly_call_duration', 'num_calls_last_24h'], 0)
+        avg_data = num(df, ['avg_monthly_data_usage_gb', 'data_usage_last_24h'], 0.0)
+        checks['usage_pattern_anomaly'] = (
+            (avg_calls < AVG_CALL_DURATION_LOW_MIN) & (avg_data > AVG_DATA_USAGE_HIGH_GB),
+            lambda idx: list(zip(avg_calls[idx].tolist(), avg_data[idx].tolist())),
+        )
+
+        contacts = num(df, ['num_unique_contacts_30d'], 0, truncate=True)
+        checks['contact_anomaly'] = (
+            contacts <= UNIQUE_CONTACTS_LOW_30D,
+            lambda idx: [(c,) for c in contacts[idx].astype(np.int64).tolist()],
+        )
+
+        checks['security_events'] = (
+            num(df, ['recent_password_change_flag'], 0, truncate=True) != 0,
+            lambda idx: [()] * len(idx),
+        )
+
+        checks['fraud_reported'] = (
+            num(df, ['fraud_report_flag'], 0, truncate=True) != 0,
+            lambda idx: [()] * len(idx),
+        )
+
+        return checks
+
+    def _frame_location_check(self, df: pd.DataFrame) -> FrameCheck:
+        """Columnar check_sudden_location_change."""
+        if 'distance_change_km' in df.columns or set(LOCATION_COORDINATE_COLUMNS).issubset(df.columns):
+            if 'distance_change_km' in df.columns:
+                dist = self._frame_number(df, ['distance_change_km'], 0.0)
+            else:
+                dist = haversine_km(*(pd.to_numeric(df[name], errors='coerce') for name in LOCATION_COORDINATE_COLUMNS))
+            return (
+                dist > LOCATION_DISTANCE_KM_THRESHOLD,
+                lambda idx: [(d,) for d in dist[idx].tolist()],
+            )
+
+        # Legacy behaviour based on city names: a gather from the precomputed city distance matrix
+        prev = self._frame_value(df, ['previous_city'], '').astype(str).to_numpy(dtype=object)
+        curr = self._frame_value(df, ['current_city'], '').astype(str).to_numpy(dtype=object)
+        dist = CITY_INDEX.pair_distances(prev, curr)
+        return (
+            dist > LOCATION_DISTANCE_KM_THRESHOLD,
+            lambda idx: list(zip(prev[idx].tolist(), curr[idx].tolist(), dist[idx].tolist())),
+        )
+
+    def evaluate_frame(self, df: pd.DataFrame, render_reasons: bool = True) -> pd.DataFrame:
+        """
+        Run all rules against a DataFrame of user rows at once.
+
+        Each rule is a boolean mask over whole columns, risk scores are one
+        matrix-vector product with RISK_WEIGHTS and reasons are only built for
+        rows that triggered. Returns one row per input row (same index) with
+        the keys evaluate_user returns. With render_reasons=False each entry of
+        triggered_rules is a compact (rule name, reason args) pair instead
+        (reasons.render_reason turns it into the same text later).
+        """
+        n = len(df)
+        rule_names = list(self.rules)
+        checks = self._frame_checks(df)
+        records = None
+
+        masks = np.zeros((n, len(rule_names)), dtype=bool)
+        reason_builders = []
+        for j, rule_name in enumerate(rule_names):
+            if rule_name in checks:
+                masks[:, j], build = checks[rule_name]
+            else:
+                # Rules registered without a columnar form fall back to the per-row check
+                if records is None:
+                    records = df.to_dict('records')
+                results = [self.rules[rule_name](record) for record in records]
+                masks[:, j] = [triggered for triggered, _ in results]
+                reasons = [reason for _, reason in results]
+                build = lambda idx, reasons=reasons: [(reasons[i],) for i in idx]
+            reason_builders.append(build)
+
+        weights = np.array([RISK_WEIGHTS.get(name, 0) for name in rule_names], dtype=np.int64)
+        risk_scores = masks.astype(np.int64) @ weights
+        alert_levels = format_alert_levels(risk_scores)
+
+        triggered_rules = [[] for _ in range(n)]
+        for j, rule_name in enumerate(rule_names):
+            idx = np.flatnonzero(masks[:, j])
+            if not len(idx):
+                continue
+            weight = RISK_WEIGHTS.get(rule_name, 0)
+            if render_reasons:
+                for i, args in zip(idx.tolist(), reason_builders[j](idx)):
+                    triggered_rules[i].append({'rule': rule_name, 'reason': render_reason(rule_name, args), 'weight': weight})
+            else:
+                for i, args in zip(idx.tolist(), reason_builders[j](idx)):
+                    triggered_rules[i].append((rule_name, args))
+
+        user_ids = df['user_id'] if 'user_id' in df.columns else pd.Series('UNKNOWN', index=df.index)
+        return pd.DataFrame({
+            'user_id': user_ids.to_numpy(),
+            'risk_score': risk_scores,
+            'alert_level': alert_levels,
+            'alert_emoji': format_alert_emojis(alert_levels),
+            'triggered_rules': triggered_rules,
+            'total_rules_triggered': masks.sum(axis=1),
+        }, index=df.index)
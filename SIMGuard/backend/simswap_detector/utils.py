@@ -2,13 +2,12 @@
 Utility functions for distance calculation and formatting
 """
 from datetime import datetime
+import numpy as np
+from .geo import CITY_INDEX
 
 def calculate_distance(city1, city2):
-    # Mock distance calculation for demo purposes
-    # In a real app, this would use Geopy or similar
-    if not city1 or not city2: return 0
-    if city1.lower() == city2.lower(): return 0
-    return 150 # Mock distance for different cities
+    # Precomputed great-circle distance (km); cities without coordinates count as UNKNOWN_CITY_DISTANCE_KM apart
+    return CITY_INDEX.distance(city1, city2)
 
 def hours_between(dt1, dt2):
     if not dt1 or not dt2: return 0
@@ -23,7 +22,17 @@ def format_alert_level(score):
     if score >= 30: return 'MEDIUM'
     return 'LOW'
 
+def format_alert_levels(scores):
+    # Vectorized format_alert_level for an array of risk scores
+    scores = np.asarray(scores)
+    return np.select([scores >= 60, scores >= 30], ['HIGH', 'MEDIUM'], default='LOW').astype(object)
+
 def format_alert_emoji(level):
     if level == 'HIGH': return '🚨'
     if level == 'MEDIUM': return '⚠️'
     return '✅'
+
+def format_alert_emojis(levels):
+    # Vectorized format_alert_emoji for an array of alert levels
+    levels = np.asarray(levels, dtype=object)
+    return np.select([levels == 'HIGH', levels == 'MEDIUM'], ['🚨', '⚠️'], default='✅').astype(object)
@@ -0,0 +1,88 @@
+"""
+Travel velocity features for the impossible-travel rule.
+
+Per-user snapshot rows carry a previous and a current position (user
+location, falling back to the serving cell tower) and the times the user was
+last seen before the current event. velocity_features turns every row into
+great-circle distance, elapsed hours and implied km/h with whole-column
+NumPy operations, so it scales to tens of millions of rows.
+"""
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+from .config import MIN_TRAVEL_HOURS
+from .geo import haversine_km
+
+# (previous lat, previous lon, current lat, current lon), in order of preference
+POSITION_COLUMNS = (
+    ('previous_location_lat', 'previous_location_lon', 'current_location_lat', 'current_location_lon'),
+    ('prev_cell_tower_lat', 'prev_cell_tower_lon', 'cell_tower_lat', 'cell_tower_lon'),
+)
+CURRENT_TIME_COLUMN = 'timestamp'
+# When the user was last seen before the current event (the latest one not after it is used)
+PREVIOUS_TIME_COLUMNS = ('last_sim_usage_timestamp', 'last_device_usage_timestamp')
+VELOCITY_COLUMNS = ['travel_distance_km', 'travel_hours', 'travel_speed_kmh']
+
+_NS_PER_HOUR = 3600 * 10**9
+
+
+def _epoch_ns(values: pd.Series) -> np.ndarray:
+    """Timestamps as float nanoseconds since the epoch, NaN where missing or unparseable."""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        # One vectorized ISO 8601 pass; only values it cannot read go through the slow mixed parser
+        # (offsets are converted to UTC; naive values are taken as UTC already)
+        parsed = pd.to_datetime(values, errors='coerce', format='ISO8601', utc=True)
+        residual = parsed.isna() & values.notna()
+        if residual.any():
+            parsed[residual] = pd.to_datetime(values[residual].astype(str), errors='coerce', format='mixed', utc=True)
+        values = parsed
+    if getattr(values.dt, 'tz', None) is not None:
+        values = values.dt.tz_convert('UTC').dt.tz_localize(None)
+    times = values.to_numpy('datetime64[ns]')
+    ns = times.view(np.int64).astype(float)
+    ns[np.isnat(times)] = np.nan
+    return ns
+
+
+def _numeric(df: pd.DataFrame, column: str) -> np.ndarray:
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def travel_speed_kmh(distance_km: np.ndarray, hours: np.ndarray) -> np.ndarray:
+    """Implied speed; NaN when the elapsed time is unknown or negative."""
+    hours = np.where(hours >= 0, np.maximum(hours, MIN_TRAVEL_HOURS), np.nan)
+    return distance_km / hours
+
+
+def velocity_features(df: pd.DataFrame, positions: Sequence = POSITION_COLUMNS) -> Optional[pd.DataFrame]:
+    """
+    travel_distance_km / travel_hours / travel_speed_kmh for every row of df
+    (same index), or None when df has no usable position or time columns.
+    Missing inputs give NaN, which no travel rule treats as a trigger.
+    """
+    available = [cols for cols in positions if set(cols).issubset(df.columns)]
+    previous_times = [c for c in PREVIOUS_TIME_COLUMNS if c in df.columns]
+    if not available or CURRENT_TIME_COLUMN not in df.columns or not previous_times:
+        return None
+
+    distance = np.full(len(df), np.nan)
+    for cols in available:
+        # Fill rows still lacking a distance from the next source of coordinates
+        missing = np.isnan(distance)
+        if not missing.any():
+            break
+        distance[missing] = haversine_km(*(_numeric(df, c) for c in cols))[missing]
+
+    now = _epoch_ns(df[CURRENT_TIME_COLUMN])
+    previous = np.full(len(df), np.nan)
+    for column in previous_times:
+        seen = _epoch_ns(df[column])
+        seen[seen > now] = np.nan  # a "last seen" after the event itself is not a previous observation
+        previous = np.fmax(previous, seen)
+    hours = (now - previous) / _NS_PER_HOUR
+
+    return pd.DataFrame({
+        'travel_distance_km': distance,
+        'travel_hours': hours,
+        'travel_speed_kmh': travel_speed_kmh(distance, hours),
+    }, index=df.index)
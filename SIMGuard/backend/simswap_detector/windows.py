@@ -0,0 +1,125 @@
+"""
+Sliding-window event counters (failed logins, SMS sends, tower changes, ...).
+
+Time is cut into fixed buckets (COUNTER_BUCKET_SECONDS). A windowed count at
+time t covers the bucket holding t and the n_buckets - 1 buckets before it.
+WindowCounter keeps that count for one user as events arrive; bucket_counts /
+window_totals compute the same thing for a whole DataFrame, so batch and
+streaming scoring agree exactly.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+import numpy as np
+import pandas as pd
+from .config import COUNTER_WINDOW_HOURS, COUNTER_BUCKET_SECONDS
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class WindowSpec(NamedTuple):
+    window_seconds: int
+    bucket_seconds: int
+
+    @property
+    def n_buckets(self) -> int:
+        return max(self.window_seconds // self.bucket_seconds, 1)
+
+    def bucket_of(self, ts: datetime) -> int:
+        return (ts - EPOCH) // timedelta(seconds=self.bucket_seconds)
+
+    def buckets_of(self, times: pd.Series) -> np.ndarray:
+        # Vectorized bucket_of; times must not contain NaT
+        ns = pd.to_datetime(times).to_numpy('datetime64[ns]').astype(np.int64)
+        return ns // (self.bucket_seconds * 10**9)
+
+
+DAY_WINDOW = WindowSpec(COUNTER_WINDOW_HOURS * 3600, COUNTER_BUCKET_SECONDS)
+
+
+class WindowCounter:
+    """
+    Event count over a trailing window for one key, as a ring of (bucket, count)
+    pairs ordered oldest first. Holds at most n_buckets pairs; add() and
+    count() are amortized O(1) for time-ordered events.
+    """
+    __slots__ = ('spec', '_buckets', '_total')
+
+    def __init__(self, spec: WindowSpec = DAY_WINDOW):
+        self.spec = spec
+        self._buckets: Optional[deque] = None  # created on first event; most users never need one
+        self._total = 0
+
+    def add(self, ts: datetime, n: int = 1) -> None:
+        bucket = self.spec.bucket_of(ts)
+        if self._buckets is None:
+            self._buckets = deque()
+        buckets = self._buckets
+        if not buckets or bucket > buckets[-1][0]:
+            buckets.append([bucket, n])
+            self._total += n
+            self._expire(bucket)
+        elif bucket == buckets[-1][0]:
+            buckets[-1][1] += n
+            self._total += n
+        elif bucket > buckets[-1][0] - self.spec.n_buckets:
+            self._add_late(bucket, n)
+
+    def _add_late(self, bucket: int, n: int) -> None:
+        # Out-of-order event still inside the window: walk back to its slot
+        buckets = self._buckets
+        for i in range(len(buckets) - 1, -1, -1):
+            if buckets[i][0] == bucket:
+                buckets[i][1] += n
+                break
+            if buckets[i][0] < bucket:
+                buckets.insert(i + 1, [bucket, n])
+                break
+        else:
+            buckets.appendleft([bucket, n])
+        self._total += n
+
+    def _expire(self, bucket: int) -> None:
+        first = bucket - self.spec.n_buckets + 1
+        buckets = self._buckets
+        while buckets and buckets[0][0] < first:
+            self._total -= buckets.popleft()[1]
+
+    def count(self, now: Optional[datetime] = None) -> int:
+        """Events in the window ending at now (default: the latest event's bucket)."""
+        if self._buckets and now is not None:
+            self._expire(self.spec.bucket_of(now))
+        return self._total
+
+
+def bucket_counts(keys: pd.Series, times: pd.Series, spec: WindowSpec = DAY_WINDOW) -> pd.DataFrame:
+    """Events per (key, bucket) as columns key, bucket, count."""
+    frame = pd.DataFrame({'key': keys.to_numpy(), 'bucket': spec.buckets_of(times)})
+    return frame.groupby(['key', 'bucket'], sort=False).size().rename('count').reset_index()
+
+
+def merge_counts(*counts: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Combine bucket_counts outputs (e.g. from consecutive chunks of a file)."""
+    frames = [c for c in counts if c is not None]
+    combined = pd.concat(frames, ignore_index=True)
+    return combined.groupby(['key', 'bucket'], sort=False)['count'].sum().reset_index()
+
+
+def _in_window(counts: pd.DataFrame, end_times: pd.Series, spec: WindowSpec) -> np.ndarray:
+    ends = counts['key'].map(end_times)
+    present = ends.notna().to_numpy()
+    end_bucket = np.zeros(len(counts), dtype=np.int64)
+    end_bucket[present] = spec.buckets_of(ends[present])
+    bucket = counts['bucket'].to_numpy()
+    return present & (bucket > end_bucket - spec.n_buckets) & (bucket <= end_bucket)
+
+
+def trim_counts(counts: pd.DataFrame, end_times: pd.Series, spec: WindowSpec = DAY_WINDOW) -> pd.DataFrame:
+    """Drop buckets outside each key's window ending at end_times[key] (indexed by key)."""
+    return counts[_in_window(counts, end_times, spec)]
+
+
+def window_totals(counts: pd.DataFrame, end_times: pd.Series, spec: WindowSpec = DAY_WINDOW) -> pd.Series:
+    """Per-key event count in the window ending at end_times[key], indexed by key."""
+    recent = counts[_in_window(counts, end_times, spec)]
+    return recent['count'].groupby(recent['key'], sort=False).sum()
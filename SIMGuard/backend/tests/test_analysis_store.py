@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Check analysis_store.AnalysisStore eviction and results storage.
+Held entries (in this or another process) and entries with an active job are
+not swept; results.json and its suspicious table are written as one pair.
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+from analysis_store import AnalysisStore
+from result_table import SuspiciousTable
+
+RULES = ['rule_a', 'rule_b']
+
+
+def make_results(analysis_id, users):
+    table = SuspiciousTable.from_columns(
+        ['2025-01-01 00:00:00'] * len(users), users, [f'SIM-{user}' for user in users],
+        ['HIGH'] * len(users), [70 + i for i in range(len(users))],
+        [[('rule_a', (1.5,))] for _ in users], RULES)
+    return {'analysis_id': analysis_id, 'summary': {'suspicious_users': len(users)}, 'suspicious_activities': table}
+
+
+def age(store, upload_id, seconds):
+    past = time.time() - seconds
+    os.utime(store.entry_dir(upload_id), (past, past))
+
+
+def hold_in_child(root, upload_id, ready, release):
+    store = AnalysisStore(root)
+    with store.hold(upload_id):
+        ready.set()
+        release.wait(30)
+
+
+def test_sweep_expires_idle_entries():
+    with tempfile.TemporaryDirectory() as root:
+        store = AnalysisStore(root, ttl_seconds=60)
+        idle, fresh = store.create('a.csv'), store.create('b.csv')
+        age(store, idle, 120)
+        store.sweep()
+        assert store.ids() == [fresh]
+
+
+def test_sweep_skips_held_entries():
+    with tempfile.TemporaryDirectory() as root:
+        store = AnalysisStore(root, ttl_seconds=60)
+        upload_id = store.create('a.csv')
+        age(store, upload_id, 120)
+        with store.hold(upload_id):
+            store.sweep()
+            assert store.exists(upload_id)
+        age(store, upload_id, 120)
+        store.sweep()
+        assert not store.exists(upload_id)
+
+
+def test_sweep_skips_entries_held_by_another_process():
+    with tempfile.TemporaryDirectory() as root:
+        store = AnalysisStore(root, ttl_seconds=60)
+        upload_id = store.create('a.csv')
+        ctx = multiprocessing.get_context('spawn')
+        ready, release = ctx.Event(), ctx.Event()
+        child = ctx.Process(target=hold_in_child, args=(root, upload_id, ready, release))
+        child.start()
+        try:
+            assert ready.wait(30)
+            age(store, upload_id, 120)
+            store.sweep()
+            assert store.exists(upload_id)
+        finally:
+            release.set()
+            child.join(30)
+        store.sweep()
+        assert not store.exists(upload_id)
+
+
+def test_sweep_skips_entries_with_active_jobs():
+    active = {'job1'}
+    with tempfile.TemporaryDirectory() as root:
+        store = AnalysisStore(root, ttl_seconds=60, max_entries=1, job_active=active.__contains__)
+        busy = store.create('a.csv')
+        store.add_job(busy, 'job1')
+        age(store, busy, 120)
+        newer = store.create('b.csv')  # sweeps: busy is idle and beyond max_entries
+        assert store.exists(busy) and store.exists(newer)
+
+        active.clear()
+        store.add_job(busy, 'job2')
+        assert store.get_meta(busy)['jobs'] == ['job2']  # finished jobs are dropped
+        age(store, busy, 120)
+        store.sweep()
+        assert not store.exists(busy)
+
+
+def test_results_written_as_one_generation():
+    with tempfile.TemporaryDirectory() as root:
+        store = AnalysisStore(root)
+        upload_id = store.create('a.csv')
+        store.put_results(upload_id, make_results('first', ['u1']))
+        store.put_results(upload_id, make_results('second', ['u1', 'u2']))
+        entry = store.entry_dir(upload_id)
+        assert sorted(name for name in os.listdir(entry) if name.endswith('.npz')) == ['suspicious-second.npz']
+
+        reader = AnalysisStore(root)  # nothing cached
+        results = reader.get_results(upload_id)
+        assert results['analysis_id'] == 'second'
+        assert results['suspicious_activities'].records() == make_results('second', ['u1', 'u2'])['suspicious_activities'].records()
@@ -12,6 +12,7 @@ import os
 # Configuration
 API_BASE_URL = "http://localhost:5000"
 SAMPLE_CSV_PATH = "../sample_logs.csv"
+upload_id = None  # set by test_file_upload; /analyze, /results and /report require it
 
 def test_health_check():
     """Test the health check endpoint"""
@@ -27,6 +28,7 @@ def test_health_check():
 
 def test_file_upload():
     """Test file upload endpoint"""
+    global upload_id
     print("\n📤 Testing file upload endpoint...")
     
     if not os.path.exists(SAMPLE_CSV_PATH):
@@ -38,6 +40,7 @@ def test_file_upload():
             files = {'file': ('sample_logs.csv', file, 'text/csv')}
             response = requests.post(f"{API_BASE_URL}/upload", files=files)
         
+        upload_id = response.json().get('upload_id')
         print(f"Status Code: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
         return response.status_code == 200
@@ -49,7 +52,7 @@ def test_analysis():
     """Test analysis endpoint"""
     print("\n🔬 Testing analysis endpoint...")
     try:
-        response = requests.post(f"{API_BASE_URL}/analyze")
+        response = requests.post(f"{API_BASE_URL}/analyze", json={'upload_id': upload_id})
         print(f"Status Code: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
         return response.status_code == 200
@@ -61,7 +64,7 @@ def test_results():
     """Test results endpoint"""
     print("\n📊 Testing results endpoint...")
     try:
-        response = requests.get(f"{API_BASE_URL}/results")
+        response = requests.get(f"{API_BASE_URL}/results", params={'upload_id': upload_id})
         print(f"Status Code: {response.status_code}")
         
         if response.status_code == 200:
@@ -88,7 +91,7 @@ def test_report_generation():
     """Test report generation endpoint"""
     print("\n📄 Testing report generation endpoint...")
     try:
-        response = requests.get(f"{API_BASE_URL}/report")
+        response = requests.get(f"{API_BASE_URL}/report", params={'upload_id': upload_id})
         print(f"Status Code: {response.status_code}")
         
         if response.status_code == 200:
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Check event_stream.EventStream.ingest against the batch analysis.
+The sample event log is replayed in time order and each user's latest
+evaluation must equal what build_user_feature_rows gives for the whole file.
+Malformed events are rejected per event (also through POST /events) without
+affecting the others.
+"""
+
+import os
+import sys
+import logging
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+import pandas as pd
+import pytest
+
+from event_stream import EventError, EventStream, normalize_event
+from simswap_detector.reasons import render_reason
+
+EVENT_LOG_SAMPLE = os.path.join(BACKEND_DIR, 'uploads', 'sample_logs.csv')
+
+
+def event(user_id='U1', timestamp='2025-01-10 10:00:00', **fields):
+    return {'user_id': user_id, 'timestamp': timestamp, 'sim_id': 'SIM1', 'device_id': 'DEV1',
+            'location': 'Colombo', 'login_status': 'success', **fields}
+
+
+def new_stream(**kwargs):
+    import app
+    return EventStream(app.rule_engine, **kwargs)
+
+
+def test_stream_matches_batch():
+    import app
+    raw = pd.read_csv(EVENT_LOG_SAMPLE, dtype=str)
+    raw = raw.iloc[pd.to_datetime(raw['timestamp']).argsort(kind='stable')]
+    out = new_stream().ingest_many(raw.to_dict('records'))
+    assert out['accepted'] == len(raw) and not out['rejected']
+
+    batch, _ = app.build_user_feature_rows(app.load_normalized_dataframe(EVENT_LOG_SAMPLE))
+    expected = {row['user_id']: row for row in batch}
+    assert len(out['results']) == len(expected)
+    for result in out['results']:
+        want = expected[result['user_id']]
+        assert result['risk_score'] == want['risk_score'], result['user_id']
+        assert result['alert_level'] == want['alert_level'], result['user_id']
+        # Batch rows keep reasons as (rule, args); the stream renders them
+        assert [(r['rule'], r['reason']) for r in result['triggered_rules']] == [
+            (rule, render_reason(rule, args)) for rule, args in want['triggered_rules']]
+
+
+@pytest.mark.parametrize('bad', [
+    None,
+    [1, 2],
+    event(user_id=None),
+    event(user_id=''),
+    event(user_id={'a': 1}),
+    event(user_id=['U1']),
+    event(user_id=True),
+    event(user_id=1.5),
+    event(timestamp=None),
+    event(timestamp='not a time'),
+    event(timestamp=1e20),
+    event(timestamp=-1e20),
+    event(timestamp='0001-01-01T00:00:00+14:00'),
+    event(timestamp=float('nan')),
+])
+def test_bad_events_raise_event_error(bad):
+    with pytest.raises(EventError):
+        normalize_event(bad)
+
+
+def test_bad_events_rejected_per_event():
+    stream = new_stream()
+    out = stream.ingest_many([event(), event(user_id={'a': 1}), event(timestamp=1e20), event(user_id=7)])
+    assert out['accepted'] == 2
+    assert [reject['index'] for reject in out['rejected']] == [1, 2]
+    assert sorted(str(result['user_id']) for result in out['results']) == ['7', 'U1']
+    assert stream.stats()['events'] == 2
+
+
+def test_alert_only_when_triggered_rules_change():
+    stream = new_stream()
+    stream.ingest(event(timestamp='2025-01-10 10:00:00'))
+    # SIM swap, then a new device and failed logins within the hour
+    stream.ingest(event(timestamp='2025-01-10 10:05:00', sim_id='SIM2'))
+    for minute in range(10, 14):
+        stream.ingest(event(timestamp=f'2025-01-10 10:{minute}:00', sim_id='SIM2', device_id='DEV2',
+                            login_status='failed'))
+    alerts = stream.alerts()
+    assert alerts, 'no alert for a SIM swap followed by a new device and failed logins'
+    assert all(a['alert_level'] in ('MEDIUM', 'HIGH') for a in alerts)
+    assert [a['seq'] for a in alerts] == list(range(1, len(alerts) + 1))
+
+    # Same SIM and device, no new failures: the triggered rules stay the same
+    result, alert = stream.ingest(event(timestamp='2025-01-10 10:15:00', sim_id='SIM2', device_id='DEV2'))
+    assert alert is None and result['alert_level'] == alerts[-1]['alert_level']
+    assert stream.alerts(since=alerts[-1]['seq']) == []
+
+
+def test_idle_users_dropped_beyond_max_users():
+    stream = new_stream(max_users=2)
+    for user in ('A', 'B', 'C'):
+        stream.ingest(event(user_id=user))
+    assert stream.user('A') is None
+    assert stream.user('B') is not None and stream.user('C') is not None
+
+
+def test_events_route_rejects_instead_of_failing():
+    import app
+    client = app.app.test_client()
+    response = client.post('/events', json={'events': [event(user_id={'a': 1}), event(timestamp=1e20)]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['accepted'] == 0 and len(body['rejected']) == 2
+
+    response = client.post('/events', data='{"user_id": "U9", "timestamp": 1e20}\nnot json\n',
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200 and len(response.get_json()['rejected']) == 2
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Check model_registry.ModelRegistry and ThinkerModel hot reload.
+A registry in a temporary directory serves the legacy pickles until a version
+is published; publishing moves CURRENT and a reload picks up the new pair.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+from model_registry import CURRENT_FILENAME, ModelRegistry, LEGACY_MODEL_PATH, LEGACY_SCALER_PATH
+from ml_core import ThinkerModel
+
+RECORD = {'time_since_sim_change': 2, 'distance_change': 300, 'num_calls_last_24h': 40,
+          'data_usage_last_24h': 900, 'data_usage_change_percent': 150}
+
+
+def test_legacy_pickles_served_until_publish():
+    with tempfile.TemporaryDirectory() as root:
+        registry = ModelRegistry(root)
+        assert registry.current_version() is None
+        bundle = registry.load()
+        assert bundle.version.startswith('legacy-') and bundle.source == LEGACY_MODEL_PATH
+        assert registry.fingerprint().startswith('legacy:')
+
+        version = registry.publish(bundle.model, bundle.scaler, {'note': 'test'})
+        assert registry.current_version() == version
+        assert registry.fingerprint() == f'registry:{version}'
+        assert registry.metadata(version)['note'] == 'test'
+        published = registry.load()
+        assert published.version == version and published.source == os.path.join(root, version)
+        assert not [name for name in os.listdir(root) if name.endswith('.tmp')]
+
+
+def test_missing_legacy_pickles():
+    with tempfile.TemporaryDirectory() as root:
+        registry = ModelRegistry(root, os.path.join(root, 'none.pkl'), os.path.join(root, 'none.pkl'))
+        assert registry.load() is None
+        assert registry.fingerprint() is None
+
+
+def test_each_publish_is_a_new_version():
+    with tempfile.TemporaryDirectory() as root:
+        registry = ModelRegistry(root)
+        bundle = registry.load()
+        first = registry.publish(bundle.model, bundle.scaler)
+        second = registry.publish(bundle.model, bundle.scaler)
+        assert first != second and registry.current_version() == second
+        assert os.path.isdir(os.path.join(root, first))
+        with open(os.path.join(root, CURRENT_FILENAME)) as f:
+            assert f.read() == second
+
+
+def test_thinker_reloads_published_version():
+    with tempfile.TemporaryDirectory() as root:
+        writer = ThinkerModel()
+        reader = ThinkerModel()
+        writer.registry = reader.registry = ModelRegistry(root, LEGACY_MODEL_PATH, LEGACY_SCALER_PATH)
+        before = reader.predict(RECORD)
+
+        version = writer.publish_model(writer.model, writer.scaler)
+        assert writer.version == version and reader.version != version
+        assert reader.load_model() and reader.version == version
+        assert reader.predict(RECORD)['confidence'] == before['confidence']
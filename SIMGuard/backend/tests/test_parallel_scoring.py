@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Check multi-process scoring against the single-process scorer.
+Runs parallel_scoring.score_parallel with real (spawned) worker processes on a
+per-user and an event-log sample; it raises instead of falling back, and the
+app-level scorers are checked for the ERROR their fallback logs, so a shard
+result that cannot be sent back from a worker fails here rather than in a log line.
+"""
+
+import os
+import sys
+import pickle
+import logging
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+PER_USER_SAMPLE = os.path.join(BACKEND_DIR, 'uploads', 'set_1.csv')
+EVENT_LOG_SAMPLE = os.path.join(BACKEND_DIR, 'uploads', 'sample_logs.csv')
+WORKERS = 2
+
+
+def load_sample(path):
+    import app
+    return app.load_normalized_dataframe(path)
+
+
+class FallbackLog:
+    """Collects ERROR records of the app logger (a parallel scoring fallback logs one)."""
+
+    def __enter__(self):
+        self.errors = []
+        self.handler = logging.Handler(level=logging.ERROR)
+        self.handler.emit = self.errors.append
+        logging.disable(logging.NOTSET)
+        logging.getLogger('app').addHandler(self.handler)
+        return self.errors
+
+    def __exit__(self, *exc):
+        logging.getLogger('app').removeHandler(self.handler)
+        logging.disable(logging.WARNING)
+
+
+def test_table_pickles():
+    """Shard results are pickled back to the API process."""
+    import app
+    _, table = app.build_user_feature_rows(load_sample(PER_USER_SAMPLE))
+    table.reasons()  # fills the per-rule row cache
+    copy = pickle.loads(pickle.dumps(table))
+    assert copy.records() == table.records()
+    assert len(copy.reasons()) == len(table)
+
+
+def test_per_user_parallel_matches_serial():
+    import app
+    import parallel_scoring
+    df = load_sample(PER_USER_SAMPLE)
+    serial = app.build_user_feature_rows(df)
+    parallel = parallel_scoring.score_parallel(df, app.build_user_feature_rows, WORKERS, parallel_scoring.merge_by_row)
+    assert parallel[0] == serial[0]
+    assert parallel[1].records() == serial[1].records()
+
+
+def test_event_log_parallel_matches_serial():
+    import app
+    import parallel_scoring
+    df = load_sample(EVENT_LOG_SAMPLE)
+    serial = app.build_user_feature_rows(df)
+    parallel = parallel_scoring.score_parallel(df, app.build_user_feature_rows, WORKERS, parallel_scoring.merge_by_user)
+    assert parallel[0] == serial[0]
+    assert parallel[1].records() == serial[1].records()
+
+
+def test_score_upload_rows_uses_workers():
+    """score_upload_rows picks the merge for each schema and does not fall back."""
+    import app
+    saved = app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS
+    try:
+        app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS = WORKERS, 1
+        for path in (PER_USER_SAMPLE, EVENT_LOG_SAMPLE):
+            df = load_sample(path)
+            with FallbackLog() as errors:
+                features, table = app.score_upload_rows(df)
+            assert not errors, f'{os.path.basename(path)}: parallel scoring fell back'
+            serial = app.build_user_feature_rows(df)
+            assert features == serial[0]
+            assert table.records() == serial[1].records()
+    finally:
+        app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS = saved
+
+
+def test_shards_with_different_rules_merge():
+    """Shards that trigger different rule sets (a rule fired in one shard only) merge without a fallback."""
+    import app
+    import parallel_scoring
+    workers = 4
+    df = load_sample(EVENT_LOG_SAMPLE)
+    shards = parallel_scoring.score_parallel(df, app.build_user_feature_rows, workers, list)
+    fired = [frozenset(name for name in table.rule_names if table.rule_mask(name).any())
+             for (_, table), _ in shards]
+    assert len(set(fired)) > 1, 'every shard triggered the same rules; the case needs differing shards'
+
+    saved = app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS
+    try:
+        app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS = workers, 1
+        with FallbackLog() as errors:
+            features, table = app.score_upload_rows(df)
+    finally:
+        app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS = saved
+    assert not errors, 'parallel scoring fell back'
+    serial = app.build_user_feature_rows(df)
+    assert features == serial[0]
+    assert table.records() == serial[1].records()
+
+
+def test_incremental_changed_rows_parallel_matches_serial():
+    """Rows re-scored by incremental analysis go through the same shards."""
+    import tempfile
+    import app
+    import parallel_scoring
+    from fingerprint_index import FingerprintIndex
+    df = load_sample(PER_USER_SAMPLE)
+    _, serial = app.build_user_feature_rows(df)
+    saved = app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS, app.fingerprint_index, parallel_scoring.score_parallel
+    calls = []
+
+    def strict_score_parallel(*args, **kwargs):
+        calls.append(1)
+        return saved[3](*args, **kwargs)
+
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS = WORKERS, 1
+            app.fingerprint_index = FingerprintIndex(root)
+            parallel_scoring.score_parallel = strict_score_parallel
+            with FallbackLog() as errors:
+                _, cold = app.score_upload_incremental(df)  # every row changed: sharded
+                _, warm = app.score_upload_incremental(df)  # every row carried over
+        finally:
+            app.SCORING_WORKERS, app.PARALLEL_MIN_ROWS, app.fingerprint_index, parallel_scoring.score_parallel = saved
+    assert calls and not errors, 'sharded scoring did not run or fell back'
+    assert cold.records() == serial.records()
+    assert warm.records() == serial.records()
+
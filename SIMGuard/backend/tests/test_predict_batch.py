@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Check ThinkerModel.predict_batch against per-record predict().
+Records mix numbers, numeric strings ("0", "12.5"), None, non-numeric text and
+missing keys; each record must get the same prediction and confidence from
+both paths, with the pandas + XGBoost model and with the compiled trees.
+"""
+
+import os
+import sys
+import random
+import logging
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+from ml_core import PREDICT_INPUTS, ThinkerModel
+
+RECORDS = 300
+SEED = 7
+
+FIELDS = sorted({key for keys, _ in PREDICT_INPUTS.values() for key in keys})
+FLAG_FIELDS = {'sim_change_flag', 'device_change_flag', 'is_roaming'}
+
+
+def random_value(rng, field):
+    if field in FLAG_FIELDS:
+        return rng.choice([0, 1, '0', '1', True, False, None, 'yes'])
+    number = rng.choice([0, 1, 3, 7, 24, 50, 120, 300, 500])
+    return rng.choice([number, float(number) + 0.5, str(number), f' {number} ', None, 'n/a', ''])
+
+
+def random_records(rng):
+    return [
+        {field: random_value(rng, field) for field in FIELDS if rng.random() < 0.7}
+        for _ in range(RECORDS)
+    ]
+
+
+def check_paths_agree(model, records):
+    batch = model.predict_batch(records)
+    assert batch['status'] == 'success', batch
+    for i, record in enumerate(records):
+        single = model.predict(record)
+        assert single['status'] == 'success', (record, single)
+        assert single['prediction'] == batch['predictions'][i], record
+        assert single['confidence'] == batch['confidences'][i], record
+
+
+def test_string_flags_score_like_numbers():
+    """"0" is a cleared flag on both paths (bool("0") would set it)."""
+    model = ThinkerModel()
+    record = {'time_since_sim_change': 5, 'distance_change': 120, 'sim_change_flag': '0', 'device_change_flag': '0'}
+    cleared = dict(record, sim_change_flag=0, device_change_flag=0)
+    assert model.predict(record) == model.predict(cleared)
+    assert model.predict_batch([record])['confidences'] == model.predict_batch([cleared])['confidences']
+
+
+def test_predict_matches_predict_batch():
+    check_paths_agree(ThinkerModel(), random_records(random.Random(SEED)))
+
+
+def test_compiled_predict_matches_predict_batch():
+    model = ThinkerModel(fast_inference=True)
+    assert model._active_bundle().compiled is not None, 'compiled trees were not used'
+    check_paths_agree(model, random_records(random.Random(SEED + 1)))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Check report_cache.ReportCache artifacts and GET /report revalidation.
+Artifacts and ETags are keyed by the analysis ID: the same analysis is served
+from the cached file, a client sending its ETag gets 304 without a render,
+and re-analyzing the upload changes the ETag.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+from report_cache import ReportCache
+from result_table import SuspiciousTable
+
+PER_USER_SAMPLE = os.path.join(BACKEND_DIR, 'uploads', 'set_1.csv')
+RULES = ['rule_a']
+
+
+def make_results(analysis_id):
+    table = SuspiciousTable.from_columns(
+        ['2025-01-01 00:00:00'], ['u1'], ['SIM-u1'], ['HIGH'], [80], [[('rule_a', (1.5,))]], RULES)
+    return {'analysis_id': analysis_id, 'summary': {}, 'suspicious_activities': table}
+
+
+def test_artifacts_keyed_by_analysis_id():
+    cache = ReportCache(pdf_max_rows=100)
+    with tempfile.TemporaryDirectory() as directory:
+        first, second = make_results('first'), make_results('second')
+        path = cache.get(directory, first, 'csv')
+        assert 'first' in os.path.basename(path) and 'first' in cache.etag(first, 'csv')
+        assert cache.get(directory, dict(first), 'csv') == path
+        assert cache.etag(second, 'csv') != cache.etag(first, 'csv')
+
+        cache.get(directory, second, 'csv')
+        cache.invalidate(directory, keep=second)
+        assert os.listdir(directory) == [os.path.basename(cache.path(directory, second, 'csv'))]
+
+
+def test_report_route_revalidates_with_etag():
+    import app
+    from analysis_store import AnalysisStore
+    saved = app.analysis_store, app.REPORT_PREBUILD
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            app.analysis_store = AnalysisStore(root)
+            app.REPORT_PREBUILD = False
+            client = app.app.test_client()
+            with open(PER_USER_SAMPLE, 'rb') as f:
+                upload_id = client.post('/upload', data={'file': (f, 'set_1.csv')}).get_json()['upload_id']
+            assert client.post('/analyze', json={'upload_id': upload_id}).status_code == 200
+
+            url = f'/report?upload_id={upload_id}&format=csv'
+            response = client.get(url)
+            assert response.status_code == 200
+            etag = response.headers['ETag']
+            directory = app.analysis_store.entry_dir(upload_id)
+            app.report_cache.invalidate(directory)  # a 304 must not render it again
+
+            response = client.get(url, headers={'If-None-Match': etag})
+            assert response.status_code == 304 and response.headers['ETag'] == etag
+            assert not [name for name in os.listdir(directory) if name.startswith('report-')]
+
+            assert client.post('/analyze', json={'upload_id': upload_id}).status_code == 200
+            response = client.get(url, headers={'If-None-Match': etag})
+            assert response.status_code == 200 and response.headers['ETag'] != etag
+        finally:
+            app.analysis_store, app.REPORT_PREBUILD = saved
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Check the columnar suspicious-row store (result_table) against the rows it packs.
+Tables are merged (concat), sliced (take) and written to disk (save/load), and
+must give back the same records and reasons every time. The cases cover parts
+where a rule fired on no rows, rules whose reasons have no args, and
+sudden_location_change with its two reason arities.
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+
+from result_table import RuleArgs, SuspiciousTable
+
+RULES = ['recent_sim_change', 'sudden_location_change', 'roaming_after_sim_change', 'security_events']
+
+
+def row(i, reasons, level='HIGH', score=80):
+    return {
+        'timestamp': f'2025-01-01 00:00:{i:02d}',
+        'user_id': f'U{i}',
+        'sim_id': f'SIM{i}',
+        'risk_level': level,
+        'risk_score': score,
+        'reasons': reasons,
+    }
+
+
+# Each part leaves some rules unfired, fires the no-arg rules, or mixes location reason arities
+PARTS = [
+    [
+        row(0, [('recent_sim_change', (1.5,))]),
+        row(1, [('recent_sim_change', (2.0,)), ('roaming_after_sim_change', ())], 'MEDIUM', 50),
+    ],
+    [
+        row(2, [('sudden_location_change', (512.0,))]),
+        row(3, [('sudden_location_change', ('Colombo', 'Jaffna', 300.0)), ('security_events', ())]),
+    ],
+    [
+        row(4, [('roaming_after_sim_change', ()), ('security_events', ())], 'MEDIUM', 40),
+    ],
+    [
+        row(5, [('sudden_location_change', ('Kandy', 'Galle', 120.0))]),
+        row(6, [('recent_sim_change', (0.5,)), ('sudden_location_change', (90.0,))]),
+    ],
+]
+
+
+def table_of(rows):
+    """SuspiciousTable packing `rows` directly."""
+    return SuspiciousTable.from_columns(
+        [r['timestamp'] for r in rows], [r['user_id'] for r in rows], [r['sim_id'] for r in rows],
+        [r['risk_level'] for r in rows], [r['risk_score'] for r in rows], [r['reasons'] for r in rows], RULES)
+
+
+def expected_reasons(rows):
+    return [[(rule, tuple(args)) for rule, args in r['reasons']] for r in rows]
+
+
+def check_table(table, rows):
+    assert len(table) == len(rows)
+    assert table.reasons() == expected_reasons(rows)
+    assert table.records() == table_of(rows).records()
+    assert [r['user_id'] for r in table.records()] == [r['user_id'] for r in rows]
+
+
+def test_rule_args_concat_with_empty_part():
+    merged = RuleArgs.concat([RuleArgs.pack([]), RuleArgs.pack([(1.5,), ('x', 'y', 3.0)])])
+    assert merged.n_rows == 2
+    assert merged.args(slice(None)) == [(1.5,), ('x', 'y', 3.0)]
+    assert RuleArgs.concat([RuleArgs.pack([]), RuleArgs.pack([])]).args(slice(None)) == []
+
+
+def test_rule_args_without_args():
+    merged = RuleArgs.concat([RuleArgs.pack([()]), RuleArgs.pack([]), RuleArgs.pack([(), ()])])
+    assert merged.n_rows == 3
+    assert merged.args(slice(None)) == [(), (), ()]
+    assert merged.take(np.array([0, 2])).args(slice(None)) == [(), ()]
+
+
+def test_concat_matches_packing_all_rows():
+    tables = [table_of(part) for part in PARTS]
+    rows = [r for part in PARTS for r in part]
+    check_table(SuspiciousTable.concat(tables, RULES), rows)
+    # Pairwise merges hit every mix of fired / unfired rules and location arities
+    for i in range(len(PARTS)):
+        for j in range(len(PARTS)):
+            check_table(SuspiciousTable.concat([tables[i], tables[j]], RULES), PARTS[i] + PARTS[j])
+
+
+def test_concat_of_empty_tables():
+    empty = table_of([])
+    table = table_of(PARTS[1])
+    check_table(SuspiciousTable.concat([empty, table, empty], RULES), PARTS[1])
+    assert len(SuspiciousTable.concat([empty, empty], RULES)) == 0
+
+
+def test_take():
+    rows = [r for part in PARTS for r in part]
+    table = SuspiciousTable.concat([table_of(part) for part in PARTS], RULES)
+    for positions in ([], [3], [6, 0, 3], list(range(len(rows)))[::-1], [2, 2, 5]):
+        check_table(table.take(np.array(positions, dtype=np.int64)), [rows[p] for p in positions])
+    # A taken table merges like a packed one
+    merged = SuspiciousTable.concat([table.take(np.array([4])), table.take(np.array([3, 5]))], RULES)
+    check_table(merged, [rows[4], rows[3], rows[5]])
+
+
+def test_save_load_round_trip():
+    rows = [r for part in PARTS for r in part]
+    tables = {
+        'packed': (table_of(rows), rows),
+        'merged': (SuspiciousTable.concat([table_of(part) for part in PARTS], RULES), rows),
+        'taken': (table_of(rows).take(np.array([4, 1])), [rows[4], rows[1]]),
+        'empty': (table_of([]), []),
+    }
+    with tempfile.TemporaryDirectory() as root:
+        for name, (table, expected) in tables.items():
+            path = os.path.join(root, f'{name}.npz')
+            table.save(path)
+            loaded = SuspiciousTable.load(path)
+            check_table(loaded, expected)
+            # Loaded tables keep merging and slicing like the ones they were saved from
+            check_table(SuspiciousTable.concat([loaded, table], RULES), expected + expected)
+            check_table(loaded.take(np.arange(len(expected))[::-1]), expected[::-1])
+
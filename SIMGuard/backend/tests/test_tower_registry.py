@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Check tower_registry.TowerRegistry learning and the tower check in analyses.
+An upload confirms each tower once, whether it is read whole or in chunks and
+however often it is analyzed; towers are trusted after enough agreeing
+uploads. Streamed and in-memory analyses checked against the same tower
+snapshot give the same results.
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+import pandas as pd
+
+from tower_registry import TowerRegistry, TowerReports, tower_positions
+
+PER_USER_SAMPLE = os.path.join(BACKEND_DIR, 'uploads', 'set_1.csv')
+
+
+def reports(rows):
+    """Upload frame with one cell tower report per (id, lat, lon) row."""
+    return pd.DataFrame(rows, columns=['cell_tower_id', 'cell_tower_lat', 'cell_tower_lon'])
+
+
+def sorted_positions(positions):
+    return positions.sort_values(['id', 'lat', 'lon']).reset_index(drop=True)
+
+
+def test_chunked_reports_equal_whole_file():
+    import app
+    whole = tower_positions(app.load_normalized_dataframe(PER_USER_SAMPLE))
+    for chunk_rows in (7, 50):
+        gathered = TowerReports()
+        for chunk in pd.read_csv(PER_USER_SAMPLE, chunksize=chunk_rows):
+            gathered.add(app.normalize_uploaded_dataframe(chunk))
+        pd.testing.assert_frame_equal(sorted_positions(gathered.positions), sorted_positions(whole))
+
+
+def test_upload_counted_once():
+    with tempfile.TemporaryDirectory() as root:
+        registry = TowerRegistry(root, min_observations=2)
+        upload = reports([('T1', 7.0, 80.0)] * 5)  # many rows, one upload
+        assert registry.observe(tower_positions(upload), 'upload-a') == 1
+        assert registry.observe(tower_positions(upload), 'upload-a') == 0
+        assert len(registry.index()) == 0
+        assert registry.observe(tower_positions(upload), 'upload-b') == 1
+        assert list(registry.index().ids) == ['T1']
+        assert registry.summary() == {'towers': 1, 'trusted_towers': 1, 'uploads_observed': 2}
+
+
+def test_trusted_only_when_uploads_agree():
+    with tempfile.TemporaryDirectory() as root:
+        registry = TowerRegistry(root, min_observations=3, max_spread_km=2.0)
+        for i, source in enumerate('abc'):
+            registry.observe(tower_positions(reports([
+                ('STEADY', 7.0 + i * 0.001, 80.0),  # within a few hundred metres
+                ('MOVING', 7.0 + i, 80.0),          # a degree (~111 km) apart each time
+            ])), source)
+        index = registry.index()
+        assert list(index.ids) == ['STEADY']
+
+
+def test_disagreeing_positions_within_one_upload_spread():
+    with tempfile.TemporaryDirectory() as root:
+        registry = TowerRegistry(root, min_observations=3, max_spread_km=2.0)
+        for source in 'abc':
+            registry.observe(tower_positions(reports([('T1', 7.0, 80.0), ('T1', 9.0, 80.0)])), source)
+        assert len(registry.index()) == 0
+
+
+def trusted_sample_towers(root):
+    """Registry trusting every serving tower of the sample at one of its reported user locations."""
+    import app
+    df = app.load_normalized_dataframe(PER_USER_SAMPLE)
+    first = df.drop_duplicates('cell_tower_id')
+    positions = tower_positions(pd.DataFrame({
+        'cell_tower_id': first['cell_tower_id'],
+        'cell_tower_lat': first['current_location_lat'],
+        'cell_tower_lon': first['current_location_lon'],
+    }))
+    registry = TowerRegistry(root)
+    for source in range(registry.min_observations):
+        registry.observe(positions, f'source-{source}')
+    return registry
+
+
+def test_streamed_matches_in_memory_with_towers():
+    import app
+    with tempfile.TemporaryDirectory() as root:
+        towers = trusted_sample_towers(root).index()
+        df = app.load_normalized_dataframe(PER_USER_SAMPLE)
+        _, expected = app.build_user_feature_rows(df, towers)
+        assert expected.rule_mask('tower_location_mismatch').any(), 'no row exercised the tower rule'
+        for chunk_rows in (7, 50):
+            gathered = TowerReports()
+            _, streamed = app.stream_analyze_csv(PER_USER_SAMPLE, chunk_rows=chunk_rows, towers=towers,
+                                                 tower_reports=gathered)
+            assert streamed['suspicious_activities'].records() == expected.records(), chunk_rows
+            assert len(gathered.positions) == len(tower_positions(df))
+
+
+def test_analysis_learns_after_scoring_once_per_upload():
+    import app
+    from analysis_store import AnalysisStore
+    saved = app.tower_registry, app.analysis_store, app.REPORT_PREBUILD
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            app.tower_registry = TowerRegistry(os.path.join(root, 'towers'))
+            app.analysis_store = AnalysisStore(os.path.join(root, 'store'))
+            app.REPORT_PREBUILD = False
+            client = app.app.test_client()
+            with open(PER_USER_SAMPLE, 'rb') as f:
+                upload_id = client.post('/upload', data={'file': (f, 'set_1.csv')}).get_json()['upload_id']
+            summaries = []
+            for _ in range(2):
+                response = client.post('/analyze', json={'upload_id': upload_id})
+                assert response.status_code == 200
+                summaries.append(response.get_json()['summary'])
+                assert app.tower_registry.summary()['uploads_observed'] == 1
+            assert summaries[0] == summaries[1]
+        finally:
+            app.tower_registry, app.analysis_store, app.REPORT_PREBUILD = saved
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Check tree_compiler.CompiledTrees against XGBoost.
+The shipped model and a freshly trained one are compiled and scored on rows
+around every split threshold, on random rows and on rows with missing values;
+probabilities must match scaler + predict_proba within FAST_PATH_TOLERANCE.
+"""
+
+import os
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+logging.disable(logging.WARNING)
+
+from ml_core import ThinkerModel
+from tree_compiler import FAST_PATH_TOLERANCE, boundary_probe, compile_model, probe_error
+
+RANDOM_ROWS = 2000
+SEED = 11
+
+
+def xgboost_proba(model, scaler, features, X):
+    frame = pd.DataFrame(X, columns=features)
+    if scaler is not None:
+        frame = scaler.transform(frame)
+    return model.predict_proba(frame)[:, 1]
+
+
+def check_matches(model, scaler, features, X):
+    compiled = compile_model(model, scaler, features)
+    diff = np.abs(compiled.predict_proba(X) - xgboost_proba(model, scaler, features, X))
+    assert diff.max() <= FAST_PATH_TOLERANCE, f'max difference {diff.max():.2e}'
+    return compiled
+
+
+def shipped():
+    thinker = ThinkerModel()
+    assert thinker.model is not None, 'shipped model did not load'
+    return thinker.model, thinker.scaler, thinker.features
+
+
+def test_shipped_model_boundary_rows():
+    model, scaler, features = shipped()
+    compiled = compile_model(model, scaler, features)
+    assert probe_error(compiled, model, scaler, features) <= FAST_PATH_TOLERANCE
+    check_matches(model, scaler, features, boundary_probe(compiled, len(features), random_rows=0))
+
+
+def test_shipped_model_random_and_missing_rows():
+    model, scaler, features = shipped()
+    rng = np.random.default_rng(SEED)
+    X = np.column_stack([
+        rng.uniform(0, 720, RANDOM_ROWS),    # time_since_last_sim_change (hours)
+        rng.integers(0, 200, RANDOM_ROWS),   # num_calls_last_24h
+        rng.uniform(0, 5000, RANDOM_ROWS),   # data_usage_last_24h
+        rng.uniform(-100, 500, RANDOM_ROWS),  # change_in_data_usage
+        rng.uniform(0, 2000, RANDOM_ROWS),   # distance_change_km
+    ])
+    X[rng.random(X.shape) < 0.1] = np.nan
+    check_matches(model, scaler, features, X)
+
+
+def test_single_row_matches_batch():
+    model, scaler, features = shipped()
+    compiled = compile_model(model, scaler, features)
+    X = boundary_probe(compiled, len(features), random_rows=20)[-20:]
+    assert np.array_equal(np.concatenate([compiled.predict_proba(row) for row in X]), compiled.predict_proba(X))
+
+
+def test_trained_model_with_bare_scaler():
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBClassifier
+    features = ['a', 'b', 'c']
+    rng = np.random.default_rng(SEED)
+    X = rng.normal([5, 100, -3], [2, 40, 1], size=(500, 3))
+    y = (X[:, 0] * 10 + X[:, 1] / 4 + rng.normal(0, 5, 500) > 75).astype(int)
+    scaler = StandardScaler().fit(pd.DataFrame(X, columns=features))
+    model = XGBClassifier(n_estimators=30, max_depth=4, eval_metric='logloss')
+    model.fit(scaler.transform(pd.DataFrame(X, columns=features)), y)
+    compiled = check_matches(model, scaler, features, X)
+    check_matches(model, scaler, features, boundary_probe(compiled, len(features)))
+
+
+def test_unsupported_objective_rejected():
+    from xgboost import XGBRegressor
+    features = ['a', 'b']
+    X = np.random.default_rng(SEED).normal(size=(50, 2))
+    model = XGBRegressor(n_estimators=3).fit(X, X[:, 0])
+    with pytest.raises(ValueError):
+        compile_model(model, None, features)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Check simswap_detector.windows.WindowCounter against a brute-force count.
+Events arrive in order, with late (out-of-order) events, and with gaps longer
+than the window; the counter must trim expired buckets and give the same
+count as bucket_counts + window_totals for the same events.
+"""
+
+import os
+import sys
+import random
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import pandas as pd
+
+from simswap_detector.windows import DAY_WINDOW, WindowCounter, WindowSpec, bucket_counts, window_totals
+
+START = datetime(2025, 1, 10, 8, 0, 0)
+HOUR = WindowSpec(window_seconds=3600, bucket_seconds=60)
+SEED = 3
+
+
+def brute_force(times, now, spec):
+    """Events whose bucket lies in the n_buckets ending at now's bucket."""
+    end = spec.bucket_of(now)
+    return sum(1 for t in times if end - spec.n_buckets < spec.bucket_of(t) <= end)
+
+
+def test_counts_within_window():
+    counter = WindowCounter(HOUR)
+    for minute in range(30):
+        counter.add(START + timedelta(minutes=minute))
+    assert counter.count() == 30
+    assert counter.count(START + timedelta(minutes=29)) == 30
+
+
+def test_expired_buckets_trimmed():
+    counter = WindowCounter(HOUR)
+    for minute in range(90):
+        counter.add(START + timedelta(minutes=minute))
+    # The window ending at minute 89 holds minutes 30..89
+    assert counter.count() == 60
+    assert len(counter._buckets) == HOUR.n_buckets
+    assert counter._buckets[0][0] == HOUR.bucket_of(START + timedelta(minutes=30))
+
+
+def test_count_at_later_time_trims():
+    counter = WindowCounter(HOUR)
+    counter.add(START)
+    counter.add(START + timedelta(minutes=50), n=3)
+    assert counter.count(START + timedelta(minutes=59)) == 4
+    assert counter.count(START + timedelta(minutes=60)) == 3
+    assert counter.count(START + timedelta(hours=5)) == 0
+    assert not counter._buckets
+
+
+def test_gap_longer_than_window_resets():
+    counter = WindowCounter(HOUR)
+    for minute in range(10):
+        counter.add(START + timedelta(minutes=minute))
+    counter.add(START + timedelta(hours=3))
+    assert counter.count() == 1
+    assert len(counter._buckets) == 1
+
+
+def test_late_events():
+    counter = WindowCounter(HOUR)
+    counter.add(START + timedelta(minutes=40))
+    counter.add(START + timedelta(minutes=10))   # late, inside the window: counted
+    counter.add(START + timedelta(minutes=40))   # same bucket as the newest
+    counter.add(START + timedelta(minutes=25))   # late, between existing buckets
+    counter.add(START - timedelta(hours=2))      # late, outside the window: dropped
+    assert counter.count() == 4
+    buckets = [bucket for bucket, _ in counter._buckets]
+    assert buckets == sorted(buckets)
+
+
+def test_random_events_match_brute_force_and_batch():
+    rng = random.Random(SEED)
+    times, counter = [], WindowCounter(DAY_WINDOW)
+    now = START
+    for _ in range(1000):
+        # Mostly forward in time, sometimes a long gap, sometimes a late event
+        step = rng.choice([timedelta(seconds=rng.randint(0, 900))] * 8 + [timedelta(hours=rng.randint(20, 30))])
+        now += step
+        ts = now - timedelta(minutes=rng.randint(0, 120)) if rng.random() < 0.1 else now
+        counter.add(ts)
+        times.append(ts)
+        assert counter.count(now) == brute_force(times, now, DAY_WINDOW)
+
+    counts = bucket_counts(pd.Series(['u'] * len(times)), pd.Series(times))
+    totals = window_totals(counts, pd.Series({'u': now}))
+    assert counter.count(now) == int(totals.get('u', 0))
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Tower Registry
+Learns cell tower positions from the tower columns of uploads
+(cell_tower_id/lat/lon, prev_cell_tower_id/lat/lon) and answers bulk spatial
+queries against them: nearest known tower to each point, and how far each
+row's serving tower is from the location the user reported.
+
+An upload is one source of evidence, identified by its content hash and
+counted once however often it is analyzed or however it was read (whole or
+in chunks). For each tower an upload reports, the registry keeps one
+confirmation: the mean of the distinct positions the upload gave it, as a
+unit vector. Each tower stores only its confirmation count and the sum of
+those vectors; their mean is the tower position and its length shows whether
+the uploads agree. Towers confirmed by at least TOWER_MIN_OBSERVATIONS
+uploads within TOWER_MAX_SPREAD_KM are trusted and indexed in a KD-tree over
+3D unit vectors, so queries cost O(log n) per point instead of a scan over
+every tower. Registry and index are cached on disk.
+
+Learning is a separate step from scoring: an analysis scores against the
+TowerIndex taken before it starts and reports its towers once it is done.
+
+Layout:
+    <root>/towers.npz          (tower IDs, confirmation counts, vector sums, observed upload hashes)
+    <root>/index.pkl           (KD-tree of trusted towers, tagged with the npz it was built from)
+"""
+
+import os
+import pickle
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from simswap_detector.config import TOWER_MIN_OBSERVATIONS, TOWER_MAX_SPREAD_KM
+from simswap_detector.geo import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+    logger.warning("scipy not found. Tower lookups scan every tower instead of using a KD-tree.")
+
+try:
+    import fcntl
+except ImportError:  # Windows: registry updates are only serialized within one process
+    fcntl = None
+
+TOWERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', '.towers')
+REGISTRY_FILENAME = 'towers.npz'
+INDEX_FILENAME = 'index.pkl'
+LOCK_FILENAME = 'towers.lock'
+# (tower id, lat, lon) column triples in upload rows
+TOWER_COLUMNS = (
+    ('cell_tower_id', 'cell_tower_lat', 'cell_tower_lon'),
+    ('prev_cell_tower_id', 'prev_cell_tower_lat', 'prev_cell_tower_lon'),
+)
+REPORTED_LOCATION_COLUMNS = ('current_location_lat', 'current_location_lon')
+TOWER_FEATURE_COLUMNS = ['serving_tower_id', 'serving_tower_distance_km', 'nearest_tower_id', 'nearest_tower_km']
+BRUTE_FORCE_CHUNK = 4096
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """(n, 3) points on the unit sphere; rows with missing coordinates are NaN."""
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    """Great-circle distance for a straight-line distance between unit vectors."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def tower_positions(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Distinct (id, lat, lon) tower reports in the tower columns of df, or None when it has none."""
+    triples = [cols for cols in TOWER_COLUMNS if set(cols).issubset(df.columns)]
+    if not triples:
+        return None
+    frames = [
+        pd.DataFrame({
+            'id': df[id_col].to_numpy(),
+            'lat': pd.to_numeric(df[lat_col], errors='coerce').to_numpy(),
+            'lon': pd.to_numeric(df[lon_col], errors='coerce').to_numpy(),
+        })
+        for id_col, lat_col, lon_col in triples
+    ]
+    seen = pd.concat(frames, ignore_index=True).dropna()
+    seen['id'] = seen['id'].astype(str)
+    return seen.drop_duplicates(ignore_index=True)
+
+
+class TowerReports:
+    """Distinct tower positions of one upload, gathered from its chunks (see TowerRegistry.observe)."""
+
+    def __init__(self):
+        self.positions: Optional[pd.DataFrame] = None
+
+    def add(self, df: pd.DataFrame) -> None:
+        positions = tower_positions(df)
+        if positions is None:
+            return
+        if self.positions is not None:
+            positions = pd.concat([self.positions, positions], ignore_index=True).drop_duplicates(ignore_index=True)
+        self.positions = positions
+
+
+class TowerIndex:
+    """Trusted tower positions plus a nearest-neighbour index over them (immutable once built)."""
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray):
+        self.ids = ids
+        self.vectors = vectors
+        self.positions = pd.Index(ids)
+        self.tree = cKDTree(vectors) if cKDTree is not None and len(ids) else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest trusted tower (ID, km) for each unit-vector point; None / NaN when unknown."""
+        n = len(points)
+        ids = np.full(n, None, dtype=object)
+        km = np.full(n, np.nan)
+        valid = ~np.isnan(points).any(axis=1)
+        if not len(self) or not valid.any():
+            return ids, km
+        if self.tree is not None:
+            chord, nearest = self.tree.query(points[valid])
+        else:
+            chord, nearest = self._scan(points[valid])
+        ids[valid] = self.ids[nearest]
+        km[valid] = chord_to_km(chord)
+        return ids, km
+
+    def _scan(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        chord = np.empty(len(points))
+        nearest = np.empty(len(points), dtype=np.int64)
+        for start in range(0, len(points), BRUTE_FORCE_CHUNK):
+            block = points[start:start + BRUTE_FORCE_CHUNK]
+            dist = np.linalg.norm(block[:, None, :] - self.vectors[None, :, :], axis=2)
+            nearest[start:start + len(block)] = dist.argmin(axis=1)
+            chord[start:start + len(block)] = dist.min(axis=1)
+        return chord, nearest
+
+    def features(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Per-row tower features (same index as df), or None when df has no serving
+        tower and reported location columns:
+        serving_tower_id           cell_tower_id as a string
+        serving_tower_distance_km  reported location -> registered position of cell_tower_id
+        nearest_tower_id / _km     closest trusted tower to the reported location
+        """
+        id_col = TOWER_COLUMNS[0][0]
+        if id_col not in df.columns or not set(REPORTED_LOCATION_COLUMNS).issubset(df.columns):
+            return None
+        points = unit_vectors(*(pd.to_numeric(df[c], errors='coerce') for c in REPORTED_LOCATION_COLUMNS))
+        nearest_ids, nearest_km = self.nearest(points)
+        serving = df[id_col].astype(str)
+        return pd.DataFrame({
+            'serving_tower_id': serving,
+            'serving_tower_distance_km': self.distance_from(serving, points),
+            'nearest_tower_id': nearest_ids,
+            'nearest_tower_km': nearest_km,
+        }, index=df.index)
+
+    def distance_from(self, tower_ids, points: np.ndarray) -> np.ndarray:
+        """km from each point to the registered position of the matching tower (NaN if not trusted)."""
+        found = self.positions.get_indexer(pd.Index(np.asarray(tower_ids, dtype=object)))
+        km = np.full(len(found), np.nan)
+        known = found >= 0
+        km[known] = chord_to_km(np.linalg.norm(self.vectors[found[known]] - points[known], axis=1))
+        return km
+
+
+class TowerRegistry:
+    """Disk-backed tower registry shared by all API and job processes."""
+
+    def __init__(self, root: str = TOWERS_DIR,
+                 min_observations: int = TOWER_MIN_OBSERVATIONS, max_spread_km: float = TOWER_MAX_SPREAD_KM):
+        self.root = root
+        self.min_observations = min_observations
+        self.max_spread_km = max_spread_km
+        self._index: Optional[TowerIndex] = None
+        self._index_stamp: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def registry_path(self) -> str:
+        return os.path.join(self.root, REGISTRY_FILENAME)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILENAME)
+
+    def _stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.registry_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read(self) -> Dict[str, np.ndarray]:
+        try:
+            with np.load(self.registry_path, allow_pickle=False) as data:
+                return {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return {
+                'ids': np.array([], dtype=str),
+                'counts': np.array([], dtype=np.int64),
+                'sums': np.zeros((0, 3)),
+                'sources': np.array([], dtype=str),
+            }
+
+    # --- learning ----------------------------------------------------------
+
+    def observe(self, positions: Optional[pd.DataFrame], source: str) -> int:
+        """
+        Add the tower positions one upload reported (tower_positions / TowerReports.positions).
+        source identifies the upload's content; an upload already observed adds nothing.
+        Returns the number of towers the upload confirmed.
+        """
+        if positions is None or not len(positions):
+            return 0
+        vectors = unit_vectors(positions['lat'], positions['lon'])
+        # One confirmation per tower: the mean of the distinct positions this upload gave it
+        confirmed = pd.DataFrame(vectors, columns=['x', 'y', 'z']).assign(id=positions['id'].to_numpy())
+        confirmed = confirmed.groupby('id', sort=False).mean()
+
+        with self._lock, self._file_lock():
+            registry = self._read()
+            if source in registry['sources']:
+                return 0
+            ids = pd.Index(registry['ids']).union(confirmed.index)
+            counts = pd.Series(registry['counts'], index=registry['ids']).reindex(ids, fill_value=0)
+            sums = pd.DataFrame(registry['sums'], index=registry['ids'], columns=['x', 'y', 'z']).reindex(ids, fill_value=0.0)
+            counts = counts.add(pd.Series(1, index=confirmed.index), fill_value=0).astype(np.int64)
+            sums = sums.add(confirmed, fill_value=0.0)
+
+            tmp_path = f"{self.registry_path}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path, ids=np.asarray(ids, dtype=str), counts=counts.to_numpy(),
+                sums=sums.to_numpy(), sources=np.append(registry['sources'], source).astype(str),
+            )
+            os.replace(tmp_path, self.registry_path)
+        logger.info(f"Tower registry: {len(confirmed)} tower(s) confirmed by upload {source[:12]}, {len(ids)} known")
+        return len(confirmed)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize read-merge-write of the registry across API and job processes."""
+        with open(os.path.join(self.root, LOCK_FILENAME), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # closing the file releases the lock
+
+    # --- index -------------------------------------------------------------
+
+    def index(self) -> TowerIndex:
+        """Index of trusted towers, rebuilt only when the registry file changed."""
+        stamp = self._stamp()
+        with self._lock:
+            if self._index is not None and self._index_stamp == stamp:
+                return self._index
+            index = self._load_index(stamp)
+            if index is None:
+                index = self._build_index()
+                self._save_index(index, stamp)
+            self._index, self._index_stamp = index, stamp
+            return index
+
+    def _build_index(self) -> TowerIndex:
+        registry = self._read()
+        counts, sums = registry['counts'], registry['sums']
+        norms = np.linalg.norm(sums, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            agreement = np.where(counts > 0, norms / counts, 0.0)
+        # Mean resultant length -> RMS angular spread of the observed positions
+        spread_km = EARTH_RADIUS_KM * np.sqrt(np.clip(2 * (1 - agreement), 0.0, None))
+        trusted = (counts >= self.min_observations) & (spread_km <= self.max_spread_km)
+        vectors = sums[trusted] / norms[trusted, None] if trusted.any() else np.zeros((0, 3))
+        return TowerIndex(registry['ids'][trusted].astype(object), vectors)
+
+    def _load_index(self, stamp: Optional[int]) -> Optional[TowerIndex]:
+        try:
+            with open(self.index_path, 'rb') as f:
+                cached_stamp, cached_settings, index = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+            return None
+        if cached_stamp != stamp or cached_settings != (self.min_observations, self.max_spread_km):
+            return None
+        return index
+
+    def _save_index(self, index: TowerIndex, stamp: Optional[int]) -> None:
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((stamp, (self.min_observations, self.max_spread_km), index), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not cache tower index: {e}")
+
+    def summary(self) -> Dict[str, int]:
+        registry = self._read()
+        return {'towers': int(len(registry['ids'])), 'trusted_towers': len(self.index()),
+                'uploads_observed': int(len(registry['sources']))}
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+SIMGuard Tree Compiler
+Exports a trained XGBoost binary classifier into flat NumPy node arrays
+(feature, threshold, left, right, missing, leaf value) and evaluates rows by
+array traversal. A fitted StandardScaler is folded into the split thresholds,
+so raw feature values are compared directly and neither pandas nor the
+scaler/booster call overhead sits on the per-request path.
+"""
+
+import json
+import logging
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_OBJECTIVES = ('binary:logistic',)
+# Largest probability difference allowed between the compiled trees and XGBoost
+FAST_PATH_TOLERANCE = 1e-6
+
+
+class CompiledTrees:
+    """Flat-array form of a boosted tree ensemble with raw-feature thresholds."""
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 missing: np.ndarray, value: np.ndarray, roots: np.ndarray, max_depth: int, base_margin: float):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing = missing
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_margin = base_margin
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def margin(self, X: np.ndarray) -> np.ndarray:
+        """Raw (pre-sigmoid) score for each row of X (n_rows x n_features, unscaled)."""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[None, :]
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        # Leaves point at themselves, so every path can take max_depth steps
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            node = np.where(
+                np.isnan(x), self.missing[node],
+                np.where(x < self.threshold[node], self.left[node], self.right[node])
+            )
+        return self.value[node].sum(axis=1) + self.base_margin
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Positive-class probability for each row (same as predict_proba(X)[:, 1])."""
+        return 1.0 / (1.0 + np.exp(-self.margin(X)))
+
+
+def _scaler_params(scaler: Any, feature_names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean and scale of a StandardScaler, either bare or as the only transformer
+    of a ColumnTransformer over exactly feature_names (in order).
+    """
+    n = len(feature_names)
+    if scaler is None:
+        return np.zeros(n), np.ones(n)
+
+    if hasattr(scaler, 'transformers_'):
+        active = [
+            (est, list(cols)) for _, est, cols in scaler.transformers_
+            if not (est == 'drop' and len(cols) == 0)
+        ]
+        if len(active) != 1 or active[0][1] != list(feature_names):
+            raise ValueError("Only a single StandardScaler over all model features can be folded")
+        scaler = active[0][0]
+
+    if not hasattr(scaler, 'scale_') or not hasattr(scaler, 'mean_'):
+        raise ValueError(f"Cannot fold {type(scaler).__name__} into tree thresholds")
+
+    mean = np.asarray(scaler.mean_, dtype=float) if scaler.with_mean else np.zeros(n)
+    scale = np.asarray(scaler.scale_, dtype=float) if scaler.with_std else np.ones(n)
+    if len(mean) != n:
+        raise ValueError(f"Scaler has {len(mean)} features, model expects {n}")
+    return mean, scale
+
+
+def _raw_threshold(split_condition: float, mean: float, scale: float) -> float:
+    """
+    Smallest raw value x for which XGBoost's test float32((x - mean) / scale) < split
+    is false, so that x < result reproduces the original split exactly, including
+    values that land on the float32 rounding boundary.
+    """
+    split = np.float32(split_condition)
+
+    def goes_left(x: float) -> bool:
+        return np.float32((x - mean) / scale) < split
+
+    guess = float(split) * scale + mean
+    delta = abs(guess) * 1e-6 + 1e-9
+    lo, hi = guess - delta, guess + delta
+    while not goes_left(lo):
+        delta *= 2
+        lo = guess - delta
+    while goes_left(hi):
+        delta *= 2
+        hi = guess + delta
+    while True:
+        mid = (lo + hi) / 2
+        if mid <= lo or mid >= hi:
+            return hi
+        if goes_left(mid):
+            lo = mid
+        else:
+            hi = mid
+
+
+def _base_margin(booster: Any) -> float:
+    learner = json.loads(booster.save_config())['learner']
+    objective = learner['objective']['name']
+    if objective not in SUPPORTED_OBJECTIVES:
+        raise ValueError(f"Unsupported objective for tree compilation: {objective}")
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]').split(',')[0])
+    return float(np.log(base_score / (1.0 - base_score)))
+
+
+def compile_model(model: Any, scaler: Any, feature_names: Sequence[str]) -> CompiledTrees:
+    """
+    Compile an XGBClassifier (and the scaler its inputs went through) into
+    CompiledTrees. Raises ValueError for models or scalers it cannot represent.
+    """
+    booster = model.get_booster()
+    mean, scale = _scaler_params(scaler, feature_names)
+    names: Optional[List[str]] = booster.feature_names
+    index = {name: i for i, name in enumerate(names)} if names else {}
+
+    dumps = booster.get_dump(dump_format='json')
+    best_iteration = getattr(model, 'best_iteration', None)
+    if best_iteration is not None:
+        dumps = dumps[:best_iteration + 1]
+
+    feature, threshold, left, right, missing, value, roots = [], [], [], [], [], [], []
+    max_depth, offset = 0, 0
+    for dump in dumps:
+        tree = json.loads(dump)
+        nodes = {}
+        stack = [(tree, 0)]
+        while stack:
+            node, depth = stack.pop()
+            nodes[node['nodeid']] = node
+            max_depth = max(max_depth, depth)
+            stack.extend((child, depth + 1) for child in node.get('children', []))
+
+        size = max(nodes) + 1
+        t_feature, t_threshold = np.zeros(size, dtype=np.int64), np.zeros(size)
+        t_value = np.zeros(size)
+        t_left = np.arange(size) + offset
+        t_right, t_missing = t_left.copy(), t_left.copy()
+        for nodeid, node in nodes.items():
+            if 'leaf' in node:
+                t_value[nodeid] = node['leaf']
+                continue
+            split = node['split']
+            f = index[split] if split in index else int(split.lstrip('f'))
+            # XGBoost stores float32 thresholds on the scaled feature; undo the scaling here
+            t_feature[nodeid] = f
+            t_threshold[nodeid] = _raw_threshold(node['split_condition'], mean[f], scale[f])
+            t_left[nodeid] = node['yes'] + offset
+            t_right[nodeid] = node['no'] + offset
+            t_missing[nodeid] = node['missing'] + offset
+
+        feature.append(t_feature)
+        threshold.append(t_threshold)
+        left.append(t_left)
+        right.append(t_right)
+        missing.append(t_missing)
+        value.append(t_value)
+        roots.append(offset)
+        offset += size
+
+    return CompiledTrees(
+        feature=np.concatenate(feature), threshold=np.concatenate(threshold),
+        left=np.concatenate(left), right=np.concatenate(right), missing=np.concatenate(missing),
+        value=np.concatenate(value), roots=np.array(roots, dtype=np.int64),
+        max_depth=max_depth, base_margin=_base_margin(booster),
+    )
+
+
+def boundary_probe(compiled: CompiledTrees, n_features: int, random_rows: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Rows that sit on, just below and just above every split threshold, plus
+    random rows spanning the threshold range, for checking a compiled model
+    against the original.
+    """
+    is_split = compiled.left != np.arange(len(compiled.left))
+    features, thresholds = compiled.feature[is_split], compiled.threshold[is_split]
+    base = np.zeros(n_features)
+    low, high = np.full(n_features, -1.0), np.full(n_features, 1.0)
+    for f in range(n_features):
+        cuts = thresholds[features == f]
+        if len(cuts):
+            base[f] = np.median(cuts)
+            low[f], high[f] = cuts.min() - 1, cuts.max() + 1
+
+    rows = []
+    for f, t in zip(features, thresholds):
+        for v in (np.nextafter(t, -np.inf), t, np.nextafter(t, np.inf), np.floor(t), np.ceil(t)):
+            row = base.copy()
+            row[f] = v
+            rows.append(row)
+    rng = np.random.default_rng(seed)
+    rows.extend(rng.uniform(low, high, size=(random_rows, n_features)))
+    return np.array(rows)
+
+
+def probe_error(compiled: CompiledTrees, model: Any, scaler: Any, feature_names: Sequence[str]) -> float:
+    """Largest probability difference between compiled and scaler + model over the boundary_probe rows."""
+    probe = boundary_probe(compiled, len(feature_names))
+    expected = model.predict_proba(scaler.transform(pd.DataFrame(probe, columns=list(feature_names))))[:, 1]
+    return float(np.max(np.abs(compiled.predict_proba(probe) - expected)))
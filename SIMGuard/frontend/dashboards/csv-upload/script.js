@@ -1,5 +1,6 @@
 // Global variables
 let uploadedFile = null;
+let uploadId = null;
 let analysisResults = null;
 let detectionChart = null;
 
@@ -13,6 +14,7 @@ const API_ENDPOINTS = {
     status: `${API_BASE_URL}/status`,
     clear: `${API_BASE_URL}/clear`
 };
+const RESULTS_PAGE_LIMIT = 10000; // largest page /results serves
 
 // DOM Elements
 const fileInput = document.getElementById('fileInput');
@@ -215,12 +217,15 @@ async function analyzeFile() {
 
         const uploadResult = await uploadResponse.json();
         console.log('Upload successful:', uploadResult);
+        uploadId = uploadResult.upload_id;
 
         // Step 2: Trigger analysis
         analyzeBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Analyzing...';
 
         const analyzeResponse = await fetch(API_ENDPOINTS.analyze, {
-            method: 'POST'
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ upload_id: uploadId })
         });
 
         if (!analyzeResponse.ok) {
@@ -234,14 +239,7 @@ async function analyzeFile() {
         // Step 3: Get detailed results
         analyzeBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Loading Results...';
 
-        const resultsResponse = await fetch(API_ENDPOINTS.results);
-
-        if (!resultsResponse.ok) {
-            const errorData = await resultsResponse.json();
-            throw new Error(errorData.message || 'Failed to get results');
-        }
-
-        analysisResults = await resultsResponse.json();
+        analysisResults = await fetchAllResults(uploadId);
         console.log('Results retrieved:', analysisResults);
 
         // Display results
@@ -270,6 +268,33 @@ async function analyzeFile() {
     }
 }
 
+// /results is paged; follow page.next_cursor so suspicious_activities holds every flagged row
+async function fetchAllResults(uploadId) {
+    let results = null;
+    let cursor = null;
+    do {
+        const params = new URLSearchParams({ upload_id: uploadId, limit: RESULTS_PAGE_LIMIT });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        const response = await fetch(`${API_ENDPOINTS.results}?${params}`);
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.message || 'Failed to get results');
+        }
+
+        const page = await response.json();
+        if (results === null) {
+            results = page;
+        } else {
+            results.suspicious_activities.push(...page.suspicious_activities);
+        }
+        cursor = page.page ? page.page.next_cursor : null;
+    } while (cursor);
+    return results;
+}
+
 function generateMockResults() {
     const totalRecords = Math.floor(Math.random() * 1000) + 500;
     const suspiciousCount = Math.floor(Math.random() * 50) + 5;
@@ -400,7 +425,7 @@ async function downloadReport() {
         downloadBtn.disabled = true;
 
         // Request report from backend
-        const response = await fetch(API_ENDPOINTS.report);
+        const response = await fetch(`${API_ENDPOINTS.report}?upload_id=${uploadId}`);
 
         if (!response.ok) {
             const errorData = await response.json();
@@ -8,24 +8,8 @@ from typing import Tuple
 from .config import CITY_COORDINATES
 
 
-def calculate_distance(city1: str, city2: str) -> float:
-    """
-    Calculate distance between two cities using Haversine formula
-    
-    Args:
-        city1: First city name
-        city2: Second city name
-        
-    Returns:
-        Distance in kilometers
-    """
-    if city1 not in CITY_COORDINATES or city2 not in CITY_COORDINATES:
-        return 0.0
-    
-    lat1, lon1 = CITY_COORDINATES[city1]
-    lat2, lon2 = CITY_COORDINATES[city2]
-    
-    # Haversine formula
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometers (Haversine formula), rounded to 2 decimals"""
     R = 6371  # Earth's radius in kilometers
     
     lat1_rad = math.radians(lat1)
@@ -43,6 +27,32 @@ def calculate_distance(city1: str, city2: str) -> float:
     return round(distance, 2)
 
 
+# City names interned to integer IDs, with every pair's distance computed once at import
+_CITY_IDS = {city: i for i, city in enumerate(CITY_COORDINATES)}
+_CITY_DISTANCES = [
+    [_haversine_km(*CITY_COORDINATES[a], *CITY_COORDINATES[b]) for b in CITY_COORDINATES]
+    for a in CITY_COORDINATES
+]
+
+
+def calculate_distance(city1: str, city2: str) -> float:
+    """
+    Distance between two cities, looked up in the precomputed city distance table
+    
+    Args:
+        city1: First city name
+        city2: Second city name
+        
+    Returns:
+        Distance in kilometers
+    """
+    id1 = _CITY_IDS.get(city1)
+    id2 = _CITY_IDS.get(city2)
+    if id1 is None or id2 is None:
+        return 0.0
+    return _CITY_DISTANCES[id1][id2]
+
+
 def parse_datetime(dt_str: str) -> datetime:
     """
     Parse datetime string to datetime object
@@ -1,6 +1,6 @@
 import { Injectable, inject, signal } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
-import { catchError, map, Observable, of, from, switchMap, tap } from 'rxjs';
+import { catchError, EMPTY, expand, map, Observable, of, from, reduce, switchMap, tap } from 'rxjs';
 import { 
   AnalysisResult, 
   FileUploadResponse, 
@@ -18,12 +18,15 @@ export class SimGuardService {
   private http = inject(HttpClient);
   // Changed default port to 5001 to avoid MacOS AirPlay conflict on 5000
   private apiUrl = 'http://localhost:5001'; 
+  // Largest page /results serves
+  private resultsPageLimit = 10000;
   
   // Store file content for local analysis fallback (Offline Mode)
   private uploadedFileContent: string = '';
   
   // State signals
   uploadedFile = signal<string | null>(null);
+  uploadId = signal<string | null>(null);
   analysisData = signal<AnalysisResult | null>(null);
 
   // --- API METHODS ---
@@ -46,7 +49,10 @@ export class SimGuardService {
     // 2. Try to upload to Backend
     return from(readFilePromise).pipe(
       switchMap(() => this.http.post<FileUploadResponse>(`${this.apiUrl}/upload`, formData)),
-      tap(res => console.log('✅ Backend Connected: File uploaded successfully', res)),
+      tap(res => {
+        this.uploadId.set(res.upload_id ?? null);
+        console.log('✅ Backend Connected: File uploaded successfully', res);
+      }),
       catchError((err) => {
         console.warn('⚠️ Backend Disconnected: Switching to Browser-based Local Analysis.', err.message);
         
@@ -68,7 +74,7 @@ export class SimGuardService {
 
   analyzeData(): Observable<any> {
     // Trigger analysis on the backend
-    return this.http.post<any>(`${this.apiUrl}/analyze`, {}).pipe(
+    return this.http.post<any>(`${this.apiUrl}/analyze`, { upload_id: this.uploadId() }).pipe(
       tap(() => console.log('✅ Backend Analysis Triggered')),
       catchError((err) => {
         console.warn('⚠️ Backend Offline: Skipping server analysis trigger.');
@@ -78,8 +84,16 @@ export class SimGuardService {
   }
 
   getResults(): Observable<AnalysisResult> {
-    // Fetch results from backend
-    return this.http.get<AnalysisResult>(`${this.apiUrl}/results`).pipe(
+    // Fetch results from backend; /results is paged, so follow page.next_cursor to collect every flagged row
+    const fetchPage = (cursor?: string) => this.http.get<AnalysisResult>(`${this.apiUrl}/results`, {
+      params: this.resultsParams(cursor)
+    });
+    return fetchPage().pipe(
+      expand(page => page.page?.next_cursor ? fetchPage(page.page.next_cursor) : EMPTY),
+      reduce((all, page) => ({
+        ...all,
+        suspicious_activities: all.suspicious_activities.concat(page.suspicious_activities)
+      })),
       tap(res => console.log('✅ Backend Results Received', res)),
       catchError((err) => {
         console.warn('⚠️ Backend Offline: performing local analysis on cached file.');
@@ -89,7 +103,20 @@ export class SimGuardService {
   }
 
   getReportUrl(): string {
-    return `${this.apiUrl}/report`;
+    return `${this.apiUrl}/report${this.uploadQuery()}`;
+  }
+
+  private resultsParams(cursor?: string): Record<string, string> {
+    const params: Record<string, string> = { limit: String(this.resultsPageLimit) };
+    const id = this.uploadId();
+    if (id) params['upload_id'] = id;
+    if (cursor) params['cursor'] = cursor;
+    return params;
+  }
+
+  private uploadQuery(): string {
+    const id = this.uploadId();
+    return id ? `?upload_id=${encodeURIComponent(id)}` : '';
   }
 
   // --- MANUAL ML PREDICTION ---
@@ -1,6 +1,7 @@
 export interface FileUploadResponse {
   status: string;
   message: string;
+  upload_id?: string;
   filename: string;
   records_count: number;
   columns: string[];
@@ -46,6 +47,12 @@ export interface AnalysisResult {
   risk_distribution: RiskDistribution;
   suspicious_activities: SuspiciousActivity[];
   total_suspicious_activities: number;
+  page?: {
+    limit: number | null;
+    returned: number;
+    total_matching: number;
+    next_cursor: string | null;
+  };
 }
 
 // --- NEW TYPES FOR ML DASHBOARD ---